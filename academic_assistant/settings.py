@@ -146,6 +146,17 @@ STATICFILES_DIRS = [BASE_DIR / "static"]
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Media files fan out into hashed subdirectories and are written atomically;
+# `python manage.py shard_media` moves files saved under the old flat layout
+STORAGES = {
+    'default': {
+        'BACKEND': 'resources.storage.ShardedFileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -160,6 +171,57 @@ PUSHER_KEY = os.getenv('PUSHER_KEY')
 PUSHER_SECRET = os.getenv('PUSHER_SECRET')
 PUSHER_CLUSTER = os.getenv('PUSHER_CLUSTER')
 
+# Pusher events go through an outbox table; when this is off, run
+# `python manage.py dispatch_pusher_events` as a separate worker instead
+PUSHER_OUTBOX_AUTODISPATCH = os.getenv('PUSHER_OUTBOX_AUTODISPATCH', 'true').lower() == 'true'
+
+# Seconds to cache each group's member ids for membership checks (0 = off).
+# Only enable with a cache backend shared by every worker process
+GROUP_MEMBERSHIP_CACHE_TTL = int(os.getenv('GROUP_MEMBERSHIP_CACHE_TTL', '0'))
+
+# Seconds the home dashboard sections stay cached per user (0 = no caching).
+# Invalidation goes through the cache, so use a backend shared by all workers
+DASHBOARD_CACHE_TTL = int(os.getenv('DASHBOARD_CACHE_TTL', '60'))
+
+# Days of dashboard activity kept by `python manage.py prune_activity_feed`
+ACTIVITY_FEED_RETENTION_DAYS = int(os.getenv('ACTIVITY_FEED_RETENTION_DAYS', '30'))
+
+# Fan group messages out to large groups' feeds in a background thread after
+# commit; when off, every fan-out runs right after commit in the request
+ACTIVITY_FAN_OUT_ASYNC = os.getenv('ACTIVITY_FAN_OUT_ASYNC', 'true').lower() == 'true'
+
+# Seconds each process reuses its discovery ranking feature snapshot
+RANKING_SNAPSHOT_TTL = int(os.getenv('RANKING_SNAPSHOT_TTL', '300'))
+
+# Seconds each user's compact discovery seen-sets stay cached. Recording an
+# action rewrites the entry, so use a cache backend shared by all workers
+DISCOVERY_SEEN_CACHE_TTL = int(os.getenv('DISCOVERY_SEEN_CACHE_TTL', '300'))
+
+# Seconds each user's friend id set stays cached (0 = off). Friendship
+# changes invalidate it through the cache, so use a backend shared by all workers
+FRIEND_GRAPH_CACHE_TTL = int(os.getenv('FRIEND_GRAPH_CACHE_TTL', '300'))
+
+# Extract uploaded documents' text for search in a background thread after
+# commit; when this is off, run `python manage.py index_documents` as a worker
+DOCUMENT_INDEX_AUTORUN = os.getenv('DOCUMENT_INDEX_AUTORUN', 'true').lower() == 'true'
+
+# Render thumbnails of new documents and attachments in a background thread
+# after commit; turn off when a `render_thumbnails` worker runs instead
+THUMBNAIL_AUTORUN = os.getenv('THUMBNAIL_AUTORUN', 'true').lower() == 'true'
+
+# Who sends protected media after the access check: 'django' (streams from the
+# worker; development), 'x-accel-redirect' (nginx) or 'x-sendfile' (Apache)
+FILE_SERVING_BACKEND = os.getenv('FILE_SERVING_BACKEND', 'django')
+# nginx `internal` location that aliases MEDIA_ROOT, for 'x-accel-redirect'
+FILE_SERVING_ACCEL_PREFIX = os.getenv('FILE_SERVING_ACCEL_PREFIX', '/protected-media/')
+
+# Hash uploads while they are received, so documents and attachments are
+# stored by content (resources.blobs) without reading them back
+FILE_UPLOAD_HANDLERS = [
+    'resources.uploads.HashingMemoryFileUploadHandler',
+    'resources.uploads.HashingTemporaryFileUploadHandler',
+]
+
 
 
 STREAM_API_KEY = os.getenv("STREAM_API_KEY")
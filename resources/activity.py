@@ -0,0 +1,243 @@
+"""
+Dashboard activity feed.
+
+Each user's feed is stored as ``ActivityEvent`` rows written when the event
+happens (fan-out on write): a group message adds one row per other member,
+a private message one row for the recipient, and so on. Reading a feed is
+then one range scan of the (recipient, created_at, id) index, paginated
+with the same cursors as the chat history.
+
+Group messages are fanned out only after the sending transaction has
+committed, so sending never waits on the inserts. Groups of up to
+``INLINE_FAN_OUT_LIMIT`` other members are written right after commit;
+larger ones are handed to a background thread (``ACTIVITY_FAN_OUT_ASYNC``)
+that writes ``FAN_OUT_BATCH_SIZE`` rows per transaction. The feed is a
+convenience, so a process that dies with fan-outs queued loses those
+events rather than the app keeping a durable queue for them.
+
+Events that stop being relevant (a friend request that was answered, a
+deleted message) are withdrawn through their ``source`` key. Old rows are
+removed by the ``prune_activity_feed`` management command.
+"""
+import logging
+import queue
+import threading
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from . import counters
+from .models import ActivityEvent, Membership, Message
+from .pagination import keyset_page
+
+logger = logging.getLogger(__name__)
+
+FEED_PAGE_SIZE = 20
+FAN_OUT_BATCH_SIZE = 1000
+# Groups with more other members than this are fanned out in the background
+INLINE_FAN_OUT_LIMIT = 50
+PREVIEW_LENGTH = 80
+
+
+def _display_name(user):
+    return user.get_full_name() or user.username
+
+
+def _preview(text, length=PREVIEW_LENGTH):
+    return text[:length] + ('...' if len(text) > length else '')
+
+
+def record(recipient_ids, activity_type, actor, title, source, preview='', url='', created_at=None):
+    """Add one event to the feed of every user in ``recipient_ids``."""
+    created_at = created_at or timezone.now()
+    ActivityEvent.objects.bulk_create([
+        ActivityEvent(
+            recipient_id=recipient_id,
+            activity_type=activity_type,
+            actor=actor,
+            title=title,
+            preview=preview,
+            url=url,
+            source=source,
+            created_at=created_at,
+        )
+        for recipient_id in recipient_ids
+    ], batch_size=FAN_OUT_BATCH_SIZE)
+
+
+def withdraw(source, activity_type=None):
+    """Remove the events created from ``source`` (optionally only one type)."""
+    events = ActivityEvent.objects.filter(source=source)
+    if activity_type:
+        events = events.filter(activity_type=activity_type)
+    events.delete()
+
+
+# ── Event sources (called from resources.signals) ──────────────
+
+def group_message_posted(message):
+    transaction.on_commit(partial(_schedule_fan_out, message.pk, message.group_id, message.user_id))
+
+
+def _schedule_fan_out(message_id, group_id, sender_id):
+    recipients = Membership.objects.filter(group_id=group_id).exclude(user_id=sender_id)
+    if getattr(settings, 'ACTIVITY_FAN_OUT_ASYNC', True) and recipients.count() > INLINE_FAN_OUT_LIMIT:
+        _fan_out.submit(partial(fan_out_group_message, message_id))
+    else:
+        fan_out_group_message(message_id)
+
+
+def fan_out_group_message(message_id):
+    """Add a posted group message to its group members' feeds, one batch per transaction."""
+    message = Message.objects.select_related('user', 'group').filter(pk=message_id).first()
+    if message is None:
+        return
+    member_ids = Membership.objects.filter(group_id=message.group_id).exclude(
+        user_id=message.user_id
+    ).order_by('user_id').values_list('user_id', flat=True)
+    last_id = 0
+    while True:
+        batch = list(member_ids.filter(user_id__gt=last_id)[:FAN_OUT_BATCH_SIZE])
+        if not batch:
+            break
+        # Deleted meanwhile: its events were already withdrawn
+        if last_id and not Message.objects.filter(pk=message_id).exists():
+            withdraw(f'message:{message_id}')
+            return
+        record(
+            batch,
+            'group_message',
+            actor=message.user,
+            title=f'{_display_name(message.user)} in {message.group.name}',
+            preview=_preview(message.content),
+            url=f'/resources/groups/{message.group_id}/chat/',
+            source=f'message:{message.pk}',
+            created_at=message.timestamp,
+        )
+        last_id = batch[-1]
+    if last_id:
+        # The members' dashboards were refreshed when the message committed,
+        # possibly before these events existed (imported here: dashboard uses this module)
+        from . import dashboard
+        dashboard.invalidate_groups([message.group_id], ('feed',))
+
+
+class _FanOutWorker:
+    """In-process background thread that runs queued fan-outs one at a time."""
+
+    def __init__(self):
+        self._jobs = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, job):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='activity-fan-out', daemon=True)
+                self._thread.start()
+        self._jobs.put(job)
+
+    def _run(self):
+        while True:
+            job = self._jobs.get()
+            try:
+                job()
+            except Exception:
+                logger.exception('Activity fan-out failed')
+            finally:
+                close_old_connections()
+
+
+_fan_out = _FanOutWorker()
+
+
+def group_message_edited(message):
+    ActivityEvent.objects.filter(source=f'message:{message.pk}').update(preview=_preview(message.content))
+
+
+def private_message_sent(message):
+    chat = message.chat
+    recipient_id = chat.participant2_id if chat.participant1_id == message.sender_id else chat.participant1_id
+    record(
+        [recipient_id],
+        'private_message',
+        actor=message.sender,
+        title=f'{_display_name(message.sender)} sent you a message',
+        preview=_preview(message.content),
+        url=f'/resources/chats/{message.chat_id}/',
+        source=f'private-message:{message.pk}',
+        created_at=message.timestamp,
+    )
+
+
+def friendship_changed(friendship):
+    source = f'friendship:{friendship.pk}'
+    existing = set(ActivityEvent.objects.filter(source=source).values_list('activity_type', flat=True))
+    if friendship.status == 'pending':
+        if 'friend_request' not in existing:
+            record(
+                [friendship.to_user_id],
+                'friend_request',
+                actor=friendship.from_user,
+                title=f'{_display_name(friendship.from_user)} sent a friend request',
+                preview='Tap to accept or decline',
+                url='/resources/friends/',
+                source=source,
+            )
+        return
+    if 'friend_request' in existing:
+        withdraw(source, 'friend_request')
+    if friendship.status == 'accepted' and 'friend_accepted' not in existing:
+        record(
+            [friendship.from_user_id],
+            'friend_accepted',
+            actor=friendship.to_user,
+            title=f'{_display_name(friendship.to_user)} accepted your friend request',
+            preview='You are now friends!',
+            url='/resources/friends/',
+            source=source,
+        )
+
+
+def join_request_changed(join_request):
+    source = f'join-request:{join_request.pk}'
+    if join_request.status != 'pending':
+        withdraw(source)
+        return
+    if ActivityEvent.objects.filter(source=source).exists():
+        return
+    record(
+        counters.group_admin_ids(join_request.group_id),
+        'group_join_request',
+        actor=join_request.user,
+        title=f'{_display_name(join_request.user)} wants to join {join_request.group.name}',
+        preview=join_request.message[:60] if join_request.message else 'Pending your approval',
+        url='/resources/discover/join-requests/',
+        source=source,
+    )
+
+
+# ── Reading ────────────────────────────────────────────────────
+
+def feed_page(user, before=None, limit=FEED_PAGE_SIZE):
+    """Return ``(events, next_cursor)`` for a user's feed, newest first."""
+    events = ActivityEvent.objects.filter(recipient=user).select_related('actor__profile')
+    return keyset_page(events, 'created_at', before=before, limit=limit)
+
+
+def prune(older_than=None, batch_size=10000):
+    """Delete feed events older than ``older_than`` in batches. Returns the row count."""
+    if older_than is None:
+        older_than = timedelta(days=getattr(settings, 'ACTIVITY_FEED_RETENTION_DAYS', 30))
+    cutoff = timezone.now() - older_than
+    deleted = 0
+    while True:
+        ids = list(
+            ActivityEvent.objects.filter(created_at__lt=cutoff).values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return deleted
+        deleted += ActivityEvent.objects.filter(id__in=ids).delete()[0]
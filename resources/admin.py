@@ -1,7 +1,9 @@
 from django.contrib import admin
 from .models import (
     GroupChat, StudyGroup, GroupInvite, Document, Course, Tag, Message,
-    Friendship, PrivateChat, PrivateMessage, MessageReaction, MessageAttachment
+    Friendship, PrivateChat, PrivateMessage, MessageReaction, MessageAttachment,
+    OutboxEvent, UnreadCounter, ReadCursor, Membership, GroupNotification, ActivityEvent,
+    DiscoveryQueue, DiscoveryCandidate, GroupStats, DiscoverySeenSet, FriendSuggestion, DocumentText, Blob
 )
 
 # Register your models here.
@@ -16,4 +18,17 @@ admin.site.register(Friendship)
 admin.site.register(PrivateChat)
 admin.site.register(PrivateMessage)
 admin.site.register(MessageReaction)
-admin.site.register(MessageAttachment)
\ No newline at end of file
+admin.site.register(MessageAttachment)
+admin.site.register(OutboxEvent)
+admin.site.register(UnreadCounter)
+admin.site.register(ReadCursor)
+admin.site.register(Membership)
+admin.site.register(GroupNotification)
+admin.site.register(ActivityEvent)
+admin.site.register(DiscoveryQueue)
+admin.site.register(DiscoveryCandidate)
+admin.site.register(GroupStats)
+admin.site.register(DiscoverySeenSet)
+admin.site.register(FriendSuggestion)
+admin.site.register(DocumentText)
+admin.site.register(Blob)
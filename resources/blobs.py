@@ -0,0 +1,197 @@
+"""
+Content-addressed storage for uploaded files.
+
+``Document`` and ``MessageAttachment`` files are stored once per distinct
+content, under a name made from the SHA-256 of their bytes::
+
+    blobs/3f/a2/3fa2…c9.pdf
+
+The first two pairs of hex digits shard the directory so no single
+directory grows past a few thousand entries. The lower-cased extension of
+the first upload is kept so content types can still be guessed from the
+name; the original file name lives on the referencing row
+(``Document.filename``, ``MessageAttachment.filename``).
+
+The hash is computed by ``resources.uploads`` while the request body is
+received, so storing a file never reads it back. An upload whose blob
+already exists is not written again: the row just points at the existing
+name. Each ``Blob`` row counts the rows referencing its name. When the
+last reference goes away the count drops to 0 and, after commit, the
+row and its files are deleted together in one transaction, but only if
+the count is still 0. ``store`` takes its reference by incrementing the
+same row before it decides whether the file needs writing, so an upload
+racing with a deletion either keeps the file alive or finds it gone and
+writes it again. ``python manage.py collect_blobs`` recounts references from
+scratch and removes files nothing points at, for changes that bypassed
+the model signals (raw SQL, ``QuerySet.update``) or saves that failed
+half way. Files saved before blobs existed are converted by
+``python manage.py shard_media`` (see ``resources.storage``).
+"""
+import logging
+import os
+from datetime import timedelta
+from functools import partial
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import file_serving, previews
+from .models import Blob, Document, MessageAttachment
+
+logger = logging.getLogger(__name__)
+
+BLOB_DIR = 'blobs'
+# Models whose ``file`` field is stored as blobs
+MODELS = (Document, MessageAttachment)
+# Unreferenced files younger than this may belong to a save still in progress
+ORPHAN_MIN_AGE = timedelta(hours=1)
+
+
+def blob_name(sha256, filename):
+    """Storage name of the blob with hex digest ``sha256`` for a file called ``filename``."""
+    extension = os.path.splitext(filename)[1].lower()
+    return f'{BLOB_DIR}/{sha256[:2]}/{sha256[2:4]}/{sha256}{extension}'
+
+
+def is_blob(name):
+    return bool(name) and name.startswith(BLOB_DIR + '/')
+
+
+def sha256_of(name):
+    """The content hash a blob name was made from."""
+    return os.path.splitext(os.path.basename(name))[0]
+
+
+def store(field_file):
+    """
+    Move a newly assigned upload of ``field_file`` into blob storage, point
+    the field at it and count the reference. Returns the hex SHA-256 of the
+    content; the caller must not ``retain`` the name again.
+    """
+    upload = field_file.file
+    # Set by the upload handlers; files created in code are hashed here
+    sha256 = getattr(upload, 'sha256', None) or file_serving.file_hash(upload)
+    name = blob_name(sha256, os.path.basename(upload.name or ''))
+    storage = field_file.storage
+    created = False
+    with transaction.atomic():
+        # Taking the reference first keeps a pending deletion from removing the file
+        claimed = Blob.objects.filter(name=name).update(refcount=F('refcount') + 1)
+        if not storage.exists(name):
+            saved = storage.save(name, upload)
+            if saved != name:
+                # Another request stored the same content at the same moment
+                storage.delete(saved)
+        if not claimed:
+            try:
+                with transaction.atomic():
+                    Blob.objects.create(name=name, sha256=sha256, size=storage.size(name), refcount=1)
+                created = True
+            except IntegrityError:
+                Blob.objects.filter(name=name).update(refcount=F('refcount') + 1)
+    if created:
+        previews.schedule()
+    field_file.name = name
+    field_file._committed = True
+    # Reopen from storage on next use; the upload's temporary file may have been moved
+    del field_file.file
+    return sha256
+
+
+def retain(name, storage):
+    """Count one more reference to the blob stored as ``name``."""
+    if not is_blob(name):
+        return
+    if Blob.objects.filter(name=name).update(refcount=F('refcount') + 1):
+        return
+    try:
+        with transaction.atomic():
+            Blob.objects.create(name=name, sha256=sha256_of(name), size=storage.size(name), refcount=1)
+    except IntegrityError:
+        Blob.objects.filter(name=name).update(refcount=F('refcount') + 1)
+    else:
+        previews.schedule()
+
+
+def release(name, storage):
+    """Drop one reference to ``name``; the last one deletes the blob after commit."""
+    if not is_blob(name):
+        return
+    with transaction.atomic():
+        blob = Blob.objects.select_for_update().filter(name=name).first()
+        if blob is None or blob.refcount <= 0:
+            return
+        Blob.objects.filter(pk=blob.pk).update(refcount=F('refcount') - 1)
+    if blob.refcount == 1:
+        transaction.on_commit(partial(_delete_unreferenced, name, storage))
+
+
+def _delete_unreferenced(name, storage):
+    """Delete the blob ``name`` and its files if nothing has referenced it again."""
+    with transaction.atomic():
+        blob = Blob.objects.filter(name=name, refcount=0).first()
+        # The conditional delete holds the row until the files are gone, so a
+        # concurrent store() waits and then writes the file again
+        if blob is None or not Blob.objects.filter(pk=blob.pk, refcount=0).delete()[0]:
+            return
+        for file_name in filter(None, [name, blob.thumbnail.name]):
+            try:
+                storage.delete(file_name)
+            except OSError:
+                logger.exception('Could not delete blob file %s', file_name)
+
+
+def references():
+    """``{name: count}`` of the blob names referenced by every blob-stored model."""
+    counts = {}
+    for model in MODELS:
+        for name in model.objects.filter(file__startswith=BLOB_DIR + '/').values_list('file', flat=True).iterator():
+            counts[name] = counts.get(name, 0) + 1
+    return counts
+
+
+def _stored_names(storage, directory=BLOB_DIR):
+    try:
+        directories, files = storage.listdir(directory)
+    except FileNotFoundError:
+        return
+    for filename in files:
+        yield f'{directory}/{filename}'
+    for subdirectory in directories:
+        yield from _stored_names(storage, f'{directory}/{subdirectory}')
+
+
+def collect(storage, dry_run=False):
+    """
+    Recount every blob's references and delete blobs, thumbnails and
+    files nothing refers to (files only once older than
+    ``ORPHAN_MIN_AGE``). Returns ``(recounted, deleted)``.
+    """
+    counts = references()
+    recounted = deleted = 0
+    for blob in Blob.objects.all().iterator():
+        count = counts.get(blob.name, 0)
+        if count == blob.refcount:
+            continue
+        recounted += 1
+        if not dry_run:
+            Blob.objects.filter(pk=blob.pk).update(refcount=count)
+    # Referenced names without a row (e.g. rows copied in with raw SQL)
+    known = set(Blob.objects.values_list('name', flat=True))
+    for name, count in counts.items():
+        if name not in known and storage.exists(name):
+            recounted += 1
+            if not dry_run:
+                Blob.objects.create(name=name, sha256=sha256_of(name), size=storage.size(name), refcount=count)
+    if not dry_run:
+        Blob.objects.filter(refcount=0).delete()
+    # Thumbnails of the blobs still referenced are kept with them
+    keep = set(counts) | set(Blob.objects.filter(refcount__gt=0).exclude(thumbnail='').values_list('thumbnail', flat=True))
+    cutoff = timezone.now() - ORPHAN_MIN_AGE
+    for name in list(_stored_names(storage)):
+        if name not in keep and storage.get_modified_time(name) < cutoff:
+            deleted += 1
+            if not dry_run:
+                storage.delete(name)
+    return recounted, deleted
@@ -0,0 +1,212 @@
+"""
+Denormalized unread counters for the notification badges.
+
+The dashboard polls ``/api/unread-counts/`` from every open tab, so the
+counts live in one ``UnreadCounter`` row per user and the endpoint is a
+primary-key lookup. Signal handlers in ``resources.signals`` and the views
+that mark things read keep the rows current; the ``rebuild_unread_counters``
+management command recomputes every row from the source tables.
+"""
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Q, F, Count, Sum, Case, When, Value, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import (
+    Membership, Friendship, PrivateMessage, GroupJoinRequest, Notification,
+    GroupNotification, GroupNotificationCursor, ReadCursor, UnreadCounter,
+)
+
+User = get_user_model()
+
+COUNTER_FIELDS = ('notifications', 'messages', 'friend_requests', 'join_requests')
+
+
+# ── Source-of-truth counts ─────────────────────────────────────
+
+def count_notifications(user_id):
+    return (
+        Notification.objects.filter(recipient_id=user_id, is_read=False).count()
+        + count_group_notifications(user_id)
+    )
+
+
+def count_group_notifications(user_id):
+    # Group-wide notifications past the user's notification cursor for their group
+    cursor = GroupNotificationCursor.objects.filter(
+        user_id=user_id, group=OuterRef('group_id'),
+    ).values('last_read_id')[:1]
+    return GroupNotification.visible_to(user_id).annotate(
+        read_cursor=Coalesce(Subquery(cursor), Value(0)),
+    ).filter(id__gt=F('read_cursor')).count()
+
+
+def count_messages(user_id):
+    # Messages from the other participant past the user's read cursor in each chat
+    cursor = ReadCursor.objects.filter(
+        user_id=user_id, private_chat=OuterRef('chat_id'),
+    ).values('last_read_id')[:1]
+    return PrivateMessage.objects.filter(
+        Q(chat__participant1_id=user_id) | Q(chat__participant2_id=user_id),
+    ).exclude(sender_id=user_id).annotate(
+        read_cursor=Coalesce(Subquery(cursor), Value(0)),
+    ).filter(id__gt=F('read_cursor')).count()
+
+
+def count_friend_requests(user_id):
+    return Friendship.objects.filter(to_user_id=user_id, status='pending').count()
+
+
+def count_join_requests(user_id):
+    # Pending requests for groups the user belongs to and administers
+    admin_groups = Membership.objects.filter(user_id=user_id).filter(
+        Q(role=Membership.ADMIN) | Q(group__creator_id=user_id)
+    ).values('group_id')
+    return GroupJoinRequest.objects.filter(
+        group__in=admin_groups, status='pending'
+    ).count()
+
+
+_COUNTERS = {
+    'notifications': count_notifications,
+    'messages': count_messages,
+    'friend_requests': count_friend_requests,
+    'join_requests': count_join_requests,
+}
+
+
+def group_admin_ids(group_id):
+    """IDs of the users whose join_requests counter covers this group."""
+    return list(
+        Membership.objects.filter(group_id=group_id).filter(
+            Q(role=Membership.ADMIN) | Q(user_id=F('group__creator_id'))
+        ).values_list('user_id', flat=True)
+    )
+
+
+# ── Reading and updating ───────────────────────────────────────
+
+def get_counts(user):
+    """Return the badge counts for a user with a single primary-key lookup."""
+    counter = UnreadCounter.objects.filter(pk=user.pk).first()
+    if counter is None:
+        counter = recount(user.pk)
+    return counter.as_dict()
+
+
+def adjust(user_id, **deltas):
+    """
+    Apply relative changes, e.g. ``adjust(user.id, notifications=1)``.
+
+    Counters never go below zero. A user without a counter row gets one built
+    from the source tables, which already include the change being recorded.
+    """
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    updated = UnreadCounter.objects.filter(pk=user_id).update(**{
+        field: Greatest(F(field) + Value(delta), Value(0))
+        for field, delta in deltas.items()
+    })
+    if not updated:
+        recount(user_id)
+
+
+def adjust_many(user_ids, **deltas):
+    """
+    Apply the same relative change to many users with one UPDATE. ``user_ids``
+    may be a list or a queryset of ids. Users without a counter row are
+    skipped; their row is built from the source tables on first read.
+    """
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    UnreadCounter.objects.filter(pk__in=user_ids).update(**{
+        field: Greatest(F(field) + Value(delta), Value(0))
+        for field, delta in deltas.items()
+    })
+
+
+def recount(user_id, fields=COUNTER_FIELDS):
+    """Recompute the given counters for one user from the source tables."""
+    values = {field: _COUNTERS[field](user_id) for field in fields}
+    counter, _ = UnreadCounter.objects.update_or_create(user_id=user_id, defaults=values)
+    return counter
+
+
+def recount_many(user_ids, fields=COUNTER_FIELDS):
+    for user_id in set(user_ids):
+        recount(user_id, fields)
+
+
+def rebuild_all(batch_size=1000):
+    """
+    Recompute every user's counters with one grouped query per counter and
+    rewrite the table in bulk. Returns the number of rows written.
+    """
+    totals = {}
+
+    def add(field, rows):
+        for user_id, count in rows:
+            totals.setdefault(user_id, dict.fromkeys(COUNTER_FIELDS, 0))[field] += count
+
+    add('notifications', Notification.objects.filter(is_read=False).values('recipient_id')
+        .annotate(n=Count('id')).values_list('recipient_id', 'n').order_by())
+
+    # The recipient of a private message is whichever participant did not send it;
+    # it is unread while its id is past the recipient's cursor for that chat
+    add('messages', PrivateMessage.objects.annotate(
+        recipient_id=Case(
+            When(chat__participant1_id=F('sender_id'), then=F('chat__participant2_id')),
+            default=F('chat__participant1_id'),
+        ),
+    ).annotate(
+        read_cursor=Coalesce(Subquery(
+            ReadCursor.objects.filter(
+                user_id=OuterRef('recipient_id'), private_chat=OuterRef('chat_id'),
+            ).values('last_read_id')[:1]
+        ), Value(0)),
+    ).filter(id__gt=F('read_cursor')).values('recipient_id').annotate(
+        n=Count('id')
+    ).values_list('recipient_id', 'n').order_by())
+
+    # Group notifications count once per member who can see them and has not
+    # read past them, so sum the unread ones per membership
+    unread_per_membership = GroupNotification.objects.filter(
+        group_id=OuterRef('group_id'),
+        created_at__gte=OuterRef('joined_at'),
+        id__gt=OuterRef('read_cursor'),
+    ).exclude(from_user_id=OuterRef('user_id')).exclude(actor_id=OuterRef('user_id')).order_by().values(
+        'group_id'
+    ).annotate(c=Count('id')).values('c')
+    add('notifications', Membership.objects.annotate(
+        read_cursor=Coalesce(Subquery(
+            GroupNotificationCursor.objects.filter(
+                user_id=OuterRef('user_id'), group_id=OuterRef('group_id'),
+            ).values('last_read_id')[:1]
+        ), Value(0)),
+    ).annotate(
+        n=Coalesce(Subquery(unread_per_membership), Value(0)),
+    ).values('user_id').annotate(total=Sum('n')).values_list('user_id', 'total').order_by())
+
+    add('friend_requests', Friendship.objects.filter(status='pending').values('to_user_id')
+        .annotate(n=Count('id')).values_list('to_user_id', 'n').order_by())
+
+    pending_per_group = dict(
+        GroupJoinRequest.objects.filter(status='pending').values('group_id')
+        .annotate(n=Count('id')).values_list('group_id', 'n').order_by()
+    )
+    join_totals = {}
+    for group_id, pending in pending_per_group.items():
+        for user_id in group_admin_ids(group_id):
+            join_totals[user_id] = join_totals.get(user_id, 0) + pending
+    add('join_requests', join_totals.items())
+
+    rows = [
+        UnreadCounter(user_id=user_id, **totals.get(user_id, {}))
+        for user_id in User.objects.values_list('id', flat=True).iterator()
+    ]
+    with transaction.atomic():
+        UnreadCounter.objects.all().delete()
+        UnreadCounter.objects.bulk_create(rows, batch_size=batch_size)
+    return len(rows)
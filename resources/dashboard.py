@@ -0,0 +1,265 @@
+"""
+Cached per-user dashboard snapshot for the home page.
+
+The home page is assembled from three independently cached sections:
+``stats`` (the stat cards), ``groups`` (my groups with unread badges) and
+``feed`` (recent documents and the head of the ``resources.activity`` feed). Each section is cached
+per user for ``DASHBOARD_CACHE_TTL`` seconds.
+
+Invalidation uses version tokens rather than deleting keys. A cached section
+records the token of every scope it was built from: the user, and each of the
+user's groups. Signal handlers in ``resources.signals`` replace the tokens of
+the scopes a change touches. A new message in a 3,000 member group therefore
+costs one cache write instead of 3,000 deletes, and the next read sees the
+token mismatch and recomputes. Tokens are replaced only once the writing
+transaction commits: a recompute that saw the new token before then would
+read the old data and cache it as fresh.
+
+Stampede protection: when a section is missing, expired or invalidated, one
+request takes a short lock (``cache.add``) and recomputes it. Concurrent
+requests serve the stale copy if there is one, or wait briefly for the
+winner's result.
+
+``stats()`` reports the hit ratio and recompute times of this process.
+"""
+import logging
+import threading
+import time
+import uuid
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q, Count, Max
+
+from . import activity, friends, read_state
+from .models import (
+    Document, StudyGroup, Membership, Friendship, PrivateChat, GroupJoinRequest,
+)
+
+logger = logging.getLogger(__name__)
+
+SECTIONS = ('stats', 'groups', 'feed')
+LOCK_TIMEOUT = 10  # seconds a recompute may hold the lock
+WAIT_TIMEOUT = 2.0  # seconds a request waits for another request's recompute
+WAIT_INTERVAL = 0.05
+
+
+def _ttl():
+    return getattr(settings, 'DASHBOARD_CACHE_TTL', 60)
+
+
+def _section_key(user_id, section):
+    return f'dashboard:{user_id}:{section}'
+
+
+def _token_key(scope, scope_id, section):
+    return f'dashboard-token:{scope}:{scope_id}:{section}'
+
+
+# ── Invalidation ───────────────────────────────────────────────
+
+def _bump(scope, scope_ids, sections):
+    # Keys are computed now: the ids may come from rows this transaction deletes
+    tokens = {
+        _token_key(scope, scope_id, section): uuid.uuid4().hex
+        for scope_id in scope_ids
+        for section in sections
+    }
+    if tokens:
+        # Tokens outlive cached sections so a section never sees its token vanish
+        transaction.on_commit(partial(cache.set_many, tokens, _ttl() * 10))
+
+
+def invalidate_users(user_ids, sections=SECTIONS):
+    """Mark the given sections stale for these users."""
+    _bump('user', set(user_ids), sections)
+
+
+def invalidate_groups(group_ids, sections=SECTIONS):
+    """Mark the given sections stale for every member of these groups."""
+    _bump('group', set(group_ids), sections)
+
+
+# ── Instrumentation ────────────────────────────────────────────
+
+class _Stats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.hits = 0
+            self.stale_hits = 0
+            self.misses = 0
+            self.recomputes = 0
+            self.recompute_seconds = 0.0
+            self.max_recompute_seconds = 0.0
+
+    def record(self, outcome):
+        with self._lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+
+    def record_recompute(self, section, seconds):
+        with self._lock:
+            self.recomputes += 1
+            self.recompute_seconds += seconds
+            self.max_recompute_seconds = max(self.max_recompute_seconds, seconds)
+        logger.debug(f'Recomputed dashboard section {section} in {seconds * 1000:.1f} ms')
+
+    def as_dict(self):
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.misses
+            return {
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+                'hit_ratio': (self.hits + self.stale_hits) / lookups if lookups else None,
+                'recomputes': self.recomputes,
+                'avg_recompute_ms': (
+                    self.recompute_seconds / self.recomputes * 1000 if self.recomputes else None
+                ),
+                'max_recompute_ms': self.max_recompute_seconds * 1000,
+            }
+
+
+_stats = _Stats()
+
+
+def stats():
+    """Hit/miss counts and recompute timings of this process."""
+    return _stats.as_dict()
+
+
+# ── Section builders ───────────────────────────────────────────
+
+def _user_groups(user):
+    return StudyGroup.objects.filter(members=user)
+
+
+def build_stats(user):
+    return {
+        'groups_count': _user_groups(user).count(),
+        'documents_uploaded': Document.objects.filter(uploaded_by=user).count(),
+        'friends_count': len(friends.friends_of(user)),
+        'private_chats_count': PrivateChat.objects.filter(
+            Q(participant1=user) | Q(participant2=user)
+        ).count(),
+        'pending_join_requests': GroupJoinRequest.objects.filter(
+            group__in=StudyGroup.administered_by(user),
+            status='pending'
+        ).count(),
+        'pending_friend_requests': Friendship.objects.filter(
+            to_user=user, status='pending'
+        ).count(),
+    }
+
+
+def build_groups(user):
+    # User's groups with the latest message timestamp and unread indicators
+    my_groups = read_state.annotate_group_unread(_user_groups(user).annotate(
+        latest_message_time=Max('messages__timestamp'),
+        member_count=Count('members', distinct=True),
+        message_count=Count('messages', distinct=True),
+    ), user).order_by('-latest_message_time')[:6]
+    return {'my_groups': list(my_groups)}
+
+
+def build_feed(user):
+    user_groups = _user_groups(user)
+
+    # Documents uploaded by user or shared in their groups
+    recent_documents = Document.objects.filter(
+        Q(uploaded_by=user) | Q(group__in=user_groups)
+    ).select_related('uploaded_by').order_by('-uploaded_at')[:5]
+
+    # Activity feed rows are written as events happen; see resources.activity
+    activities, _ = activity.feed_page(user, limit=8)
+
+    return {
+        'recent_documents': list(recent_documents),
+        'activities': activities,
+    }
+
+
+_BUILDERS = {
+    'stats': build_stats,
+    'groups': build_groups,
+    'feed': build_feed,
+}
+
+
+# ── Snapshot ───────────────────────────────────────────────────
+
+def _token_keys(user_id, group_ids, section):
+    return [_token_key('user', user_id, section)] + [
+        _token_key('group', group_id, section) for group_id in group_ids
+    ]
+
+
+def _is_fresh(entry):
+    if entry['expires_at'] <= time.time():
+        return False
+    current = cache.get_many(list(entry['tokens']))
+    return current == {key: token for key, token in entry['tokens'].items() if token is not None}
+
+
+def _recompute(user, section, lock_key):
+    group_ids = list(Membership.objects.filter(user=user).values_list('group_id', flat=True))
+    keys = _token_keys(user.pk, group_ids, section)
+    # Read tokens before building so a change made mid-build leaves the entry stale
+    tokens = cache.get_many(keys)
+    started = time.perf_counter()
+    try:
+        value = _BUILDERS[section](user)
+    finally:
+        cache.delete(lock_key)
+    _stats.record_recompute(section, time.perf_counter() - started)
+    ttl = _ttl()
+    cache.set(_section_key(user.pk, section), {
+        'value': value,
+        'tokens': {key: tokens.get(key) for key in keys},
+        'expires_at': time.time() + ttl,
+    }, ttl * 2)  # kept past expiry so concurrent requests can serve it while one recomputes
+    return value
+
+
+def get_section(user, section):
+    """Return one dashboard section, from cache when fresh."""
+    if _ttl() <= 0:
+        return _BUILDERS[section](user)
+
+    key = _section_key(user.pk, section)
+    entry = cache.get(key)
+    if entry is not None and _is_fresh(entry):
+        _stats.record('hits')
+        return entry['value']
+
+    lock_key = f'{key}:lock'
+    if cache.add(lock_key, 1, LOCK_TIMEOUT):
+        _stats.record('misses')
+        return _recompute(user, section, lock_key)
+
+    # Another request is already recomputing this section
+    if entry is not None:
+        _stats.record('stale_hits')
+        return entry['value']
+    deadline = time.monotonic() + WAIT_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(WAIT_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None:
+            _stats.record('hits')
+            return entry['value']
+    _stats.record('misses')
+    return _BUILDERS[section](user)
+
+
+def get_snapshot(user):
+    """All dashboard sections merged into one template context dict."""
+    snapshot = {}
+    for section in SECTIONS:
+        snapshot.update(get_section(user, section))
+    return snapshot
@@ -8,4 +8,6 @@ urlpatterns = [
     path('notifications/mark-read/', dashboard_views.mark_notifications_read, name='mark_notifications_read'),
     path('notifications/mark-all-read/', dashboard_views.mark_all_notifications_read, name='mark_all_notifications_read'),
     path('api/unread-counts/', dashboard_views.get_unread_counts, name='get_unread_counts'),
+    path('api/activity/', dashboard_views.activity_feed, name='activity_feed'),
+    path('api/dashboard-cache-stats/', dashboard_views.dashboard_cache_stats, name='dashboard_cache_stats'),
 ]
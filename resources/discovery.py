@@ -0,0 +1,208 @@
+"""
+Precomputed people-discovery queues.
+
+Ranking every user on each visit to discover_users (and ordering the rest by
+RANDOM()) makes the page cost grow with the user table. Instead each user
+gets a queue of up to ``QUEUE_SIZE`` ``DiscoveryCandidate`` rows, built
+offline by the ``build_discovery_queues`` management command. Candidates are
+scored by ``resources.ranking`` and ordered by score tier, best first,
+shuffled within a tier with a seed stored on the user's ``DiscoveryQueue``,
+so the order is random but reproducible.
+
+Serving a page is a range read of the (user, position) index after the
+client's cursor. Actioned candidates are removed from the queue. Candidates
+who became friends or got a pending request some other way are dropped
+lazily when a page containing them is served. A queue that has run empty
+is rebuilt on the next visit (at most every ``EMPTY_QUEUE_REBUILD_AFTER``).
+
+Searches and course or program filters must reach every user, not just
+the queued ones, so they skip the queue: the matching users are ranked
+from the ranking snapshot on each request, in the queue's seeded order,
+and the cursor is an offset into that ranking.
+
+Groups are few enough to rank on every visit: ``next_groups`` ranks them
+straight from the ranking snapshot.
+"""
+import random
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import ranking, seen_sets
+from .models import DiscoveryCandidate, DiscoveryQueue, Friendship, GroupJoinRequest, Membership, StudyGroup
+
+User = get_user_model()
+
+QUEUE_SIZE = 500
+PAGE_SIZE = 50
+GROUP_PAGE_SIZE = 50
+# An exhausted queue is rebuilt, but not more often than this
+EMPTY_QUEUE_REBUILD_AFTER = timedelta(minutes=10)
+
+
+def _excluded_ids(user):
+    """Users already actioned, befriended or with a pending request either way."""
+    related = [
+        high if low == user.id else low
+        for low, high in Friendship.objects.filter(
+            Q(user_low=user.id) | Q(user_high=user.id), status__in=('pending', 'accepted'),
+        ).values_list('user_low', 'user_high')
+    ]
+    return seen_sets.union(user.id, 'user', related)
+
+
+def build_queue(user, size=QUEUE_SIZE, seed=None, snapshot=None):
+    """(Re)build one user's candidate queue. Returns the number of candidates."""
+    if seed is None:
+        seed = random.getrandbits(48)
+    if snapshot is None or user.pk not in snapshot:
+        snapshot = ranking.snapshot_for(user.pk)
+
+    ordered = ranking.rank_users(snapshot, user.pk, size, exclude=_excluded_ids(user), seed=seed)
+
+    with transaction.atomic():
+        DiscoveryCandidate.objects.filter(user=user).delete()
+        DiscoveryCandidate.objects.bulk_create([
+            DiscoveryCandidate(user=user, candidate_id=candidate_id, score=score, position=position)
+            for position, (candidate_id, score) in enumerate(ordered, start=1)
+        ])
+        DiscoveryQueue.objects.update_or_create(
+            user=user, defaults={'seed': seed, 'built_at': timezone.now()},
+        )
+    return len(ordered)
+
+
+def build_all(batch_size=100, users=None):
+    """Rebuild the queues of ``users`` (default: every active user) in batches."""
+    if users is None:
+        users = User.objects.filter(is_active=True)
+    built = 0
+    # One snapshot serves the whole run
+    snapshot = ranking.get_snapshot(refresh=True)
+    user_ids = list(users.order_by('id').values_list('id', flat=True))
+    for start in range(0, len(user_ids), batch_size):
+        for user in User.objects.filter(id__in=user_ids[start:start + batch_size]):
+            build_queue(user, snapshot=snapshot)
+            built += 1
+    return built
+
+
+def _drop_stale(user, rows):
+    """Remove rows whose candidate was actioned or befriended since the queue was built."""
+    candidate_ids = [row.candidate_id for row in rows]
+    stale = seen_sets.contains(user.id, 'user', candidate_ids)
+    for low, high in Friendship.objects.filter(
+        Q(user_low=user.id, user_high__in=candidate_ids) | Q(user_high=user.id, user_low__in=candidate_ids),
+        status__in=('pending', 'accepted'),
+    ).values_list('user_low', 'user_high'):
+        stale.add(high if low == user.id else low)
+    if stale:
+        DiscoveryCandidate.objects.filter(user=user, candidate_id__in=stale).delete()
+    return [row for row in rows if row.candidate_id not in stale]
+
+
+def _needs_build(user):
+    """No queue yet, or an exhausted one that was not rebuilt just now."""
+    queue = DiscoveryQueue.objects.filter(user=user).first()
+    if queue is None:
+        return True
+    if DiscoveryCandidate.objects.filter(user=user).exists():
+        return False
+    return queue.built_at < timezone.now() - EMPTY_QUEUE_REBUILD_AFTER
+
+
+def _filtered_candidates(user, after, limit, search, course, program):
+    """Like ``next_candidates``, but ranking every user that matches the filters; ``after`` is an offset."""
+    users = User.objects.all()
+    if search:
+        users = users.filter(
+            Q(username__icontains=search) |
+            Q(first_name__icontains=search) |
+            Q(last_name__icontains=search)
+        )
+    if course:
+        users = users.filter(course=course)
+    if program:
+        users = users.filter(profile__program_of_study__icontains=program)
+
+    # The queue's seed keeps the order of equal scores stable across pages
+    seed = DiscoveryQueue.objects.filter(user=user).values_list('seed', flat=True).first()
+    ranked = ranking.rank_users(
+        ranking.snapshot_for(user.id), user.id, after + limit + 1,
+        exclude=_excluded_ids(user), candidates=users.values_list('id', flat=True), seed=seed,
+    )
+    next_cursor = after + limit if len(ranked) > after + limit else None
+    page = ranked[after:after + limit]
+    users_by_id = User.objects.select_related('profile').in_bulk([candidate_id for candidate_id, _ in page])
+    matches = []
+    for candidate_id, score in page:
+        candidate = users_by_id.get(candidate_id)
+        if candidate is not None:
+            candidate.match_score = score
+            matches.append(candidate)
+    return matches, next_cursor
+
+
+def next_candidates(user, after=0, limit=PAGE_SIZE, search='', course='', program=''):
+    """
+    Return ``(users, next_cursor)``: the next ``limit`` candidates after
+    cursor ``after``, each with a ``match_score`` attribute. Without
+    filters the cursor is a queue position; with them, an offset into the
+    filtered ranking. ``next_cursor`` is None when there are no more
+    matching candidates.
+    """
+    if search or course or program:
+        return _filtered_candidates(user, after, limit, search, course, program)
+
+    if _needs_build(user):
+        build_queue(user)
+
+    rows = DiscoveryCandidate.objects.filter(user=user, position__gt=after)
+    rows = list(rows.select_related('candidate__profile').order_by('position')[:limit + 1])
+    next_cursor = rows[limit - 1].position if len(rows) > limit else None
+
+    users = []
+    for row in _drop_stale(user, rows[:limit]):
+        row.candidate.match_score = row.score
+        users.append(row.candidate)
+    return users, next_cursor
+
+
+def remove(user, candidate_ids):
+    """Take candidates out of the user's queue once actioned."""
+    DiscoveryCandidate.objects.filter(user=user, candidate_id__in=candidate_ids).delete()
+
+
+def next_groups(user, search='', limit=GROUP_PAGE_SIZE):
+    """
+    The best ``limit`` groups for ``user`` that they have not actioned,
+    joined or asked to join, each with ``match_score`` and ``member_count``
+    attributes.
+    """
+    joined_or_requested = set(Membership.objects.filter(user=user).values_list('group_id', flat=True))
+    joined_or_requested.update(GroupJoinRequest.objects.filter(
+        user=user, status='pending',
+    ).values_list('group_id', flat=True))
+
+    candidates = None
+    if search:
+        candidates = StudyGroup.objects.filter(
+            Q(name__icontains=search) | Q(description__icontains=search)
+        ).values_list('id', flat=True)
+
+    ranked = ranking.rank_groups(
+        ranking.snapshot_for(user.id), user.id, limit,
+        exclude=seen_sets.union(user.id, 'group', joined_or_requested), candidates=candidates,
+    )
+    groups_by_id = StudyGroup.objects.in_bulk([group_id for group_id, _, _ in ranked])
+    groups = []
+    for group_id, score, member_count in ranked:
+        group = groups_by_id.get(group_id)
+        if group is not None:
+            group.match_score = score
+            group.member_count = member_count
+            groups.append(group)
+    return groups
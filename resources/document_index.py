@@ -0,0 +1,328 @@
+"""
+Document text extraction and search.
+
+Each document has a ``DocumentText`` row holding copies of its title,
+course and tag names, its visibility scope and the text extracted from its
+file. An SQLite FTS5 index in external-content mode covers those columns
+and is kept in sync by triggers on the row, the same way
+``resources.search`` indexes chat messages.
+
+Ingestion is incremental:
+
+* Saving a document or changing its tags rewrites the metadata columns at
+  once. Those are cheap, and the document becomes findable by title
+  straight away.
+* The row remembers the name and size of the file its text came from.
+  When a save changes the file, the row is marked ``pending``. Unchanged
+  documents are never re-read.
+* After commit a background thread extracts the text of pending rows (PDF
+  through pypdf, plain-text formats decoded directly). Run
+  ``python manage.py index_documents`` as a worker instead when
+  ``DOCUMENT_INDEX_AUTORUN`` is off; ``--reconcile`` also picks up documents
+  created or replaced without signals.
+
+``search`` ranks matches with BM25, weighting title and tag hits above
+body text, and applies the visibility rule of ``view_documents``:
+documents without a group are public, the rest are visible to the group's
+members only.
+"""
+import codecs
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+from pypdf import PdfReader
+from pypdf.errors import PyPdfError
+
+from . import membership, search as message_search
+from .models import Document, DocumentText
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = 'resources_documenttext_fts'
+PUBLIC_SCOPE = 'public'
+PDF_EXTENSIONS = {'.pdf'}
+TEXT_EXTENSIONS = {'.txt', '.md', '.markdown', '.csv', '.tex', '.rst', '.json', '.py'}
+# Extracted text is cut at this many characters; enough for any set of notes
+MAX_TEXT_CHARS = 1_000_000
+EXTRACT_BATCH_SIZE = 20
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 50
+SNIPPET_TOKENS = 32
+# BM25 weights of the FTS columns: title, course, tags, content, scope
+COLUMN_WEIGHTS = (10.0, 4.0, 6.0, 1.0, 0.0)
+
+
+def install(using=None):
+    """Create the FTS table and its sync triggers if missing (SQLite only)."""
+    using = using or connection
+    if using.vendor != 'sqlite':
+        return
+    columns = 'title, course, tags, content, scope'
+    new_values = 'new.document_id, new.title, new.course, new.tags, new.content, new.scope'
+    old_values = 'old.document_id, old.title, old.course, old.tags, old.content, old.scope'
+    insert = f"INSERT INTO {FTS_TABLE}(rowid, {columns}) VALUES ({new_values});"
+    delete = f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {columns}) VALUES ('delete', {old_values});"
+    with using.cursor() as cursor:
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            f"{columns}, content='resources_documenttext', content_rowid='document_id', "
+            f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+        cursor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON resources_documenttext "
+            f"BEGIN {insert} END"
+        )
+        cursor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON resources_documenttext "
+            f"BEGIN {delete} END"
+        )
+        cursor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF {columns} ON resources_documenttext "
+            f"BEGIN {delete} {insert} END"
+        )
+
+
+def rebuild(using=None):
+    """Re-index every ``DocumentText`` row."""
+    using = using or connection
+    if using.vendor != 'sqlite':
+        return
+    with using.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+# ── Ingestion ──────────────────────────────────────────────────
+
+def scope_of(document):
+    return f'group{document.group_id}' if document.group_id else PUBLIC_SCOPE
+
+
+def _source(document):
+    """``(name, size)`` of a document's file; size is None when it cannot be read."""
+    try:
+        return document.file.name, document.file.size
+    except (OSError, ValueError):
+        return document.file.name, None
+
+
+def sync(document):
+    """
+    Copy a document's metadata into its ``DocumentText`` row and mark it
+    pending when the file differs from the one last extracted. Returns
+    True when text extraction is needed.
+    """
+    name, size = _source(document)
+    values = {
+        'title': document.title,
+        'course': document.course,
+        'tags': ' '.join(document.tags.values_list('name', flat=True)) if document.pk else '',
+        'scope': scope_of(document),
+    }
+    text, created = DocumentText.objects.get_or_create(document=document, defaults=values)
+    changed = created or (text.source_name, text.source_size) != (name, size)
+    if changed:
+        values['status'] = 'pending'
+    if not created:
+        for field, value in values.items():
+            setattr(text, field, value)
+        text.save(update_fields=list(values))
+    if changed:
+        schedule()
+    return changed
+
+
+def sync_tags(document_ids):
+    """Refresh the tag names of documents whose tags changed."""
+    for document in Document.objects.filter(pk__in=document_ids).prefetch_related('tags'):
+        DocumentText.objects.filter(document=document).update(
+            tags=' '.join(tag.name for tag in document.tags.all()),
+        )
+
+
+def extract_text(name, file):
+    """Plain text of an open file, chosen by extension; None for unsupported formats."""
+    extension = os.path.splitext(name)[1].lower()
+    if extension in PDF_EXTENSIONS:
+        parts, length = [], 0
+        for page in PdfReader(file).pages:
+            page_text = page.extract_text() or ''
+            parts.append(page_text)
+            length += len(page_text)
+            if length >= MAX_TEXT_CHARS:
+                break
+        return '\n'.join(parts)[:MAX_TEXT_CHARS]
+    if extension in TEXT_EXTENSIONS:
+        data = file.read(MAX_TEXT_CHARS * 4)
+        try:
+            # Incremental, so a multi-byte character cut off by the read limit is not an error
+            return codecs.getincrementaldecoder('utf-8')().decode(data)[:MAX_TEXT_CHARS]
+        except UnicodeDecodeError:
+            return data.decode('latin-1')[:MAX_TEXT_CHARS]
+    return None
+
+
+def extract(text):
+    """Extract the file text of one ``DocumentText`` row and store it."""
+    document = text.document
+    name, size = _source(document)
+    try:
+        with document.file.open('rb') as file:
+            content = extract_text(name, file)
+    except (OSError, ValueError, PyPdfError) as exc:
+        text.status, text.error = 'failed', str(exc)[:255]
+    else:
+        text.status, text.error = 'indexed', ''
+        # Unsupported formats stay searchable by title, course and tags
+        text.content = content or ''
+    text.source_name, text.source_size = name, size
+    text.extracted_at = timezone.now()
+    text.save(update_fields=['content', 'status', 'error', 'source_name', 'source_size', 'extracted_at'])
+
+
+def extract_pending(limit=EXTRACT_BATCH_SIZE):
+    """Extract up to ``limit`` pending rows. Returns how many were processed."""
+    processed = 0
+    for text in DocumentText.objects.filter(status='pending').select_related('document').order_by('pk')[:limit]:
+        try:
+            extract(text)
+        except Exception as exc:
+            # A malformed file must not block the rest of the queue
+            logger.exception('Text extraction failed for document %s', text.pk)
+            DocumentText.objects.filter(pk=text.pk).update(status='failed', error=str(exc)[:255])
+        processed += 1
+    return processed
+
+
+def reconcile():
+    """Sync every document without a row or whose file changed since extraction. Returns the count."""
+    synced = 0
+    texts = {text.pk: text for text in DocumentText.objects.only('source_name', 'source_size', 'status')}
+    for document in Document.objects.order_by('pk').iterator():
+        text = texts.get(document.pk)
+        if text is None or (text.status != 'pending' and (text.source_name, text.source_size) != _source(document)):
+            sync(document)
+            synced += 1
+    return synced
+
+
+def schedule():
+    """Wake the in-process extractor once the current transaction commits."""
+    if getattr(settings, 'DOCUMENT_INDEX_AUTORUN', True):
+        transaction.on_commit(_extractor.wake)
+
+
+class _Extractor:
+    """In-process background thread that extracts pending documents after commits."""
+
+    def __init__(self):
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def wake(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='document-index', daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            try:
+                while extract_pending():
+                    pass
+            except Exception:
+                logger.exception('Document text extraction failed')
+            finally:
+                close_old_connections()
+
+
+_extractor = _Extractor()
+
+
+# ── Search ─────────────────────────────────────────────────────
+
+def visible_scopes(user):
+    """The scope tokens of the documents ``user`` may see."""
+    scopes = [PUBLIC_SCOPE]
+    if getattr(user, 'is_authenticated', False):
+        scopes += [f'group{group_id}' for group_id in sorted(membership.group_ids_for(user))]
+    return scopes
+
+
+def encode_cursor(score, pk):
+    return f'{score!r}_{pk}'
+
+
+def decode_cursor(cursor):
+    """Decode a cursor produced by encode_cursor, or return None if malformed."""
+    try:
+        score, pk = cursor.split('_', 1)
+        return float(score), int(pk)
+    except (AttributeError, ValueError):
+        return None
+
+
+def search(user, query, course='', after=None, limit=PAGE_SIZE):
+    """
+    Return ``(documents, next_cursor)``: the documents visible to ``user``
+    that match ``query``, most relevant first, each with a ``search_snippet``
+    attribute (HTML-escaped, matches in ``<mark>`` tags). ``course``
+    restricts results to that course name (case-insensitive); ``after`` is
+    a decoded cursor.
+    """
+    expression = message_search.match_expression(query)
+    if expression is None:
+        return [], None
+    terms = f'{{title course tags content}} : ({expression})'
+    scope_terms = ' OR '.join(f'"{scope}"' for scope in visible_scopes(user))
+    match = f'scope : ({scope_terms}) AND {terms}'
+
+    weights = ', '.join(str(weight) for weight in COLUMN_WEIGHTS)
+    sql = f"SELECT id, score FROM (SELECT rowid AS id, bm25({FTS_TABLE}, {weights}) AS score FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s"
+    params = [match]
+    if course:
+        sql += " AND rowid IN (SELECT document_id FROM resources_documenttext WHERE course = %s COLLATE NOCASE)"
+        params.append(course)
+    sql += ")"
+    if after is not None:
+        score, pk = after
+        sql += " WHERE score > %s OR (score = %s AND id > %s)"
+        params += [score, score, pk]
+    sql += " ORDER BY score, id LIMIT %s"
+    params.append(limit + 1)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = encode_cursor(rows[limit - 1][1], rows[limit - 1][0])
+    rows = rows[:limit]
+    if not rows:
+        return [], None
+
+    # Snippets for this page only: from the body text, or the title when the body has no match
+    ids = [pk for pk, _ in rows]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid, snippet({FTS_TABLE}, -1, %s, %s, '…', %s) FROM {FTS_TABLE} "
+            f"WHERE {FTS_TABLE} MATCH %s AND rowid IN ({', '.join(['%s'] * len(ids))})",
+            [message_search.MARK_START, message_search.MARK_END, SNIPPET_TOKENS, terms, *ids],
+        )
+        snippets = dict(cursor.fetchall())
+    documents = Document.objects.select_related('uploaded_by', 'group').prefetch_related('tags').in_bulk(ids)
+
+    results = []
+    for pk in ids:
+        document = documents.get(pk)
+        if document is not None:
+            document.search_snippet = message_search.highlight(snippets.get(pk, document.title))
+            results.append(document)
+    return results, next_cursor
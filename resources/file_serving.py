@@ -0,0 +1,336 @@
+"""
+Pluggable serving of protected media files.
+
+Views check access (e.g. group membership) and then call ``serve``, which
+builds the response through the backend named by ``FILE_SERVING_BACKEND``:
+
+``'django'`` (default)
+    Streams the file from Python with ``FileResponse``. Fine for
+    development, but it ties up a worker for the whole download.
+``'x-accel-redirect'``
+    Returns an empty response with an ``X-Accel-Redirect`` header, and
+    nginx sends the bytes from an ``internal`` location that maps
+    ``FILE_SERVING_ACCEL_PREFIX`` onto ``MEDIA_ROOT``::
+
+        location /protected-media/ {
+            internal;
+            alias /path/to/media/;
+        }
+
+``'x-sendfile'``
+    The same hand-off with an ``X-Sendfile`` header holding the absolute
+    path, for Apache (mod_xsendfile) or lighttpd.
+
+A dotted path to a ``FileServingBackend`` subclass also works. Every
+backend sets the content type (guessed from the file name), an inline or
+attachment ``Content-Disposition`` with the original file name, an
+``ETag`` and ``Last-Modified``, and ``Cache-Control: private, no-cache`` so
+browsers keep a copy but revalidate it, because access can be revoked
+(``max_age`` relaxes this for versioned URLs such as thumbnails).
+Files a storage backend cannot give a local path for are always streamed
+by Django.
+
+The files are user uploads served from the app's own origin, so only
+types browsers display passively (``INLINE_CONTENT_TYPES``: PDF, raster
+images, plain text) are sent inline. Anything else, HTML and SVG
+included, is sent as an ``application/octet-stream`` attachment, and every
+response carries ``Content-Security-Policy: sandbox`` so a file that is
+rendered anyway cannot run script with the user's session.
+
+The ETag is the SHA-256 of the file's content when the caller passes it
+(``Document.sha256``, ``MessageAttachment.sha256``), so a file replaced by
+an identical upload still validates; otherwise it falls back to size and
+modification time. Conditional requests (``If-None-Match``,
+``If-Modified-Since``, ``If-Match``) are answered here with 304 or 412
+before any backend is involved.
+
+Byte ranges (``Range``, with ``If-Range`` so a resumed download never
+splices two versions of a file) are served by the Django backend as a
+single 206 part or a ``multipart/byteranges`` body. The proxy backends
+leave ranges to the front server, which handles them for the files it
+sends.
+"""
+import hashlib
+import mimetypes
+import os
+import secrets
+from collections import namedtuple
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe
+from django.utils.module_loading import import_string
+
+FileInfo = namedtuple('FileInfo', 'name path size modified content_type etag')
+
+CHUNK_SIZE = 64 * 1024
+# Requests asking for more separate ranges than this get the whole file
+MAX_RANGES = 16
+# The only types shown in the browser; everything else is downloaded
+INLINE_CONTENT_TYPES = {
+    'application/pdf', 'image/jpeg', 'image/png', 'image/gif', 'image/webp', 'image/bmp', 'text/plain',
+}
+
+
+def _local_path(field_file):
+    try:
+        return field_file.path
+    except NotImplementedError:
+        return None
+
+
+def file_hash(file):
+    """Hex SHA-256 of a stored or uploaded file, read in chunks."""
+    digest = hashlib.sha256()
+    for chunk in file.chunks(CHUNK_SIZE):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def ensure_hash(instance):
+    """
+    The ``sha256`` of a document or attachment, computed and stored on
+    first use for rows saved before hashes were recorded.
+    """
+    if not instance.sha256:
+        try:
+            instance.sha256 = file_hash(instance.file)
+        finally:
+            instance.file.close()
+        type(instance).objects.filter(pk=instance.pk).update(sha256=instance.sha256)
+    return instance.sha256
+
+
+def file_info(field_file, content_hash=None):
+    """
+    Size, modification time, content type and ETag of a stored file.
+    Raises ``FileNotFoundError`` when the file is missing.
+    """
+    name = field_file.name
+    path = _local_path(field_file)
+    if path is not None:
+        stat = os.stat(path)
+        size, modified = stat.st_size, stat.st_mtime
+    else:
+        storage = field_file.storage
+        if not storage.exists(name):
+            raise FileNotFoundError(name)
+        size, modified = storage.size(name), storage.get_modified_time(name).timestamp()
+    content_type, encoding = mimetypes.guess_type(name)
+    if encoding or not content_type:
+        # A .gz or unknown file is downloaded as-is, not decoded by the browser
+        content_type = 'application/octet-stream'
+    if content_hash:
+        etag = f'"{content_hash}"'
+    else:
+        etag = f'"{size:x}-{int(modified * 1_000_000):x}"'
+    return FileInfo(name, path, size, modified, content_type, etag)
+
+
+def parse_range(header, size):
+    """
+    The ``(first, last)`` byte positions (inclusive) a ``Range`` header
+    asks for in a file of ``size`` bytes, sorted with overlapping and
+    adjacent ranges merged. Returns None when the header is missing,
+    malformed or asks for too many ranges (serve the whole file), and an
+    empty list when no range overlaps the file (416).
+    """
+    unit, _, specs = (header or '').partition('=')
+    if unit.strip().lower() != 'bytes' or not specs.strip():
+        return None
+    ranges = []
+    for spec in specs.split(','):
+        first, dash, last = spec.strip().partition('-')
+        if not dash or not (first + last).isdigit():
+            return None
+        if not first:
+            # Suffix range: the final N bytes (none of an empty file)
+            if int(last) == 0 or size == 0:
+                continue
+            ranges.append((max(size - int(last), 0), size - 1))
+            continue
+        if last and int(last) < int(first):
+            return None
+        first = int(first)
+        if first < size:
+            ranges.append((first, min(int(last), size - 1) if last else size - 1))
+    ranges.sort()
+    merged = []
+    for first, last in ranges:
+        if merged and first <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], last))
+        else:
+            merged.append((first, last))
+    if len(merged) > MAX_RANGES:
+        return None
+    return merged
+
+
+def requested_ranges(request, info):
+    """
+    The byte ranges to send for ``request``, or None for the whole file.
+    ``If-Range`` only allows a partial response when the client's copy is
+    the current one: a strong ETag match or an exact ``Last-Modified``.
+    """
+    if request.method not in ('GET', 'HEAD') or 'HTTP_RANGE' not in request.META:
+        return None
+    if_range = request.META.get('HTTP_IF_RANGE', '').strip()
+    if if_range:
+        if if_range.startswith(('"', 'W/')):
+            if if_range != info.etag:
+                return None
+        elif parse_http_date_safe(if_range) != int(info.modified):
+            return None
+    return parse_range(request.META['HTTP_RANGE'], info.size)
+
+
+def _read(field_file, ranges):
+    """Yield the bytes of ``ranges`` from the file in chunks, each range followed by None."""
+    with field_file.storage.open(field_file.name, 'rb') as file:
+        for first, last in ranges:
+            file.seek(first)
+            remaining = last - first + 1
+            while remaining > 0:
+                chunk = file.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+            yield None
+
+
+def _single_part(field_file, ranges):
+    for chunk in _read(field_file, ranges):
+        if chunk is not None:
+            yield chunk
+
+
+def _multipart(field_file, ranges, delimiters):
+    """Yield a ``multipart/byteranges`` body: each part's headers, then its bytes, then the closing line."""
+    delimiters = iter(delimiters)
+    yield next(delimiters)
+    for chunk in _read(field_file, ranges):
+        # The end of each range is followed by the next part's headers
+        yield next(delimiters) if chunk is None else chunk
+
+
+class FileServingBackend:
+    """Builds the response for one file; subclasses decide who sends the bytes."""
+
+    def serve(self, request, field_file, filename=None, as_attachment=False, content_hash=None, max_age=None):
+        info = file_info(field_file, content_hash)
+        if info.content_type not in INLINE_CONTENT_TYPES:
+            # HTML, SVG and the like would run script on this origin
+            info = info._replace(content_type='application/octet-stream')
+            as_attachment = True
+        response = get_conditional_response(request, etag=info.etag, last_modified=int(info.modified))
+        if response is None:
+            response = self.response(request, field_file, info)
+            response['Content-Disposition'] = content_disposition_header(
+                as_attachment, filename or os.path.basename(info.name),
+            )
+            response['X-Content-Type-Options'] = 'nosniff'
+            response['Content-Security-Policy'] = 'sandbox'
+        response['ETag'] = info.etag
+        response['Last-Modified'] = http_date(info.modified)
+        response['Cache-Control'] = f'private, max-age={max_age}, immutable' if max_age else 'private, no-cache'
+        return response
+
+    def response(self, request, field_file, info):
+        """The 200 or 206 response with the body or hand-off header and ``Content-Type``."""
+        raise NotImplementedError
+
+
+class DjangoBackend(FileServingBackend):
+    """Stream the file (or the requested ranges of it) from the worker process."""
+
+    def response(self, request, field_file, info):
+        ranges = requested_ranges(request, info)
+        if ranges is None:
+            response = FileResponse(field_file.open('rb'))
+            response['Content-Type'] = info.content_type
+            response['Content-Length'] = str(info.size)
+        elif not ranges:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{info.size}'
+        elif len(ranges) == 1:
+            (first, last), = ranges
+            response = StreamingHttpResponse(_single_part(field_file, ranges), status=206)
+            response['Content-Type'] = info.content_type
+            response['Content-Range'] = f'bytes {first}-{last}/{info.size}'
+            response['Content-Length'] = str(last - first + 1)
+        else:
+            boundary = secrets.token_hex(16)
+            part_headers = [
+                (
+                    f'\r\n--{boundary}\r\nContent-Type: {info.content_type}\r\n'
+                    f'Content-Range: bytes {first}-{last}/{info.size}\r\n\r\n'
+                ).encode('ascii')
+                for first, last in ranges
+            ]
+            delimiters = part_headers + [f'\r\n--{boundary}--\r\n'.encode('ascii')]
+            length = sum(map(len, delimiters)) + sum(last - first + 1 for first, last in ranges)
+            response = StreamingHttpResponse(_multipart(field_file, ranges, delimiters), status=206)
+            response['Content-Type'] = f'multipart/byteranges; boundary={boundary}'
+            response['Content-Length'] = str(length)
+        response['Accept-Ranges'] = 'bytes'
+        return response
+
+
+class XAccelRedirectBackend(FileServingBackend):
+    """Hand the transfer to nginx through an internal location."""
+
+    def response(self, request, field_file, info):
+        if info.path is None:
+            return DjangoBackend().response(request, field_file, info)
+        prefix = getattr(settings, 'FILE_SERVING_ACCEL_PREFIX', '/protected-media/')
+        response = HttpResponse(content_type=info.content_type)
+        response['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + quote(info.name.replace(os.sep, '/'))
+        return response
+
+
+class XSendfileBackend(FileServingBackend):
+    """Hand the transfer to Apache (mod_xsendfile) or lighttpd."""
+
+    def response(self, request, field_file, info):
+        if info.path is None:
+            return DjangoBackend().response(request, field_file, info)
+        response = HttpResponse(content_type=info.content_type)
+        response['X-Sendfile'] = info.path
+        return response
+
+
+BACKENDS = {
+    'django': DjangoBackend,
+    'x-accel-redirect': XAccelRedirectBackend,
+    'x-sendfile': XSendfileBackend,
+}
+
+_backend = None
+
+
+def get_backend():
+    """The configured backend instance, created on first use."""
+    global _backend
+    name = getattr(settings, 'FILE_SERVING_BACKEND', 'django')
+    if _backend is None or _backend[0] != name:
+        backend_class = BACKENDS.get(name) or import_string(name)
+        _backend = (name, backend_class())
+    return _backend[1]
+
+
+def serve(request, field_file, filename=None, as_attachment=False, content_hash=None, max_age=None):
+    """
+    Response to ``request`` that delivers ``field_file`` (access already
+    checked) under ``filename`` (default: the stored name's basename), with
+    ``content_hash`` (hex SHA-256) as its ETag when given. ``max_age``
+    (seconds) lets browsers reuse the file without revalidating, for URLs
+    that change whenever the file does. Raises ``FileNotFoundError`` when
+    the file is missing from storage.
+    """
+    return get_backend().serve(
+        request, field_file, filename=filename, as_attachment=as_attachment, content_hash=content_hash,
+        max_age=max_age,
+    )
@@ -1,8 +1,8 @@
 from django import forms
-from .models import Document, StudyGroup, Message, GroupInvite, Friendship, PrivateMessage, MessageReaction, MessageAttachment
+from .models import Document, StudyGroup, Message, GroupInvite, PrivateMessage, MessageReaction, MessageAttachment
+from . import friends
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db import models as django_models
 
 User = get_user_model()
 
@@ -138,15 +138,12 @@ class AddFriendForm(forms.Form):
         
         # Check if already friends or request pending
         if self.current_user:
-            existing = Friendship.objects.filter(
-                django_models.Q(from_user=self.current_user, to_user=user) |
-                django_models.Q(from_user=user, to_user=self.current_user)
-            ).first()
+            existing = friends.between(self.current_user, user)
             
             if existing:
                 if existing.status == 'accepted':
                     raise forms.ValidationError("You are already friends with this user.")
-                elif existing.status == 'pending':
+                elif existing.status == 'pending' and existing.from_user_id == self.current_user.pk:
                     raise forms.ValidationError("Friend request is already pending.")
                 elif existing.status == 'blocked':
                     raise forms.ValidationError("Cannot send friend request to this user.")
@@ -0,0 +1,98 @@
+"""
+Friend graph.
+
+Each pair of users has at most one ``Friendship`` row, whichever way the
+request went: the database derives the canonical ordered pair
+(``user_low``, ``user_high``) from ``from_user``/``to_user``, and a unique
+constraint on it rejects a second row for the same pair. Looking up the
+relation between two users is one probe of that constraint's index instead
+of an OR across both directions.
+
+``friends_of`` reads a user's accepted friends through the two indexes on
+(user_low, status, user_high) and (user_high, status, user_low), one range
+per side of the pair, and keeps the id set in the Django cache for
+``FRIEND_GRAPH_CACHE_TTL`` seconds. Signal handlers in ``resources.signals``
+drop the cached sets of both users whenever a friendship row is saved or
+deleted. ``are_friends`` and ``mutual_friends`` are set operations on the
+cached sets.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Friendship
+
+
+def _cache_ttl():
+    return getattr(settings, 'FRIEND_GRAPH_CACHE_TTL', 300)
+
+
+def _cache_key(user_id):
+    return f'friend-ids:{user_id}'
+
+
+def _id(user):
+    return getattr(user, 'pk', user)
+
+
+def _pair(user1, user2):
+    low, high = _id(user1), _id(user2)
+    return (low, high) if low < high else (high, low)
+
+
+def friends_of(user):
+    """Frozenset of the ids of ``user``'s accepted friends (a user or a user id)."""
+    user_id = _id(user)
+    ttl = _cache_ttl()
+    ids = cache.get(_cache_key(user_id)) if ttl else None
+    if ids is None:
+        accepted = Friendship.objects.filter(status='accepted').order_by()
+        ids = frozenset(
+            accepted.filter(user_low=user_id).values_list('user_high', flat=True)
+            .union(accepted.filter(user_high=user_id).values_list('user_low', flat=True))
+        )
+        if ttl:
+            cache.set(_cache_key(user_id), ids, ttl)
+    return ids
+
+
+def are_friends(user1, user2):
+    return _id(user2) in friends_of(user1)
+
+
+def mutual_friends(user1, user2):
+    """Ids of the users who are friends with both."""
+    return friends_of(user1) & friends_of(user2)
+
+
+def between(user1, user2):
+    """The friendship row of a pair in either direction, or None."""
+    low, high = _pair(user1, user2)
+    return Friendship.objects.filter(user_low=low, user_high=high).first()
+
+
+def send_request(from_user, to_user):
+    """
+    Open a pending request from ``from_user`` to ``to_user``. Returns
+    ``(friendship, sent)``; a pending request the other way is accepted, a
+    declined pair is reopened in the new direction, any other existing
+    relation is returned unchanged.
+    """
+    friendship = between(from_user, to_user)
+    if friendship is None:
+        return Friendship.objects.create(from_user=from_user, to_user=to_user, status='pending'), True
+    if friendship.status == 'pending' and friendship.from_user_id == _id(to_user):
+        friendship.status = 'accepted'
+        friendship.save()
+        return friendship, False
+    if friendship.status == 'declined':
+        friendship.from_user, friendship.to_user = from_user, to_user
+        friendship.status = 'pending'
+        friendship.save()
+        return friendship, True
+    return friendship, False
+
+
+def invalidate(user_ids):
+    """Forget the cached friend sets of ``user_ids``."""
+    if _cache_ttl():
+        cache.delete_many([_cache_key(user_id) for user_id in set(user_ids)])
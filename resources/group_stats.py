@@ -0,0 +1,150 @@
+"""
+Maintained per-group statistics for group discovery.
+
+Scoring groups by their members' courses at request time joins every group
+to every member, so the member count and the score depend on the join's
+fan-out and the cost grows with total membership. Each group instead has
+one ``GroupStats`` row holding its member count, a histogram of members per
+course and a decayed count of recent messages. ``resources.ranking`` reads
+these rows once per snapshot, and a group's same-course share is then a
+lookup in the histogram rather than a join.
+
+Signal handlers in ``resources.signals`` adjust the row as members join or
+leave, change course, or post and delete messages. A group without a row gets one
+built from the source tables the next time it grows. The
+``rebuild_group_stats`` management command recomputes every row.
+
+Recent activity counts each message as 1, halving every
+``GroupStats.ACTIVITY_HALF_LIFE``; storing the value with the time it was
+last updated lets a new message be added without rereading history.
+"""
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import GroupStats, Membership, Message, StudyGroup
+
+User = get_user_model()
+
+# Messages older than this many half-lives add under 1% to the activity
+ACTIVITY_WINDOW_HALF_LIVES = 7
+
+
+def _locked(group_id):
+    return GroupStats.objects.select_for_update().filter(pk=group_id).first()
+
+
+def _apply_courses(course_counts, courses, delta):
+    for course, count in courses.items():
+        remaining = course_counts.get(course, 0) + delta * count
+        if remaining > 0:
+            course_counts[course] = remaining
+        else:
+            course_counts.pop(course, None)
+
+
+def members_changed(group_id, user_ids, delta):
+    """Record that ``user_ids`` joined (``delta=1``) or left (``delta=-1``) a group."""
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+    courses = Counter(User.objects.filter(id__in=user_ids).values_list('course', flat=True))
+    with transaction.atomic():
+        stats = _locked(group_id)
+        if stats is None:
+            # Nothing to adjust; a growing group gets a row that already includes the change
+            if delta > 0:
+                recompute(group_id)
+            return
+        stats.member_count = max(stats.member_count + delta * len(user_ids), 0)
+        _apply_courses(stats.course_counts, courses, delta)
+        stats.save(update_fields=['member_count', 'course_counts', 'updated_at'])
+
+
+def course_changed(user_id, old_course, new_course):
+    """Move a user between histogram buckets in every group they belong to."""
+    with transaction.atomic():
+        for stats in GroupStats.objects.select_for_update().filter(group__memberships__user_id=user_id):
+            _apply_courses(stats.course_counts, {old_course: 1}, -1)
+            _apply_courses(stats.course_counts, {new_course: 1}, 1)
+            stats.save(update_fields=['course_counts', 'updated_at'])
+
+
+def message_posted(group_id, posted_at=None):
+    """Add one message to a group's recent activity."""
+    posted_at = posted_at or timezone.now()
+    with transaction.atomic():
+        stats = _locked(group_id)
+        if stats is None:
+            recompute(group_id)
+            return
+        at = max(posted_at, stats.activity_at or posted_at)
+        stats.recent_activity = stats.activity(at) + 1
+        stats.activity_at = at
+        stats.save(update_fields=['recent_activity', 'activity_at', 'updated_at'])
+
+
+def message_deleted(group_id, posted_at):
+    """Take one message back out of a group's recent activity, at the weight it has decayed to."""
+    with transaction.atomic():
+        stats = _locked(group_id)
+        if stats is None or stats.activity_at is None:
+            return
+        elapsed = max(stats.activity_at - posted_at, timedelta(0))
+        stats.recent_activity = max(stats.recent_activity - 0.5 ** (elapsed / GroupStats.ACTIVITY_HALF_LIFE), 0.0)
+        stats.save(update_fields=['recent_activity', 'updated_at'])
+
+
+# ── Rebuilding from the source tables ──────────────────────────
+
+def _compute(group_ids=None):
+    """``{group_id: field values}`` for the given groups (default: all)."""
+    groups = StudyGroup.objects.all()
+    memberships = Membership.objects.all()
+    now = timezone.now()
+    messages = Message.objects.filter(
+        timestamp__gte=now - GroupStats.ACTIVITY_HALF_LIFE * ACTIVITY_WINDOW_HALF_LIVES,
+    )
+    if group_ids is not None:
+        groups = groups.filter(id__in=group_ids)
+        memberships = memberships.filter(group_id__in=group_ids)
+        messages = messages.filter(group_id__in=group_ids)
+
+    values = {
+        group_id: {'member_count': 0, 'course_counts': {}, 'recent_activity': 0.0, 'activity_at': None}
+        for group_id in groups.values_list('id', flat=True)
+    }
+    for group_id, course, count in memberships.values('group_id', 'user__course').annotate(
+        n=Count('id')
+    ).values_list('group_id', 'user__course', 'n').order_by():
+        values[group_id]['member_count'] += count
+        values[group_id]['course_counts'][course] = count
+
+    activity = defaultdict(float)
+    for group_id, timestamp in messages.values_list('group_id', 'timestamp').iterator():
+        activity[group_id] += 0.5 ** ((now - timestamp) / GroupStats.ACTIVITY_HALF_LIFE)
+    for group_id, total in activity.items():
+        values[group_id].update(recent_activity=total, activity_at=now)
+    return values
+
+
+def recompute(group_id):
+    """Rebuild one group's row from the source tables."""
+    values = _compute([group_id]).get(group_id)
+    if values is None:
+        return None
+    stats, _ = GroupStats.objects.update_or_create(group_id=group_id, defaults=values)
+    return stats
+
+
+def rebuild_all(batch_size=1000):
+    """Recompute every group's row and rewrite the table. Returns the number of rows written."""
+    rows = [GroupStats(group_id=group_id, **values) for group_id, values in _compute().items()]
+    with transaction.atomic():
+        GroupStats.objects.all().delete()
+        GroupStats.objects.bulk_create(rows, batch_size=batch_size)
+    return len(rows)
@@ -0,0 +1,76 @@
+"""
+Django management command that times the discovery ranking engine.
+Usage: python manage.py benchmark_ranking [--users 100000] [--groups 5000] [--rounds 20] [--live]
+"""
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from resources import ranking
+
+
+class Command(BaseCommand):
+    help = 'Time people and group ranking on a synthetic (or the live) feature snapshot'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users',
+            type=int,
+            default=100000,
+            help='Synthetic users to rank',
+        )
+        parser.add_argument(
+            '--groups',
+            type=int,
+            default=5000,
+            help='Synthetic study groups',
+        )
+        parser.add_argument(
+            '--rounds',
+            type=int,
+            default=20,
+            help='Ranking calls timed per kind',
+        )
+        parser.add_argument(
+            '--top',
+            type=int,
+            default=500,
+            help='Candidates returned per call (the discovery queue size)',
+        )
+        parser.add_argument(
+            '--live',
+            action='store_true',
+            help='Benchmark the snapshot of the real database instead',
+        )
+
+    def handle(self, *args, **options):
+        if options['rounds'] < 1 or options['users'] < 2 or options['groups'] < 1:
+            raise CommandError('--rounds and --groups must be positive and --users at least 2')
+
+        started = time.perf_counter()
+        if options['live']:
+            snapshot = ranking.get_snapshot(refresh=True)
+        else:
+            snapshot = ranking.FeatureSnapshot.synthetic(options['users'], options['groups'])
+        self.stdout.write(
+            f'Snapshot of {len(snapshot)} users and {len(snapshot.group_ids)} groups '
+            f'built in {(time.perf_counter() - started) * 1000:.0f} ms'
+        )
+        if len(snapshot) < 2:
+            raise CommandError('The snapshot needs at least two users')
+
+        user_ids = snapshot.user_ids[::max(len(snapshot) // options['rounds'], 1)][:options['rounds']]
+        for label, rank in (
+            ('rank_users', lambda user_id: ranking.rank_users(snapshot, user_id, options['top'], seed=user_id)),
+            ('rank_groups', lambda user_id: ranking.rank_groups(snapshot, user_id, 50)),
+        ):
+            timings = []
+            for user_id in user_ids.tolist():
+                started = time.perf_counter()
+                rank(user_id)
+                timings.append((time.perf_counter() - started) * 1000)
+            self.stdout.write(self.style.SUCCESS(
+                f'{label}: median {statistics.median(timings):.1f} ms, '
+                f'max {max(timings):.1f} ms over {len(timings)} calls'
+            ))
@@ -0,0 +1,54 @@
+"""
+Django management command that precomputes people-discovery candidate queues.
+Usage: python manage.py build_discovery_queues [--user USERNAME] [--stale-hours 24] [--batch-size 100]
+"""
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from django.utils import timezone
+
+from resources import discovery
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Build the ranked, shuffled discovery candidate queue of each user'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            help='Only rebuild the queue of this username',
+        )
+        parser.add_argument(
+            '--stale-hours',
+            type=float,
+            help='Only rebuild queues older than this many hours (or never built)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Users loaded per batch',
+        )
+
+    def handle(self, *args, **options):
+        if options['user']:
+            try:
+                user = User.objects.select_related('profile').get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"User '{options['user']}' does not exist")
+            size = discovery.build_queue(user)
+            self.stdout.write(self.style.SUCCESS(f'Built a queue of {size} candidates for {user.username}'))
+            return
+
+        users = User.objects.filter(is_active=True)
+        if options['stale_hours'] is not None:
+            cutoff = timezone.now() - timedelta(hours=options['stale_hours'])
+            users = users.filter(
+                Q(discovery_queue__isnull=True) | Q(discovery_queue__built_at__lt=cutoff)
+            )
+        built = discovery.build_all(batch_size=options['batch_size'], users=users)
+        self.stdout.write(self.style.SUCCESS(f'Built discovery queues for {built} users'))
@@ -0,0 +1,50 @@
+"""
+Django management command that precomputes "people you may know" suggestions.
+Usage: python manage.py build_friend_suggestions [--user USERNAME] [--top 20] [--block-size 1000]
+"""
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from resources import suggestions
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Rank friend suggestions by mutual friends and shared study groups for each user'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            help='Only rebuild the suggestions of this username',
+        )
+        parser.add_argument(
+            '--top',
+            type=int,
+            default=suggestions.SUGGESTIONS_PER_USER,
+            help='Suggestions stored per user',
+        )
+        parser.add_argument(
+            '--block-size',
+            type=int,
+            default=suggestions.BLOCK_SIZE,
+            help='Users ranked per block of matrix rows',
+        )
+
+    def handle(self, *args, **options):
+        if options['top'] < 1 or options['block_size'] < 1:
+            raise CommandError('--top and --block-size must be positive')
+
+        user_ids = None
+        if options['user']:
+            user_ids = list(User.objects.filter(username=options['user']).values_list('id', flat=True))
+            if not user_ids:
+                raise CommandError(f"User '{options['user']}' does not exist")
+
+        started = time.perf_counter()
+        written = suggestions.build(user_ids, top=options['top'], block_size=options['block_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Stored {written} friend suggestions in {time.perf_counter() - started:.1f} s'
+        ))
@@ -0,0 +1,26 @@
+"""
+Django management command that recounts blob references and deletes unreferenced blobs.
+Usage: python manage.py collect_blobs [--dry-run]
+"""
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from resources import blobs
+
+
+class Command(BaseCommand):
+    help = 'Recount references to stored document and attachment blobs and delete the unreferenced ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report what would change without changing anything',
+        )
+
+    def handle(self, *args, **options):
+        recounted, deleted = blobs.collect(default_storage, dry_run=options['dry_run'])
+        prefix = 'Dry run: ' if options['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            f'{prefix}{recounted} reference counts corrected, {deleted} unreferenced files deleted'
+        ))
@@ -0,0 +1,69 @@
+"""
+Django management command that delivers queued Pusher events from the outbox.
+Usage: python manage.py dispatch_pusher_events [--once] [--interval 1.0] [--retry-failed] [--purge-days 1]
+"""
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from resources import realtime
+from resources.models import OutboxEvent
+
+
+class Command(BaseCommand):
+    help = 'Drain the Pusher outbox, delivering queued realtime events in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Drain the outbox once and exit instead of running as a worker',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=1.0,
+            help='Seconds to sleep between polls when the outbox is empty',
+        )
+        parser.add_argument(
+            '--retry-failed',
+            action='store_true',
+            help='Reset the attempt counter of events that exhausted their retries',
+        )
+        parser.add_argument(
+            '--purge-days',
+            type=int,
+            default=1,
+            help='Delete delivered events older than this many days on each cycle',
+        )
+
+    def handle(self, *args, **options):
+        if options['retry_failed']:
+            reset = OutboxEvent.objects.filter(
+                dispatched_at__isnull=True,
+                attempts__gte=realtime.MAX_ATTEMPTS,
+            ).update(attempts=0, last_error='')
+            self.stdout.write(f'Re-queued {reset} failed events')
+
+        purge_after = timedelta(days=options['purge_days'])
+
+        if options['once']:
+            sent = realtime.drain()
+            purged = realtime.purge_dispatched(purge_after)
+            self.stdout.write(self.style.SUCCESS(f'Dispatched {sent} events, purged {purged}'))
+            return
+
+        self.stdout.write(self.style.SUCCESS('Dispatching Pusher events (Ctrl+C to stop)...'))
+        try:
+            while True:
+                sent = realtime.drain()
+                if sent:
+                    self.stdout.write(f'Dispatched {sent} events')
+                else:
+                    realtime.purge_dispatched(purge_after)
+                    time.sleep(options['interval'])
+                close_old_connections()
+        except KeyboardInterrupt:
+            self.stdout.write('Stopped')
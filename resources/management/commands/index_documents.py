@@ -0,0 +1,76 @@
+"""
+Django management command that extracts document text into the search index.
+Usage: python manage.py index_documents [--once] [--interval 5.0] [--reconcile] [--retry-failed] [--rebuild]
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from resources import document_index
+from resources.models import DocumentText
+
+
+class Command(BaseCommand):
+    help = 'Extract the text of new and changed documents for document search'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Process the pending documents once and exit instead of running as a worker',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=5.0,
+            help='Seconds to sleep between polls when nothing is pending',
+        )
+        parser.add_argument(
+            '--reconcile',
+            action='store_true',
+            help='First queue documents that have no index row or whose file changed',
+        )
+        parser.add_argument(
+            '--retry-failed',
+            action='store_true',
+            help='Queue documents whose extraction failed again',
+        )
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Recreate the index triggers if missing and re-index all stored text',
+        )
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            document_index.install()
+            document_index.rebuild()
+            self.stdout.write('Rebuilt the document search index')
+        if options['reconcile']:
+            self.stdout.write(f'Queued {document_index.reconcile()} new or changed documents')
+        if options['retry_failed']:
+            retried = DocumentText.objects.filter(status='failed').update(status='pending', error='')
+            self.stdout.write(f'Re-queued {retried} failed documents')
+
+        if options['once']:
+            processed = 0
+            while True:
+                batch = document_index.extract_pending()
+                if not batch:
+                    break
+                processed += batch
+            self.stdout.write(self.style.SUCCESS(f'Extracted {processed} documents'))
+            return
+
+        self.stdout.write(self.style.SUCCESS('Extracting document text (Ctrl+C to stop)...'))
+        try:
+            while True:
+                processed = document_index.extract_pending()
+                if processed:
+                    self.stdout.write(f'Extracted {processed} documents')
+                else:
+                    time.sleep(options['interval'])
+                close_old_connections()
+        except KeyboardInterrupt:
+            self.stdout.write('Stopped')
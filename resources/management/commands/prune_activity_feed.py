@@ -0,0 +1,34 @@
+"""
+Django management command that deletes old dashboard activity feed events.
+Usage: python manage.py prune_activity_feed [--days 30] [--batch-size 10000]
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from resources import activity
+
+
+class Command(BaseCommand):
+    help = 'Delete activity feed events older than the retention period'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=getattr(settings, 'ACTIVITY_FEED_RETENTION_DAYS', 30),
+            help='Keep events from this many most recent days',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=10000,
+            help='Rows deleted per statement',
+        )
+
+    def handle(self, *args, **options):
+        if options['days'] < 0 or options['batch_size'] < 1:
+            raise CommandError('--days must be non-negative and --batch-size positive')
+        deleted = activity.prune(timedelta(days=options['days']), batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} activity events'))
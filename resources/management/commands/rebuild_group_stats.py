@@ -0,0 +1,31 @@
+"""
+Django management command to rebuild the per-group discovery statistics.
+Usage: python manage.py rebuild_group_stats [--group GROUP_ID]
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from resources import group_stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute group member counts, course histograms and recent activity from scratch'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--group',
+            type=int,
+            help='Only rebuild the stats of this group id',
+        )
+
+    def handle(self, *args, **options):
+        if options['group'] is not None:
+            stats = group_stats.recompute(options['group'])
+            if stats is None:
+                raise CommandError(f"Group {options['group']} does not exist")
+            self.stdout.write(self.style.SUCCESS(
+                f'Rebuilt stats for {stats.group.name}: {stats.member_count} members'
+            ))
+            return
+
+        rows = group_stats.rebuild_all()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt stats for {rows} groups'))
@@ -0,0 +1,19 @@
+"""
+Django management command to rebuild the chat message full-text index.
+Usage: python manage.py rebuild_search_index
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from resources import search
+
+
+class Command(BaseCommand):
+    help = 'Recreate the message search index triggers if missing and re-index all group and private messages'
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('The message search index needs SQLite (FTS5)')
+        search.install()
+        search.rebuild()
+        self.stdout.write(self.style.SUCCESS('Rebuilt the message search index'))
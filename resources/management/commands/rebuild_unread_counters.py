@@ -0,0 +1,33 @@
+"""
+Django management command to rebuild the denormalized unread counters.
+Usage: python manage.py rebuild_unread_counters [--user USERNAME]
+"""
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from resources import counters
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Recompute unread notification, message and request counters from scratch'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            help='Only rebuild the counters of this username',
+        )
+
+    def handle(self, *args, **options):
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"User '{options['user']}' does not exist")
+            counts = counters.recount(user.id).as_dict()
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt counters for {user.username}: {counts}'))
+            return
+
+        rows = counters.rebuild_all()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt unread counters for {rows} users'))
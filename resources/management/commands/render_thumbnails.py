@@ -0,0 +1,67 @@
+"""
+Django management command that renders thumbnails of stored documents and attachments.
+Usage: python manage.py render_thumbnails [--once] [--interval 5.0] [--retry-failed] [--rebuild]
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from resources import previews
+from resources.models import Blob
+
+
+class Command(BaseCommand):
+    help = 'Render thumbnails of new documents and attachments'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Render the pending thumbnails once and exit instead of running as a worker',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=5.0,
+            help='Seconds to sleep between polls when nothing is pending',
+        )
+        parser.add_argument(
+            '--retry-failed',
+            action='store_true',
+            help='Queue files whose thumbnail failed to render again',
+        )
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Queue every file again, e.g. after changing the thumbnail size',
+        )
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            self.stdout.write(f'Re-queued {Blob.objects.update(thumbnail_status="pending")} files')
+        elif options['retry_failed']:
+            retried = Blob.objects.filter(thumbnail_status='failed').update(thumbnail_status='pending')
+            self.stdout.write(f'Re-queued {retried} failed files')
+
+        if options['once']:
+            processed = 0
+            while True:
+                batch = previews.render_pending()
+                if not batch:
+                    break
+                processed += batch
+            self.stdout.write(self.style.SUCCESS(f'Rendered {processed} thumbnails'))
+            return
+
+        self.stdout.write(self.style.SUCCESS('Rendering thumbnails (Ctrl+C to stop)...'))
+        try:
+            while True:
+                processed = previews.render_pending()
+                if processed:
+                    self.stdout.write(f'Rendered {processed} thumbnails')
+                else:
+                    time.sleep(options['interval'])
+                close_old_connections()
+        except KeyboardInterrupt:
+            self.stdout.write('Stopped')
@@ -5,7 +5,7 @@ Usage: python manage.py seed_data [--clear]
 from django.core.management.base import BaseCommand
 from django.contrib.auth import get_user_model
 from django.db import transaction
-from resources.models import Course, Tag, StudyGroup, Document, Friendship, Message
+from resources.models import Course, Tag, StudyGroup, Membership, Document, Friendship, Message
 from users.models import UserProfile
 import random
 from datetime import datetime, timedelta
@@ -297,7 +297,7 @@ class Command(BaseCommand):
                     group.members.add(users[idx])
                 
                 # Creator is also an admin
-                group.admins.add(creator)
+                group.memberships.filter(user=creator).update(role=Membership.ADMIN)
                 
                 self.stdout.write(f'  Created group: {data["name"]} ({len(data["member_indices"])} members)')
             
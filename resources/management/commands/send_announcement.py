@@ -0,0 +1,46 @@
+"""
+Django management command to announce something to every student of a course.
+Usage: python manage.py send_announcement --course CS --title "Exam moved" [--message TEXT] [--year 200] [--url /path/]
+"""
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from resources import notifications
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Send an announcement notification to all students of a course'
+
+    def add_arguments(self, parser):
+        course_codes = [code for code, _ in User.COURSE_CHOICES]
+        parser.add_argument('--course', required=True, choices=course_codes, help='Course code')
+        parser.add_argument('--title', required=True, help='Announcement title')
+        parser.add_argument('--message', default='', help='Announcement body')
+        parser.add_argument('--year', help='Only students of this year (e.g. 200)')
+        parser.add_argument('--url', default='', help='Page to open when the notification is clicked')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=notifications.NOTIFY_BATCH_SIZE,
+            help='Notifications written per transaction',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+
+        students = User.objects.filter(course=options['course'], is_active=True)
+        if options['year']:
+            students = students.filter(year=options['year'])
+
+        sent = notifications.notify(
+            students.values_list('id', flat=True).iterator(),
+            notification_type='announcement',
+            title=options['title'],
+            message=options['message'],
+            action_url=options['url'],
+            batch_size=options['batch_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'Sent announcement to {sent} students'))
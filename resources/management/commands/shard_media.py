@@ -0,0 +1,41 @@
+"""
+Django management command that moves existing media files into the sharded layout.
+Usage: python manage.py shard_media [--batch-size 500] [--dry-run]
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from resources import storage
+
+
+class Command(BaseCommand):
+    help = (
+        'Move files saved under the flat media layout to hashed subdirectories (documents and '
+        'attachments to content-addressed blobs) and rewrite the file paths in bulk'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=storage.RELOCATE_BATCH_SIZE,
+            help='Rows whose paths are rewritten per bulk update',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report what would move without moving anything',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        results = storage.relocate_all(
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run'],
+            log=lambda message: self.stderr.write(self.style.WARNING(message)),
+        )
+        verb = 'Would move' if options['dry_run'] else 'Moved'
+        for label, (moved, missing) in results.items():
+            self.stdout.write(f'{label}: {verb.lower()} {moved} files, {missing} missing')
+        total = sum(moved for moved, _ in results.values())
+        self.stdout.write(self.style.SUCCESS(f'{verb} {total} files'))
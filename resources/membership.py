@@ -0,0 +1,63 @@
+"""
+Group membership checks.
+
+``user in group.members.all()`` loads every member of the group to answer a
+yes/no question. ``is_member`` answers it from ``StudyGroup.get_role``: a
+single lookup on the Membership (group, user) unique index, memoized on the
+group instance, so repeated membership and permission checks while handling
+one request share one query.
+
+With ``GROUP_MEMBERSHIP_CACHE_TTL`` set (seconds), the member ids of each
+group are additionally kept in the Django cache for that long, so checks on
+busy groups skip the database entirely. Membership changes invalidate the
+entry through the ``m2m_changed`` handler in ``resources.signals``. Only
+enable it with a cache shared by all processes, otherwise other processes
+keep serving stale sets until the TTL expires.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Membership
+
+
+def _cache_ttl():
+    return getattr(settings, 'GROUP_MEMBERSHIP_CACHE_TTL', 0)
+
+
+def _cache_key(group_id):
+    return f'group-member-ids:{group_id}'
+
+
+def member_ids(group_id):
+    """Set of the user ids in a group, served from the cache when enabled."""
+    ttl = _cache_ttl()
+    ids = cache.get(_cache_key(group_id)) if ttl else None
+    if ids is None:
+        ids = frozenset(
+            Membership.objects.filter(group_id=group_id).values_list('user_id', flat=True)
+        )
+        if ttl:
+            cache.set(_cache_key(group_id), ids, ttl)
+    return ids
+
+
+def is_member(user, group):
+    """Whether ``user`` belongs to ``group``, without loading the member list."""
+    if not getattr(user, 'is_authenticated', False):
+        return False
+    if _cache_ttl():
+        return user.pk in member_ids(group.pk)
+    return group.get_role(user) is not None
+
+
+def group_ids_for(user):
+    """Set of the ids of every group ``user`` belongs to."""
+    return set(Membership.objects.filter(user_id=user.pk).values_list('group_id', flat=True))
+
+
+def invalidate(group_ids, instance=None):
+    """Drop cached member sets for ``group_ids`` and the roles memoized on ``instance``."""
+    if instance is not None:
+        instance.forget_roles()
+    if _cache_ttl():
+        cache.delete_many([_cache_key(group_id) for group_id in group_ids])
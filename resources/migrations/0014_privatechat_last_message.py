@@ -0,0 +1,46 @@
+# Generated by Django 6.0 on 2026-10-17 06:26
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_last_message(apps, schema_editor):
+    PrivateChat = apps.get_model('resources', 'PrivateChat')
+    PrivateMessage = apps.get_model('resources', 'PrivateMessage')
+    for chat in PrivateChat.objects.all().iterator():
+        last = PrivateMessage.objects.filter(chat=chat).order_by('-timestamp', '-id').first()
+        if last:
+            PrivateChat.objects.filter(pk=chat.pk).update(
+                last_message=last, last_message_at=last.timestamp,
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('resources', '0013_unreadcounter'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='privatechat',
+            name='last_message',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='resources.privatemessage'),
+        ),
+        migrations.AddField(
+            model_name='privatechat',
+            name='last_message_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='privatechat',
+            index=models.Index(fields=['participant1', 'updated_at', 'id'], name='resources_p_partici_ea7d74_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='privatechat',
+            index=models.Index(fields=['participant2', 'updated_at', 'id'], name='resources_p_partici_f711ae_idx'),
+        ),
+        migrations.RunPython(backfill_last_message, migrations.RunPython.noop),
+    ]
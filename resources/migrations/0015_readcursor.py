@@ -0,0 +1,85 @@
+# Generated by Django 6.0 on 2026-10-17 06:28
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Max, Min
+
+
+def create_read_cursors(apps, schema_editor):
+    """Derive each participant's cursor from the is_read flags being removed"""
+    StudyGroup = apps.get_model('resources', 'StudyGroup')
+    PrivateChat = apps.get_model('resources', 'PrivateChat')
+    PrivateMessage = apps.get_model('resources', 'PrivateMessage')
+    ReadCursor = apps.get_model('resources', 'ReadCursor')
+
+    cursors = []
+    for chat in PrivateChat.objects.all().iterator():
+        messages = PrivateMessage.objects.filter(chat=chat)
+        latest = messages.aggregate(latest=Max('id'))['latest']
+        if latest is None:
+            continue
+        for user_id in (chat.participant1_id, chat.participant2_id):
+            first_unread = messages.filter(is_read=False).exclude(
+                sender_id=user_id
+            ).aggregate(first=Min('id'))['first']
+            last_read_id = first_unread - 1 if first_unread else latest
+            cursors.append(ReadCursor(user_id=user_id, private_chat=chat, last_read_id=last_read_id))
+
+    # Existing group history starts out read rather than as one huge unread backlog
+    for group in StudyGroup.objects.annotate(latest=Max('messages__id')).filter(latest__isnull=False):
+        for user_id in group.members.values_list('id', flat=True):
+            cursors.append(ReadCursor(user_id=user_id, group=group, last_read_id=group.latest))
+
+    ReadCursor.objects.bulk_create(cursors, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('resources', '0014_privatechat_last_message'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReadCursor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_read_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['group', 'id'], name='resources_m_group_i_cbdaf0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='privatemessage',
+            index=models.Index(fields=['chat', 'id'], name='resources_p_chat_id_2aefb7_idx'),
+        ),
+        migrations.AddField(
+            model_name='readcursor',
+            name='group',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='read_cursors', to='resources.studygroup'),
+        ),
+        migrations.AddField(
+            model_name='readcursor',
+            name='private_chat',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='read_cursors', to='resources.privatechat'),
+        ),
+        migrations.AddField(
+            model_name='readcursor',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='read_cursors', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterUniqueTogether(
+            name='readcursor',
+            unique_together={('user', 'group'), ('user', 'private_chat')},
+        ),
+        migrations.RunPython(create_read_cursors, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='privatemessage',
+            name='is_read',
+        ),
+    ]
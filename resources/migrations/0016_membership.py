@@ -0,0 +1,88 @@
+# Generated by Django 6.0 on 2026-10-17 09:12
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def copy_memberships(apps, schema_editor):
+    """Fold the members/admins/editors tables into one Membership row per member"""
+    StudyGroup = apps.get_model('resources', 'StudyGroup')
+    Membership = apps.get_model('resources', 'Membership')
+
+    rows = []
+    for group in StudyGroup.objects.all().iterator():
+        admin_ids = set(group.admins.values_list('id', flat=True))
+        editor_ids = set(group.editors.values_list('id', flat=True))
+        for user_id in group.old_members.values_list('id', flat=True):
+            if user_id in admin_ids:
+                role = 'admin'
+            elif user_id in editor_ids:
+                role = 'editor'
+            else:
+                role = 'member'
+            rows.append(Membership(group_id=group.id, user_id=user_id, role=role))
+    Membership.objects.bulk_create(rows, batch_size=1000)
+
+
+def restore_memberships(apps, schema_editor):
+    StudyGroup = apps.get_model('resources', 'StudyGroup')
+    Membership = apps.get_model('resources', 'Membership')
+
+    for membership in Membership.objects.all().iterator():
+        group = StudyGroup.objects.get(pk=membership.group_id)
+        group.old_members.add(membership.user_id)
+        if membership.role == 'admin':
+            group.admins.add(membership.user_id)
+        elif membership.role == 'editor':
+            group.editors.add(membership.user_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('resources', '0015_readcursor'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Membership',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('role', models.CharField(choices=[('member', 'Member'), ('editor', 'Editor'), ('admin', 'Admin')], default='member', max_length=10)),
+                ('joined_at', models.DateTimeField(auto_now_add=True)),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='memberships', to='resources.studygroup')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='memberships', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'role'], name='resources_m_user_id_160574_idx')],
+                'constraints': [models.UniqueConstraint(fields=('group', 'user'), name='unique_group_membership')],
+            },
+        ),
+        # The old auto-created members table is renamed out of the way so the
+        # through-model field can take over the ``members`` name
+        migrations.RenameField(
+            model_name='studygroup',
+            old_name='members',
+            new_name='old_members',
+        ),
+        migrations.RunPython(copy_memberships, restore_memberships),
+        migrations.RemoveField(
+            model_name='studygroup',
+            name='admins',
+        ),
+        migrations.RemoveField(
+            model_name='studygroup',
+            name='editors',
+        ),
+        migrations.RemoveField(
+            model_name='studygroup',
+            name='old_members',
+        ),
+        migrations.AddField(
+            model_name='studygroup',
+            name='members',
+            field=models.ManyToManyField(related_name='study_groups', through='resources.Membership', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
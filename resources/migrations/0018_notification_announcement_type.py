@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-17 06:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('resources', '0017_groupnotification'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='groupnotification',
+            name='notification_type',
+            field=models.CharField(choices=[('group_message', 'New Group Message'), ('private_message', 'New Private Message'), ('friend_request', 'Friend Request Received'), ('friend_accepted', 'Friend Request Accepted'), ('group_join_request', 'Group Join Request'), ('group_join_approved', 'Group Join Approved'), ('group_join_rejected', 'Group Join Rejected'), ('member_joined', 'Member Joined Group'), ('document_shared', 'Document Shared'), ('announcement', 'Announcement')], max_length=30),
+        ),
+        migrations.AlterField(
+            model_name='notification',
+            name='notification_type',
+            field=models.CharField(choices=[('group_message', 'New Group Message'), ('private_message', 'New Private Message'), ('friend_request', 'Friend Request Received'), ('friend_accepted', 'Friend Request Accepted'), ('group_join_request', 'Group Join Request'), ('group_join_approved', 'Group Join Approved'), ('group_join_rejected', 'Group Join Rejected'), ('member_joined', 'Member Joined Group'), ('document_shared', 'Document Shared'), ('announcement', 'Announcement')], max_length=30),
+        ),
+    ]
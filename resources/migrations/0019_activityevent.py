@@ -0,0 +1,34 @@
+# Generated by Django 6.0 on 2026-10-17 06:38
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('resources', '0018_notification_announcement_type'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('activity_type', models.CharField(choices=[('group_message', 'Group Message'), ('private_message', 'Private Message'), ('friend_request', 'Friend Request'), ('friend_accepted', 'Friend Request Accepted'), ('group_join_request', 'Group Join Request')], max_length=30)),
+                ('title', models.CharField(max_length=255)),
+                ('preview', models.CharField(blank=True, max_length=255)),
+                ('url', models.CharField(blank=True, max_length=255)),
+                ('source', models.CharField(db_index=True, max_length=50)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('actor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('recipient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activity_events', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['recipient', 'created_at', 'id'], name='resources_a_recipie_ed6d91_idx'), models.Index(fields=['created_at'], name='resources_a_created_af0d93_idx')],
+            },
+        ),
+    ]
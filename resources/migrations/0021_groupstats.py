@@ -0,0 +1,47 @@
+# Generated by Django 6.0 on 2026-10-17 10:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_group_stats(apps, schema_editor):
+    """Member counts and course histograms for existing groups; `rebuild_group_stats` also seeds activity"""
+    StudyGroup = apps.get_model('resources', 'StudyGroup')
+    Membership = apps.get_model('resources', 'Membership')
+    GroupStats = apps.get_model('resources', 'GroupStats')
+
+    stats = {
+        group_id: GroupStats(group_id=group_id, course_counts={})
+        for group_id in StudyGroup.objects.values_list('id', flat=True)
+    }
+    for group_id, course, count in Membership.objects.values('group_id', 'user__course').annotate(
+        n=models.Count('id')
+    ).values_list('group_id', 'user__course', 'n').order_by():
+        stats[group_id].member_count += count
+        stats[group_id].course_counts[course] = count
+    GroupStats.objects.bulk_create(stats.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('resources', '0020_discovery_queue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GroupStats',
+            fields=[
+                ('group', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='resources.studygroup')),
+                ('member_count', models.PositiveIntegerField(default=0)),
+                ('course_counts', models.JSONField(default=dict)),
+                ('recent_activity', models.FloatField(default=0)),
+                ('activity_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'group stats',
+            },
+        ),
+        migrations.RunPython(build_group_stats, migrations.RunPython.noop),
+    ]
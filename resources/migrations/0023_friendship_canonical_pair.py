@@ -0,0 +1,65 @@
+# Generated by Django 6.0 on 2026-10-17 12:10
+
+import django.db.models.functions.comparison
+from django.conf import settings
+from django.db import migrations, models
+
+# When both directions of a pair exist, keep the row that says the most
+STATUS_PRIORITY = {'accepted': 0, 'blocked': 1, 'pending': 2, 'declined': 3}
+
+
+def merge_reverse_duplicates(apps, schema_editor):
+    """One row per pair: drop the weaker of A->B / B->A duplicates"""
+    Friendship = apps.get_model('resources', 'Friendship')
+
+    best, duplicates = {}, []
+    for friendship in Friendship.objects.order_by('-updated_at', '-id').iterator():
+        pair = (min(friendship.from_user_id, friendship.to_user_id), max(friendship.from_user_id, friendship.to_user_id))
+        kept = best.get(pair)
+        if kept is None:
+            best[pair] = friendship
+        elif STATUS_PRIORITY.get(friendship.status, 9) < STATUS_PRIORITY.get(kept.status, 9):
+            duplicates.append(kept.id)
+            best[pair] = friendship
+        else:
+            duplicates.append(friendship.id)
+    for start in range(0, len(duplicates), 500):
+        Friendship.objects.filter(id__in=duplicates[start:start + 500]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('resources', '0022_discoveryseenset'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_reverse_duplicates, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='friendship',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='friendship',
+            name='user_high',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.functions.comparison.Greatest('from_user', 'to_user'), output_field=models.BigIntegerField()),
+        ),
+        migrations.AddField(
+            model_name='friendship',
+            name='user_low',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.functions.comparison.Least('from_user', 'to_user'), output_field=models.BigIntegerField()),
+        ),
+        migrations.AddIndex(
+            model_name='friendship',
+            index=models.Index(fields=['user_low', 'status', 'user_high'], name='friendship_low_status_high'),
+        ),
+        migrations.AddIndex(
+            model_name='friendship',
+            index=models.Index(fields=['user_high', 'status', 'user_low'], name='friendship_high_status_low'),
+        ),
+        migrations.AddConstraint(
+            model_name='friendship',
+            constraint=models.UniqueConstraint(fields=('user_low', 'user_high'), name='unique_friendship_pair'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 6.0 on 2026-10-17 12:10
+
+from django.db import migrations
+
+# kind -> (message table, FTS table, scope column); frozen copy of resources.search.INDEXES
+INDEXES = [
+    ('resources_message', 'resources_message_fts', 'group_id'),
+    ('resources_privatemessage', 'resources_privatemessage_fts', 'chat_id'),
+]
+
+
+def create_search_index(apps, schema_editor):
+    """FTS5 external-content indexes over message text, kept in sync by triggers, then filled"""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for table, fts, scope in INDEXES:
+        insert = f"INSERT INTO {fts}(rowid, content, {scope}) VALUES (new.id, new.content, new.{scope});"
+        delete = (
+            f"INSERT INTO {fts}({fts}, rowid, content, {scope}) "
+            f"VALUES ('delete', old.id, old.content, old.{scope});"
+        )
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+            f"content, {scope}, content='{table}', content_rowid='id', "
+            f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+        schema_editor.execute(f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN {insert} END")
+        schema_editor.execute(f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN {delete} END")
+        schema_editor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF content, {scope} ON {table} "
+            f"BEGIN {delete} {insert} END"
+        )
+        schema_editor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for _, fts, _ in INDEXES:
+        for suffix in ('ai', 'ad', 'au'):
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {fts}_{suffix}")
+        schema_editor.execute(f"DROP TABLE IF EXISTS {fts}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('resources', '0024_friendsuggestion'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,87 @@
+# Generated by Django 6.0 on 2026-10-17 12:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+FTS_TABLE = 'resources_documenttext_fts'
+COLUMNS = 'title, course, tags, content, scope'
+
+
+def create_search_index(apps, schema_editor):
+    """FTS5 external-content index over DocumentText, kept in sync by triggers"""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    new_values = 'new.document_id, new.title, new.course, new.tags, new.content, new.scope'
+    old_values = 'old.document_id, old.title, old.course, old.tags, old.content, old.scope'
+    insert = f"INSERT INTO {FTS_TABLE}(rowid, {COLUMNS}) VALUES ({new_values});"
+    delete = f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {COLUMNS}) VALUES ('delete', {old_values});"
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+        f"{COLUMNS}, content='resources_documenttext', content_rowid='document_id', "
+        f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+    )
+    schema_editor.execute(
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON resources_documenttext BEGIN {insert} END"
+    )
+    schema_editor.execute(
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON resources_documenttext BEGIN {delete} END"
+    )
+    schema_editor.execute(
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF {COLUMNS} ON resources_documenttext "
+        f"BEGIN {delete} {insert} END"
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for suffix in ('ai', 'ad', 'au'):
+        schema_editor.execute(f"DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}")
+    schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+def queue_existing_documents(apps, schema_editor):
+    """Metadata rows for existing documents, pending text extraction by `index_documents`"""
+    Document = apps.get_model('resources', 'Document')
+    DocumentText = apps.get_model('resources', 'DocumentText')
+    tags = {}
+    for document_id, name in Document.tags.through.objects.values_list('document_id', 'tag__name'):
+        tags.setdefault(document_id, []).append(name)
+    DocumentText.objects.bulk_create([
+        DocumentText(
+            document_id=document_id, title=title, course=course, tags=' '.join(tags.get(document_id, ())),
+            scope=f'group{group_id}' if group_id else 'public', status='pending',
+        )
+        for document_id, title, course, group_id in Document.objects.values_list('id', 'title', 'course', 'group_id')
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('resources', '0025_message_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentText',
+            fields=[
+                ('document', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_text', serialize=False, to='resources.document')),
+                ('title', models.CharField(blank=True, max_length=200)),
+                ('course', models.CharField(blank=True, max_length=200)),
+                ('tags', models.TextField(blank=True)),
+                ('content', models.TextField(blank=True)),
+                ('scope', models.CharField(max_length=30)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('indexed', 'Indexed'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('error', models.CharField(blank=True, max_length=255)),
+                ('source_name', models.CharField(blank=True, max_length=255)),
+                ('source_size', models.BigIntegerField(blank=True, null=True)),
+                ('extracted_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status'], name='resources_d_status_6019d6_idx')],
+            },
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+        migrations.RunPython(queue_existing_documents, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 6.0 on 2026-10-17 13:40
+
+import os
+
+from django.db import migrations, models
+
+
+def fill_filenames(apps, schema_editor):
+    """Existing documents keep the file name they were stored under"""
+    Document = apps.get_model('resources', 'Document')
+    documents = list(Document.objects.filter(filename='').only('file'))
+    for document in documents:
+        document.filename = os.path.basename(document.file.name)[:255]
+    Document.objects.bulk_update(documents, ['filename'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('resources', '0027_file_content_hashes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Blob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('sha256', models.CharField(db_index=True, max_length=64)),
+                ('size', models.BigIntegerField()),
+                ('refcount', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='filename',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.RunPython(fill_filenames, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 6.0 on 2026-10-17 14:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('resources', '0028_content_addressed_blobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blob',
+            name='thumbnail',
+            field=models.FileField(blank=True, max_length=255, upload_to=''),
+        ),
+        migrations.AddField(
+            model_name='blob',
+            name='thumbnail_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('ready', 'Ready'), ('none', 'No thumbnail'), ('failed', 'Failed')], default='pending', max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='blob',
+            index=models.Index(fields=['thumbnail_status'], name='resources_b_thumbna_749b68_idx'),
+        ),
+    ]
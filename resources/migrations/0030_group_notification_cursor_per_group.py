@@ -0,0 +1,64 @@
+# Generated by Django 6.0 on 2026-10-17 15:10
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def split_cursors(apps, schema_editor):
+    """Give each user one cursor per group they belong to, at their old global position."""
+    LegacyCursor = apps.get_model('resources', 'LegacyGroupNotificationCursor')
+    GroupNotificationCursor = apps.get_model('resources', 'GroupNotificationCursor')
+    Membership = apps.get_model('resources', 'Membership')
+
+    positions = dict(LegacyCursor.objects.values_list('user_id', 'last_read_id'))
+    memberships = Membership.objects.filter(user_id__in=positions).values_list('user_id', 'group_id')
+    GroupNotificationCursor.objects.bulk_create([
+        GroupNotificationCursor(user_id=user_id, group_id=group_id, last_read_id=positions[user_id])
+        for user_id, group_id in memberships.iterator()
+    ], batch_size=1000)
+
+
+def merge_cursors(apps, schema_editor):
+    # The lowest per-group position is the only global one that marks nothing unread as read
+    LegacyCursor = apps.get_model('resources', 'LegacyGroupNotificationCursor')
+    GroupNotificationCursor = apps.get_model('resources', 'GroupNotificationCursor')
+
+    positions = GroupNotificationCursor.objects.values('user_id').annotate(position=Min('last_read_id'))
+    LegacyCursor.objects.bulk_create([
+        LegacyCursor(user_id=row['user_id'], last_read_id=row['position'])
+        for row in positions.order_by()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('resources', '0029_blob_thumbnails'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RenameModel(
+            old_name='GroupNotificationCursor',
+            new_name='LegacyGroupNotificationCursor',
+        ),
+        migrations.CreateModel(
+            name='GroupNotificationCursor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_read_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notification_cursors', to='resources.studygroup')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='group_notification_cursors', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'group')},
+            },
+        ),
+        migrations.RunPython(split_cursors, merge_cursors),
+        migrations.DeleteModel(
+            name='LegacyGroupNotificationCursor',
+        ),
+    ]
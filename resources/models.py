@@ -1,8 +1,11 @@
 # Create your models here.
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 from django.utils.crypto import get_random_string
 from django.db.models import Q
+from django.db.models.functions import Greatest, Least
+from datetime import timedelta
 import uuid
 
 
@@ -26,18 +29,79 @@ class Document(models.Model):
     uploaded_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     tags = models.ManyToManyField(Tag, blank=True)
     group = models.ForeignKey('StudyGroup', on_delete=models.CASCADE, null=True, blank=True, related_name='documents')
+    # Name of the uploaded file; the stored name is its content hash (see resources.blobs)
+    filename = models.CharField(max_length=255, blank=True)
+    # Hex SHA-256 of the file, set on upload and used as its ETag
+    sha256 = models.CharField(max_length=64, blank=True, editable=False)
 
     def __str__(self):
         return self.title
 
 
+class Blob(models.Model):
+    """A stored file shared by every document and attachment with the same content, see resources.blobs"""
+    THUMBNAIL_STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('ready', 'Ready'),
+        ('none', 'No thumbnail'),
+        ('failed', 'Failed'),
+    ]
+
+    name = models.CharField(max_length=255, unique=True)
+    sha256 = models.CharField(max_length=64, db_index=True)
+    size = models.BigIntegerField()
+    # Rows whose file field holds this name; the blob is deleted when it drops to zero
+    refcount = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Rendered by resources.previews, stored next to the blob
+    thumbnail = models.FileField(max_length=255, blank=True)
+    thumbnail_status = models.CharField(max_length=10, choices=THUMBNAIL_STATUS_CHOICES, default='pending')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['thumbnail_status']),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.refcount} references)"
+
+
+class DocumentText(models.Model):
+    """Searchable text of a document: extracted file content plus copies of its metadata, indexed by resources.document_index"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('indexed', 'Indexed'),
+        ('failed', 'Failed'),
+    ]
+
+    document = models.OneToOneField(Document, on_delete=models.CASCADE, primary_key=True, related_name='search_text')
+    title = models.CharField(max_length=200, blank=True)
+    course = models.CharField(max_length=200, blank=True)
+    tags = models.TextField(blank=True)
+    content = models.TextField(blank=True)
+    # 'public', or 'group<id>' for documents only that group's members can see
+    scope = models.CharField(max_length=30)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    error = models.CharField(max_length=255, blank=True)
+    # The file the content was extracted from; another name or size means it changed
+    source_name = models.CharField(max_length=255, blank=True)
+    source_size = models.BigIntegerField(null=True, blank=True)
+    extracted_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status']),
+        ]
+
+    def __str__(self):
+        return f"Text of {self.title} ({self.status})"
+
+
 class StudyGroup(models.Model):
     name = models.CharField(max_length=100)
     description = models.TextField(blank=True)
     creator = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='created_groups')
-    members = models.ManyToManyField(settings.AUTH_USER_MODEL, related_name='study_groups')
-    admins = models.ManyToManyField(settings.AUTH_USER_MODEL, related_name='admin_groups', blank=True)
-    editors = models.ManyToManyField(settings.AUTH_USER_MODEL, related_name='editor_groups', blank=True)
+    members = models.ManyToManyField(settings.AUTH_USER_MODEL, through='Membership', related_name='study_groups')
     created_at = models.DateTimeField(auto_now_add=True)
     invite_code = models.CharField(max_length=12, unique=True, blank=True)
     is_invite_active = models.BooleanField(default=True)
@@ -56,17 +120,87 @@ class StudyGroup(models.Model):
             code = get_random_string(12).upper()
         return code
     
+    def get_role(self, user):
+        """
+        Return the user's Membership role in this group, or None if not a member.
+
+        One lookup on the (group, user) unique index, memoized on this instance
+        so repeated permission checks within a request cost nothing.
+        """
+        if not getattr(user, 'is_authenticated', False):
+            return None
+        cache = self.__dict__.setdefault('_role_cache', {})
+        if user.pk not in cache:
+            cache[user.pk] = Membership.objects.filter(
+                group_id=self.pk, user_id=user.pk
+            ).values_list('role', flat=True).first()
+        return cache[user.pk]
+    
+    def forget_roles(self):
+        """Drop the roles memoized by ``get_role``, after memberships changed."""
+        self.__dict__.pop('_role_cache', None)
+    
     def is_admin(self, user):
-        return user == self.creator or user in self.admins.all()
+        return user.pk == self.creator_id or self.get_role(user) == Membership.ADMIN
     
     def is_editor(self, user):
-        return self.is_admin(user) or user in self.editors.all()
+        return self.is_admin(user) or self.get_role(user) == Membership.EDITOR
     
     def can_manage_members(self, user):
         return self.is_admin(user)
     
     def can_edit_group(self, user):
         return self.is_editor(user)
+    
+    @classmethod
+    def administered_by(cls, user):
+        """Groups the user is a member of and can administer."""
+        return cls.objects.filter(
+            Q(creator=user) | Q(memberships__role=Membership.ADMIN),
+            memberships__user=user,
+        )
+    
+    def users_with_role(self, role):
+        from django.contrib.auth import get_user_model
+        return get_user_model().objects.filter(memberships__group=self, memberships__role=role)
+    
+    def set_roles(self, admins=(), editors=()):
+        """Assign admin/editor roles to members; every other member becomes a plain member."""
+        admin_ids = {user.pk for user in admins}
+        editor_ids = {user.pk for user in editors} - admin_ids
+        memberships = self.memberships.exclude(user_id=self.creator_id)
+        memberships.filter(user_id__in=admin_ids).update(role=Membership.ADMIN)
+        memberships.filter(user_id__in=editor_ids).update(role=Membership.EDITOR)
+        memberships.exclude(user_id__in=admin_ids | editor_ids).update(role=Membership.MEMBER)
+        self.forget_roles()
+
+
+class Membership(models.Model):
+    """A user's membership of a study group, with their role"""
+    MEMBER = 'member'
+    EDITOR = 'editor'
+    ADMIN = 'admin'
+    ROLE_CHOICES = [
+        (MEMBER, 'Member'),
+        (EDITOR, 'Editor'),
+        (ADMIN, 'Admin'),
+    ]
+
+    group = models.ForeignKey(StudyGroup, on_delete=models.CASCADE, related_name='memberships')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='memberships')
+    role = models.CharField(max_length=10, choices=ROLE_CHOICES, default=MEMBER)
+    joined_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['group', 'user'], name='unique_group_membership'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'role']),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} in {self.group.name} ({self.role})"
 
 class GroupInvite(models.Model):
     """Model for tracking group invite links with expiration"""
@@ -113,6 +247,12 @@ class Message(models.Model):
 
     class Meta:
         ordering = ['timestamp']
+        indexes = [
+            # Keyset pagination of chat history walks this index backwards
+            models.Index(fields=['group', 'timestamp', 'id']),
+            # Unread counts are "id > read cursor" range counts per group
+            models.Index(fields=['group', 'id']),
+        ]
 
     def __str__(self):
         return f"{self.user.username}: {self.content[:30]}"
@@ -132,46 +272,46 @@ class Friendship(models.Model):
         ('blocked', 'Blocked'),
     ]
     
+    # from_user sent the request; the pair is stored once whichever way it went
     from_user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='sent_friend_requests')
     to_user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='received_friend_requests')
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Canonical ordered pair (smaller user id first), computed by the database
+    user_low = models.GeneratedField(
+        expression=Least('from_user', 'to_user'), output_field=models.BigIntegerField(), db_persist=True,
+    )
+    user_high = models.GeneratedField(
+        expression=Greatest('from_user', 'to_user'), output_field=models.BigIntegerField(), db_persist=True,
+    )
 
     class Meta:
-        unique_together = ('from_user', 'to_user')
         ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(fields=['user_low', 'user_high'], name='unique_friendship_pair'),
+        ]
+        indexes = [
+            # A user's friends by status, from either side of the pair
+            models.Index(fields=['user_low', 'status', 'user_high'], name='friendship_low_status_high'),
+            models.Index(fields=['user_high', 'status', 'user_low'], name='friendship_high_status_low'),
+        ]
 
     def __str__(self):
         return f"{self.from_user.username} -> {self.to_user.username} ({self.status})"
     
     @classmethod
     def are_friends(cls, user1, user2):
-        """Check if two users are friends"""
-        return cls.objects.filter(
-            Q(from_user=user1, to_user=user2, status='accepted') |
-            Q(from_user=user2, to_user=user1, status='accepted')
-        ).exists()
+        """Check if two users are friends (cached: see resources.friends)"""
+        from .friends import are_friends
+        return are_friends(user1, user2)
     
     @classmethod
     def get_friends(cls, user):
         """Get all friends of a user"""
         from django.contrib.auth import get_user_model
-        User = get_user_model()
-        
-        friend_ids = []
-        friendships = cls.objects.filter(
-            Q(from_user=user, status='accepted') |
-            Q(to_user=user, status='accepted')
-        )
-        
-        for friendship in friendships:
-            if friendship.from_user == user:
-                friend_ids.append(friendship.to_user.id)
-            else:
-                friend_ids.append(friendship.from_user.id)
-        
-        return User.objects.filter(id__in=friend_ids)
+        from .friends import friends_of
+        return get_user_model().objects.filter(id__in=friends_of(user))
 
 
 class PrivateChat(models.Model):
@@ -180,9 +320,16 @@ class PrivateChat(models.Model):
     participant2 = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='private_chats_as_participant2')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Denormalized by resources.signals so the chat list needs no per-chat queries
+    last_message = models.ForeignKey('PrivateMessage', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    last_message_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         ordering = ['-updated_at']
+        indexes = [
+            models.Index(fields=['participant1', 'updated_at', 'id']),
+            models.Index(fields=['participant2', 'updated_at', 'id']),
+        ]
 
     def __str__(self):
         return f"Chat: {self.participant1.username} & {self.participant2.username}"
@@ -213,11 +360,14 @@ class PrivateMessage(models.Model):
     timestamp = models.DateTimeField(auto_now_add=True)
     edited_at = models.DateTimeField(null=True, blank=True)
     is_edited = models.BooleanField(default=False)
-    is_read = models.BooleanField(default=False)
     parent_message = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='replies')
 
     class Meta:
         ordering = ['timestamp']
+        indexes = [
+            # Unread counts are "id > read cursor" range counts per chat
+            models.Index(fields=['chat', 'id']),
+        ]
 
     def __str__(self):
         return f"{self.sender.username} to {self.chat.get_other_participant(self.sender).username}: {self.content[:30]}"
@@ -268,6 +418,9 @@ class MessageAttachment(models.Model):
     file_size = models.IntegerField(help_text="File size in bytes")
     file_type = models.CharField(max_length=100)
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    uploaded_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='message_attachments')
+    # Hex SHA-256 of the file, set on upload and used as its ETag
+    sha256 = models.CharField(max_length=64, blank=True, editable=False)
     
     # Polymorphic relation - can attach to group or private messages
     group_message = models.ForeignKey(Message, on_delete=models.CASCADE, null=True, blank=True, related_name='attachments')
@@ -316,6 +469,57 @@ class UserDiscoveryAction(models.Model):
         return f"{self.user.username} {self.action}ed {self.discovered_user.username}"
 
 
+class DiscoveryQueue(models.Model):
+    """When a user's discovery candidate queue was last built, and the shuffle seed used"""
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE,
+        primary_key=True, related_name='discovery_queue'
+    )
+    seed = models.BigIntegerField()
+    built_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Discovery queue for {self.user.username} (built {self.built_at:%Y-%m-%d %H:%M})"
+
+
+class DiscoveryCandidate(models.Model):
+    """A precomputed, not yet actioned person in a user's discovery queue"""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='discovery_candidates')
+    candidate = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    score = models.PositiveSmallIntegerField()
+    # Serving order: score tiers best first, shuffled within each tier
+    position = models.PositiveIntegerField()
+
+    class Meta:
+        unique_together = ('user', 'candidate')
+        indexes = [
+            models.Index(fields=['user', 'position']),
+        ]
+
+    def __str__(self):
+        return f"{self.candidate.username} for {self.user.username} (#{self.position}, {self.score})"
+
+
+class FriendSuggestion(models.Model):
+    """A precomputed "people you may know" entry, ranked by resources.suggestions"""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='friend_suggestions')
+    suggested = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    mutual_friends = models.PositiveIntegerField(default=0)
+    shared_groups = models.PositiveIntegerField(default=0)
+    score = models.PositiveIntegerField()
+    position = models.PositiveSmallIntegerField()
+    built_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('user', 'suggested')
+        indexes = [
+            models.Index(fields=['user', 'position']),
+        ]
+
+    def __str__(self):
+        return f"{self.suggested.username} for {self.user.username} (#{self.position}, {self.score})"
+
+
 class GroupDiscoveryAction(models.Model):
     """Track group discovery actions"""
     ACTION_CHOICES = [
@@ -337,6 +541,54 @@ class GroupDiscoveryAction(models.Model):
         return f"{self.user.username} {self.action} in {self.group.name}"
 
 
+class DiscoverySeenSet(models.Model):
+    """Every user or group id a user has actioned in discovery, stored compactly by resources.seen_sets"""
+    KIND_CHOICES = [
+        ('user', 'Users'),
+        ('group', 'Groups'),
+    ]
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='discovery_seen_sets')
+    kind = models.CharField(max_length=5, choices=KIND_CHOICES)
+    # zlib-compressed little-endian uint32 gaps between the sorted ids
+    data = models.BinaryField(default=b'')
+    size = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('user', 'kind')
+
+    def __str__(self):
+        return f"{self.size} {self.kind}s seen by {self.user.username}"
+
+
+class GroupStats(models.Model):
+    """Denormalized member and activity statistics of a group, kept current by resources.group_stats"""
+    ACTIVITY_HALF_LIFE = timedelta(days=7)
+
+    group = models.OneToOneField(StudyGroup, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    member_count = models.PositiveIntegerField(default=0)
+    # Members per course code, e.g. {"BSIT": 12, "BSCS": 3}
+    course_counts = models.JSONField(default=dict)
+    # Messages posted, each weighing half as much per ACTIVITY_HALF_LIFE before activity_at
+    recent_activity = models.FloatField(default=0)
+    activity_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'group stats'
+
+    def __str__(self):
+        return f"Stats for {self.group.name}"
+
+    def activity(self, now=None):
+        """Recent message activity decayed to ``now``."""
+        if self.activity_at is None:
+            return 0.0
+        elapsed = max((now or timezone.now()) - self.activity_at, timedelta(0))
+        return self.recent_activity * 0.5 ** (elapsed / self.ACTIVITY_HALF_LIFE)
+
+
 class GroupJoinRequest(models.Model):
     """Handle group join requests from discovery"""
     STATUS_CHOICES = [
@@ -373,6 +625,7 @@ class Notification(models.Model):
         ('group_join_rejected', 'Group Join Rejected'),
         ('member_joined', 'Member Joined Group'),
         ('document_shared', 'Document Shared'),
+        ('announcement', 'Announcement'),
     ]
 
     recipient = models.ForeignKey(
@@ -406,4 +659,218 @@ class Notification(models.Model):
         ]
 
     def __str__(self):
-        return f"[{self.notification_type}] {self.title} → {self.recipient.username}"
\ No newline at end of file
+        return f"[{self.notification_type}] {self.title} → {self.recipient.username}"
+
+    @property
+    def feed_id(self):
+        """Identifier of this item in the merged notification feed"""
+        return str(self.id)
+
+
+class GroupNotification(models.Model):
+    """
+    A notification addressed to every member of a group, stored once.
+
+    Members see it in their feed at read time (fan-out on read) if they had
+    joined the group when it was created and are not the user it is about or
+    the user who caused it. Read state lives in GroupNotificationCursor.
+    """
+    group = models.ForeignKey(StudyGroup, on_delete=models.CASCADE, related_name='broadcast_notifications')
+    notification_type = models.CharField(max_length=30, choices=Notification.NOTIFICATION_TYPES)
+    title = models.CharField(max_length=255)
+    message = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # The user the notification is about; excluded from the audience
+    from_user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE,
+        null=True, blank=True, related_name='+'
+    )
+    # The user whose action produced it (e.g. the approving admin); also excluded
+    actor = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL,
+        null=True, blank=True, related_name='+'
+    )
+    action_url = models.CharField(max_length=255, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['group', 'id']),
+        ]
+
+    def __str__(self):
+        return f"[{self.notification_type}] {self.title} → {self.group.name}"
+
+    @classmethod
+    def visible_to(cls, user_id):
+        """Group notifications in ``user_id``'s feed"""
+        return cls.objects.filter(
+            group__memberships__user_id=user_id,
+            created_at__gte=models.F('group__memberships__joined_at'),
+        ).exclude(from_user_id=user_id).exclude(actor_id=user_id)
+
+    def audience(self):
+        """Membership rows of the users this notification is shown to"""
+        return self.group.memberships.filter(
+            joined_at__lte=self.created_at,
+        ).exclude(user_id__in=[uid for uid in (self.from_user_id, self.actor_id) if uid])
+
+    @property
+    def feed_id(self):
+        return f"group-{self.id}"
+
+
+class GroupNotificationCursor(models.Model):
+    """Newest notification of one group a user has read; everything up to it in that group counts as read"""
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='group_notification_cursors'
+    )
+    group = models.ForeignKey(StudyGroup, on_delete=models.CASCADE, related_name='notification_cursors')
+    last_read_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = [('user', 'group')]
+
+    def __str__(self):
+        return f"{self.user.username} read notifications of group {self.group_id} up to #{self.last_read_id}"
+
+class OutboxEvent(models.Model):
+    """Realtime Pusher event waiting to be delivered (transactional outbox)"""
+    channel = models.CharField(max_length=200)
+    event = models.CharField(max_length=200)
+    payload = models.JSONField(default=dict)
+    # Events sharing a channel and coalesce key supersede each other (e.g. typing)
+    coalesce_key = models.CharField(max_length=100, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    dispatched_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    # Set while a dispatcher holds the event, so concurrent workers skip it
+    claim_token = models.CharField(max_length=32, blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['dispatched_at', 'id']),
+        ]
+
+    def __str__(self):
+        state = 'sent' if self.dispatched_at else 'pending'
+        return f"{self.channel}:{self.event} ({state})"
+
+
+class UnreadCounter(models.Model):
+    """Denormalized per-user badge counts, kept current by resources.counters"""
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE,
+        primary_key=True, related_name='unread_counter'
+    )
+    notifications = models.IntegerField(default=0)
+    messages = models.IntegerField(default=0)
+    friend_requests = models.IntegerField(default=0)
+    join_requests = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Unread counts for {self.user.username}"
+
+    def as_dict(self):
+        return {
+            'notifications': self.notifications,
+            'messages': self.messages,
+            'friend_requests': self.friend_requests,
+            'join_requests': self.join_requests,
+            'total': self.notifications + self.messages + self.friend_requests,
+        }
+
+
+class ReadCursor(models.Model):
+    """Last message a user has read in a group or private chat"""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='read_cursors')
+    last_read_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # Polymorphic relation - tracks either a group chat or a private chat
+    group = models.ForeignKey(StudyGroup, on_delete=models.CASCADE, null=True, blank=True, related_name='read_cursors')
+    private_chat = models.ForeignKey(PrivateChat, on_delete=models.CASCADE, null=True, blank=True, related_name='read_cursors')
+
+    class Meta:
+        unique_together = [
+            ('user', 'group'),
+            ('user', 'private_chat'),
+        ]
+
+    def __str__(self):
+        target = f"group {self.group_id}" if self.group_id else f"chat {self.private_chat_id}"
+        return f"{self.user.username} read {target} up to #{self.last_read_id}"
+
+
+class ActivityEvent(models.Model):
+    """
+    One entry in a user's dashboard activity feed, written when the event
+    happens (fan-out on write) so reading the feed is one index range scan.
+    """
+    ACTIVITY_TYPES = [
+        ('group_message', 'Group Message'),
+        ('private_message', 'Private Message'),
+        ('friend_request', 'Friend Request'),
+        ('friend_accepted', 'Friend Request Accepted'),
+        ('group_join_request', 'Group Join Request'),
+    ]
+    # Icon and accent colour per activity type, as shown on the dashboard
+    STYLES = {
+        'group_message': ('message', '#4A90E2'),
+        'private_message': ('mail', '#10B981'),
+        'friend_request': ('user', '#F59E0B'),
+        'friend_accepted': ('check', '#10B981'),
+        'group_join_request': ('users', '#8B5CF6'),
+    }
+
+    recipient = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='activity_events'
+    )
+    activity_type = models.CharField(max_length=30, choices=ACTIVITY_TYPES)
+    actor = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+'
+    )
+    title = models.CharField(max_length=255)
+    preview = models.CharField(max_length=255, blank=True)
+    url = models.CharField(max_length=255, blank=True)
+    # Identifies the object the event came from (e.g. "friendship:12") so the
+    # event can be withdrawn when that object is resolved or deleted
+    source = models.CharField(max_length=50, db_index=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['recipient', 'created_at', 'id']),
+            # Retention pruning by age
+            models.Index(fields=['created_at']),
+        ]
+
+    def __str__(self):
+        return f"[{self.activity_type}] {self.title} → {self.recipient.username}"
+
+    # Attribute names used by the dashboard template
+    @property
+    def type(self):
+        return self.activity_type
+
+    @property
+    def icon(self):
+        return self.STYLES[self.activity_type][0]
+
+    @property
+    def color(self):
+        return self.STYLES[self.activity_type][1]
+
+    @property
+    def timestamp(self):
+        return self.created_at
+
+    @property
+    def avatar_user(self):
+        return self.actor
+
@@ -0,0 +1,161 @@
+"""
+Notification service and feed.
+
+Personal notifications are one ``Notification`` row per recipient, written
+by ``notify`` in bulk: any number of recipients costs one INSERT, one
+counter UPDATE and one outbox INSERT per batch, and each recipient gets an
+``unread-counts`` delta on their ``user-{id}`` Pusher channel. Events
+addressed to a whole group (a new member joining) are stored once as a
+``GroupNotification`` and merged into each member's feed when it is read
+(fan-out on read), so announcing to a large group is a single INSERT.
+
+Group notifications have no per-recipient row to flag as read. Each user has
+one ``GroupNotificationCursor`` per group instead: every notification of that
+group with an id up to the cursor counts as read.
+"""
+from itertools import chain, islice
+
+from django.db import transaction
+from django.db.models import Max
+
+from . import counters
+from .models import GroupNotification, GroupNotificationCursor, Notification
+from .realtime import publish_many
+
+FEED_PAGE_SIZE = 50
+GROUP_FEED_PREFIX = 'group-'
+NOTIFY_BATCH_SIZE = 500
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def notify(recipients, notification_type, title, message='', from_user=None, group=None,
+           private_chat=None, action_url='', batch_size=NOTIFY_BATCH_SIZE):
+    """
+    Send a personal notification to each of ``recipients`` (users or user ids,
+    any iterable including a ``values_list`` iterator). Returns the number of
+    notifications created.
+
+    Each batch is written in its own transaction, so a large announcement
+    never holds one long write lock.
+    """
+    created = 0
+    user_ids = (getattr(recipient, 'pk', recipient) for recipient in recipients)
+    for batch in _batches(user_ids, batch_size):
+        with transaction.atomic():
+            Notification.objects.bulk_create([
+                Notification(
+                    recipient_id=user_id,
+                    notification_type=notification_type,
+                    title=title,
+                    message=message,
+                    from_user=from_user,
+                    group=group,
+                    private_chat=private_chat,
+                    action_url=action_url,
+                )
+                for user_id in batch
+            ])
+            # bulk_create skips the post_save counter signal, so count here
+            counters.adjust_many(batch, notifications=1)
+            publish_many([
+                (f'user-{user_id}', 'unread-counts', {'notifications': 1})
+                for user_id in batch
+            ])
+        created += len(batch)
+    return created
+
+
+def broadcast_to_group(group, notification_type, title, message='', from_user=None, actor=None, action_url=''):
+    """Notify every current member of ``group`` except ``from_user`` and ``actor``."""
+    return GroupNotification.objects.create(
+        group=group,
+        notification_type=notification_type,
+        title=title,
+        message=message,
+        from_user=from_user,
+        actor=actor,
+        action_url=action_url,
+    )
+
+
+def group_cursors(user):
+    """The user's group notification cursors as ``{group_id: last_read_id}``"""
+    return dict(GroupNotificationCursor.objects.filter(user=user).values_list('group_id', 'last_read_id'))
+
+
+def feed(user, limit=FEED_PAGE_SIZE):
+    """The newest ``limit`` personal and group notifications of ``user``, newest first."""
+    personal = Notification.objects.filter(
+        recipient=user
+    ).select_related('from_user', 'group', 'private_chat').order_by('-created_at')[:limit]
+    group_wide = GroupNotification.visible_to(user.pk).select_related(
+        'from_user', 'group'
+    ).order_by('-created_at', '-id')[:limit]
+
+    cursors = group_cursors(user)
+    for notification in group_wide:
+        notification.is_read = notification.id <= cursors.get(notification.group_id, 0)
+
+    return sorted(chain(personal, group_wide), key=lambda n: n.created_at, reverse=True)[:limit]
+
+
+def _latest_per_group(notifications):
+    return notifications.order_by().values('group_id').annotate(latest=Max('id')).values_list('group_id', 'latest')
+
+
+def _advance_group_cursor(user, group_id, up_to_id):
+    """Move the user's cursor for one group to ``up_to_id``; return how many notifications became read."""
+    with transaction.atomic():
+        cursor, _ = GroupNotificationCursor.objects.select_for_update().get_or_create(user=user, group_id=group_id)
+        previous = cursor.last_read_id
+        # Conditional update: of two concurrent mark-reads only the one that moves the cursor counts
+        moved = GroupNotificationCursor.objects.filter(
+            pk=cursor.pk, last_read_id=previous, last_read_id__lt=up_to_id,
+        ).update(last_read_id=up_to_id)
+        if not moved:
+            return 0
+        return GroupNotification.visible_to(user.pk).filter(
+            group_id=group_id, id__gt=previous, id__lte=up_to_id,
+        ).count()
+
+
+def mark_read(user, feed_ids):
+    """
+    Mark feed items read by their ``feed_id``. Marking a group notification
+    read also marks the older notifications of the same group read.
+    """
+    personal_ids, group_ids = [], []
+    for feed_id in feed_ids:
+        if feed_id.startswith(GROUP_FEED_PREFIX):
+            feed_id, target = feed_id[len(GROUP_FEED_PREFIX):], group_ids
+        else:
+            target = personal_ids
+        if feed_id.isdigit():
+            target.append(int(feed_id))
+
+    with transaction.atomic():
+        marked = 0
+        if personal_ids:
+            marked = Notification.objects.filter(
+                recipient=user, id__in=personal_ids, is_read=False,
+            ).update(is_read=True)
+        if group_ids:
+            # Only ids the user can actually see move a cursor, so a made-up
+            # id can never pre-read notifications that do not exist yet
+            visible = GroupNotification.visible_to(user.pk).filter(id__in=group_ids)
+            for group_id, up_to_id in _latest_per_group(visible):
+                marked += _advance_group_cursor(user, group_id, up_to_id)
+        counters.adjust(user.id, notifications=-marked)
+
+
+def mark_all_read(user):
+    with transaction.atomic():
+        marked = Notification.objects.filter(recipient=user, is_read=False).update(is_read=True)
+        for group_id, up_to_id in _latest_per_group(GroupNotification.visible_to(user.pk)):
+            marked += _advance_group_cursor(user, group_id, up_to_id)
+        counters.adjust(user.id, notifications=-marked)
@@ -0,0 +1,62 @@
+"""
+Keyset (cursor) pagination helpers.
+
+Cursors encode the position of the last row of a page as ``<micros>_<id>``,
+where ``micros`` is the row's sort timestamp in microseconds since the epoch
+and ``id`` breaks ties. Filtering on the pair instead of using OFFSET keeps
+every page a bounded index range scan, however deep the client pages.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db.models import Q
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def encode_cursor(timestamp, pk):
+    """Encode a (timestamp, id) position as an opaque cursor string."""
+    micros = (timestamp - _EPOCH) // timedelta(microseconds=1)
+    return f"{micros}_{pk}"
+
+
+def decode_cursor(cursor):
+    """Decode a cursor produced by encode_cursor, or return None if malformed."""
+    try:
+        micros, pk = cursor.split('_', 1)
+        return _EPOCH + timedelta(microseconds=int(micros)), int(pk)
+    except (AttributeError, ValueError, OverflowError):
+        return None
+
+
+def before_cursor(queryset, position, field, pk_field='id'):
+    """Restrict a queryset to rows strictly older than ``position`` on (field, pk_field)."""
+    timestamp, pk = position
+    return queryset.filter(
+        Q(**{f'{field}__lt': timestamp}) | Q(**{field: timestamp, f'{pk_field}__lt': pk})
+    )
+
+
+def keyset_page(queryset, field, before=None, limit=50, pk_field='id'):
+    """
+    Return ``(rows, next_cursor)`` for the newest ``limit`` rows older than the
+    ``before`` position, ordered newest first. ``next_cursor`` is None on the
+    last page.
+    """
+    if before is not None:
+        queryset = before_cursor(queryset, before, field, pk_field)
+    # Fetch one extra row to find out whether an older page exists
+    rows = list(queryset.order_by(f'-{field}', f'-{pk_field}')[:limit + 1])
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = encode_cursor(getattr(last, field), getattr(last, pk_field))
+    return rows[:limit], next_cursor
+
+
+def parse_limit(value, default, maximum):
+    """Parse a ``limit`` query parameter, clamped to [1, maximum]."""
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(limit, maximum))
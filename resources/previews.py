@@ -0,0 +1,222 @@
+"""
+Thumbnails of stored documents and attachments.
+
+Every blob (see ``resources.blobs``) gets at most one thumbnail, shared by
+all the documents and attachments with that content. It is a JPEG that
+fits ``THUMBNAIL_SIZE``, stored next to the blob with the hash of its own
+bytes in the name::
+
+    blobs/3f/a2/3fa2…c9.pdf
+    blobs/3f/a2/3fa2…c9.thumb-1b9e04c2d7aa.jpg
+
+so pages can link it with a version token and let browsers cache it
+without revalidating. Deleting the blob deletes the thumbnail with it.
+
+* Images are decoded at reduced scale where the format allows (JPEG
+  draft mode), turned upright from their EXIF orientation, and
+  downscaled.
+* PDFs are not rasterized (that needs poppler or MuPDF). The thumbnail is
+  the largest picture embedded in the first page, which covers scans and
+  slide exports, or else a page-shaped card with the first page's text.
+* Other formats get no thumbnail (status ``none``) and keep their icon.
+
+New blobs are queued (``thumbnail_status='pending'``) and rendered after
+commit by a background thread, so uploads never wait for Pillow. Run
+``python manage.py render_thumbnails`` as a worker instead when
+``THUMBNAIL_AUTORUN`` is off.
+"""
+import hashlib
+import io
+import logging
+import os
+import textwrap
+import threading
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageDraw, ImageFont, ImageOps
+from pypdf import PdfReader
+
+from .models import Blob
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_SIZE = (320, 320)
+JPEG_QUALITY = 80
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp'}
+PDF_EXTENSIONS = {'.pdf'}
+# Sources above this many pixels are refused rather than decoded
+MAX_SOURCE_PIXELS = 50_000_000
+RENDER_BATCH_SIZE = 20
+# Thumbnail URLs carry a version token, so a year of caching is safe
+THUMBNAIL_MAX_AGE = 365 * 24 * 60 * 60
+TEXT_CARD_LINES = 18
+
+
+# ── Rendering ──────────────────────────────────────────────────
+
+def _flatten(image):
+    """An RGB copy of ``image``, transparent areas on white."""
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def _downscale(image):
+    if image.width * image.height > MAX_SOURCE_PIXELS:
+        raise ValueError(f'Image of {image.width}x{image.height} pixels is too large to preview')
+    # JPEGs decode straight at a fraction of their size
+    image.draft('RGB', THUMBNAIL_SIZE)
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail(THUMBNAIL_SIZE, reducing_gap=2.0)
+    return _flatten(image)
+
+
+def _text_card(text, page_width, page_height):
+    """A page-shaped white card with the first lines of ``text``."""
+    height = THUMBNAIL_SIZE[1]
+    width = max(1, min(THUMBNAIL_SIZE[0], round(height * page_width / page_height)))
+    card = Image.new('RGB', (width, height), 'white')
+    draw = ImageDraw.Draw(card)
+    draw.rectangle([0, 0, width - 1, height - 1], outline=(208, 213, 221))
+    font = ImageFont.load_default(size=11)
+    margin = 12
+    columns = max(10, (width - 2 * margin) // 6)
+    lines = []
+    for paragraph in text.splitlines():
+        lines += textwrap.wrap(paragraph, columns) or ['']
+        if len(lines) >= TEXT_CARD_LINES:
+            break
+    draw.multiline_text(
+        (margin, margin), '\n'.join(lines[:TEXT_CARD_LINES]), fill=(55, 65, 81), font=font, spacing=4,
+    )
+    return card
+
+
+def _pdf_first_page(file):
+    page = PdfReader(file).pages[0]
+    # Scanned notes and exported slides: the page is one large picture
+    pictures = [picture.image for picture in page.images]
+    if pictures:
+        return _downscale(max(pictures, key=lambda picture: picture.width * picture.height))
+    return _text_card(page.extract_text() or '', float(page.mediabox.width), float(page.mediabox.height))
+
+
+def render(name, file):
+    """A thumbnail of an open file as a PIL image, chosen by extension; None for unsupported formats."""
+    extension = os.path.splitext(name)[1].lower()
+    if extension in IMAGE_EXTENSIONS:
+        with Image.open(file) as image:
+            return _downscale(image)
+    if extension in PDF_EXTENSIONS:
+        return _pdf_first_page(file)
+    return None
+
+
+def thumbnail_name(blob_name, data):
+    """Storage name of a thumbnail with bytes ``data`` next to the blob ``blob_name``."""
+    return f'{os.path.splitext(blob_name)[0]}.thumb-{hashlib.sha256(data).hexdigest()[:12]}.jpg'
+
+
+def version_of(name):
+    """The version token of a thumbnail name, '' for no thumbnail."""
+    return name.rsplit('.thumb-', 1)[1].split('.', 1)[0] if '.thumb-' in name else ''
+
+
+def render_blob(blob):
+    """Render and store the thumbnail of one pending blob."""
+    storage = blob.thumbnail.storage
+    with storage.open(blob.name, 'rb') as file:
+        image = render(blob.name, file)
+    if image is None:
+        Blob.objects.filter(pk=blob.pk).update(thumbnail='', thumbnail_status='none')
+        return
+    output = io.BytesIO()
+    image.save(output, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    data = output.getvalue()
+    name = thumbnail_name(blob.name, data)
+    if not storage.exists(name):
+        storage.save(name, ContentFile(data))
+    previous = blob.thumbnail.name
+    if not Blob.objects.filter(pk=blob.pk).update(thumbnail=name, thumbnail_status='ready'):
+        # The blob was deleted while rendering
+        storage.delete(name)
+    elif previous and previous != name:
+        storage.delete(previous)
+
+
+def render_pending(limit=RENDER_BATCH_SIZE):
+    """Render up to ``limit`` pending thumbnails. Returns how many were processed."""
+    processed = 0
+    for blob in Blob.objects.filter(thumbnail_status='pending').order_by('pk')[:limit]:
+        try:
+            render_blob(blob)
+        except Exception:
+            # A malformed file must not block the rest of the queue
+            logger.exception('Thumbnail rendering failed for %s', blob.name)
+            Blob.objects.filter(pk=blob.pk).update(thumbnail_status='failed')
+        processed += 1
+    return processed
+
+
+def schedule():
+    """Wake the in-process renderer once the current transaction commits."""
+    if getattr(settings, 'THUMBNAIL_AUTORUN', True):
+        transaction.on_commit(_renderer.wake)
+
+
+class _Renderer:
+    """In-process background thread that renders pending thumbnails after commits."""
+
+    def __init__(self):
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def wake(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='thumbnails', daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            try:
+                while render_pending():
+                    pass
+            except Exception:
+                logger.exception('Thumbnail rendering failed')
+            finally:
+                close_old_connections()
+
+
+_renderer = _Renderer()
+
+
+# ── Lookup ─────────────────────────────────────────────────────
+
+def annotate(instances):
+    """
+    Set ``thumbnail_version`` on documents or attachments: the token for
+    their thumbnail URL, or '' while they have none. One query.
+    """
+    names = {instance.file.name for instance in instances if instance.file}
+    thumbnails = dict(Blob.objects.filter(
+        name__in=names, thumbnail_status='ready',
+    ).values_list('name', 'thumbnail'))
+    for instance in instances:
+        instance.thumbnail_version = version_of(thumbnails.get(instance.file.name, ''))
+    return instances
+
+
+def thumbnail_for(instance):
+    """The thumbnail file of a document or attachment, or None."""
+    blob = Blob.objects.filter(name=instance.file.name, thumbnail_status='ready').only('thumbnail').first()
+    return blob.thumbnail if blob is not None else None
@@ -0,0 +1,448 @@
+"""
+Vectorized discovery ranking.
+
+Scoring candidates with SQL ``Case`` expressions ties the ranking to what a
+single query can express, and re-reads the whole user table per request.
+This module instead keeps a ``FeatureSnapshot`` of every user in compact
+NumPy arrays:
+
+* ``course``, ``year`` and ``program``: integer codes (0 = blank)
+* group membership as two compressed sparse row structures, user -> groups
+  and group -> users (``indptr``/``indices`` pairs, as in scipy.sparse)
+* accepted friendships as a symmetric sparse adjacency
+* per-group member counts, members per course code and recent activity,
+  read from the ``GroupStats`` rows maintained by ``resources.group_stats``
+
+Ranking one user against everyone is then a handful of array operations:
+attribute matches are element-wise comparisons, shared groups and mutual
+friends are sparse row products computed with ``np.bincount``, and the top
+``k`` candidates come from ``np.argpartition`` rather than a full sort.
+
+The snapshot is loaded once per process and reused for
+``RANKING_SNAPSHOT_TTL`` seconds. A user who signed up since it was loaded
+is added to a copy from a per-user query rather than reloading everyone.
+``python manage.py benchmark_ranking`` times the ranking on synthetic data.
+"""
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Friendship, GroupStats, Membership, StudyGroup
+
+User = get_user_model()
+
+# People scoring (clipped to MAX_SCORE)
+COURSE_WEIGHT = 40
+YEAR_WEIGHT = 30
+PROGRAM_WEIGHT = 20
+SHARED_GROUP_WEIGHT = 5
+MUTUAL_FRIEND_WEIGHT = 5
+SIGNAL_CAP = 4  # shared groups / mutual friends counted at most this many times
+MAX_SCORE = 100
+
+# Group scoring
+SAME_COURSE_WEIGHT = 60  # times the fraction of members in the user's course
+FRIEND_IN_GROUP_WEIGHT = 10
+FRIEND_IN_GROUP_CAP = 3
+ACTIVITY_WEIGHT = 20  # reached asymptotically; half of it at ACTIVITY_SATURATION
+ACTIVITY_SATURATION = 10  # recent messages
+
+
+def _codes(values, vocabulary=None):
+    """Integer-code a sequence of strings; blank values get code 0."""
+    if vocabulary is None:
+        vocabulary = {'': 0}
+    return np.fromiter(
+        (vocabulary.setdefault(value or '', len(vocabulary)) for value in values),
+        dtype=np.int32, count=len(values),
+    )
+
+
+def _program(value):
+    return (value or '').strip().lower()
+
+
+def _compress(rows, cols, n_rows):
+    """Group ``cols`` by ``rows`` into an ``(indptr, indices)`` pair."""
+    order = np.argsort(rows, kind='stable')
+    indptr = np.zeros(n_rows + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n_rows), out=indptr[1:])
+    return indptr, cols[order].astype(np.int32)
+
+
+def _gather(indptr, indices, rows):
+    """Concatenate the index lists of ``rows`` without a Python loop."""
+    starts = indptr[rows]
+    lengths = indptr[rows + 1] - starts
+    total = int(lengths.sum())
+    if not total:
+        return np.empty(0, dtype=np.int32)
+    offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(total)
+    return indices[offsets]
+
+
+def _membership_stats(member_rows, group_cols, course, n_groups):
+    """Member counts and a groups x course codes histogram derived from memberships."""
+    sizes = np.bincount(group_cols, minlength=n_groups)
+    course_counts = np.zeros((n_groups, int(course.max(initial=0)) + 1), dtype=np.int32)
+    np.add.at(course_counts, (group_cols, course[member_rows]), 1)
+    return sizes, course_counts
+
+
+def _pairs(queryset, first_ids, second_ids):
+    """
+    Map ``(id, id)`` rows to positions in the sorted ``first_ids`` and
+    ``second_ids``; rows naming ids missing from either (e.g. written after
+    the lists were read) are skipped.
+    """
+    array = np.array(list(queryset), dtype=np.int64).reshape(-1, 2)
+    first = np.searchsorted(first_ids, array[:, 0]).clip(max=max(len(first_ids) - 1, 0))
+    second = np.searchsorted(second_ids, array[:, 1]).clip(max=max(len(second_ids) - 1, 0))
+    if not len(first_ids) or not len(second_ids):
+        return first[:0], second[:0]
+    known = (first_ids[first] == array[:, 0]) & (second_ids[second] == array[:, 1])
+    return first[known], second[known]
+
+
+class FeatureSnapshot:
+    """Compact per-user feature arrays; rows are users sorted by id."""
+
+    def __init__(self, user_ids, course, year, program, group_ids, memberships, friendships,
+                 group_stats=None, vocabularies=None):
+        self.user_ids = np.asarray(user_ids, dtype=np.int64)
+        self.course = np.asarray(course, dtype=np.int32)
+        self.year = np.asarray(year, dtype=np.int32)
+        self.program = np.asarray(program, dtype=np.int32)
+        self.group_ids = np.asarray(group_ids, dtype=np.int64)
+        # {'course'|'year'|'program': {value: code}}, to code users added later
+        self.vocabularies = vocabularies
+        self.built_at = time.time()
+
+        n_users, n_groups = len(self.user_ids), len(self.group_ids)
+        member_rows, group_cols = memberships
+        self.user_groups = _compress(member_rows, group_cols, n_users)
+        self.group_users = _compress(group_cols, member_rows, n_groups)
+
+        # (member counts, groups x course codes histogram, recent activity)
+        if group_stats is None:
+            group_stats = _membership_stats(member_rows, group_cols, self.course, n_groups) + (
+                np.zeros(n_groups),
+            )
+        sizes, course_counts, activity = group_stats
+        self.group_sizes = np.asarray(sizes, dtype=np.int64)
+        self.group_course_counts = np.asarray(course_counts, dtype=np.int32)
+        self.group_activity = np.asarray(activity, dtype=np.float64)
+
+        from_rows, to_rows = friendships
+        self.friends = _compress(
+            np.concatenate([from_rows, to_rows]), np.concatenate([to_rows, from_rows]), n_users,
+        )
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    def __contains__(self, user_id):
+        return self.row_of(user_id) is not None
+
+    @staticmethod
+    def _lookup(sorted_ids, ids):
+        ids = np.asarray(ids if isinstance(ids, np.ndarray) else list(ids), dtype=np.int64)
+        if not len(sorted_ids):
+            return np.empty(0, dtype=np.int64)
+        positions = np.searchsorted(sorted_ids, ids).clip(max=len(sorted_ids) - 1)
+        return positions[sorted_ids[positions] == ids]
+
+    def rows_for(self, user_ids):
+        """Row numbers of the ``user_ids`` present in the snapshot."""
+        return self._lookup(self.user_ids, user_ids)
+
+    def columns_for(self, group_ids):
+        """Column numbers of the ``group_ids`` present in the snapshot."""
+        return self._lookup(self.group_ids, group_ids)
+
+    def row_of(self, user_id):
+        rows = self.rows_for([user_id])
+        return int(rows[0]) if len(rows) else None
+
+    @classmethod
+    def load(cls):
+        """Read every user, membership, accepted friendship and group's stats from the database."""
+        users = list(User.objects.order_by('id').values_list(
+            'id', 'course', 'year', 'profile__program_of_study',
+        ))
+        vocabularies = {'course': {'': 0}, 'year': {'': 0}, 'program': {'': 0}}
+        course_vocabulary = vocabularies['course']
+        course = _codes([row[1] for row in users], course_vocabulary)
+        user_ids = np.fromiter((row[0] for row in users), dtype=np.int64, count=len(users))
+        group_ids = np.fromiter(
+            StudyGroup.objects.order_by('id').values_list('id', flat=True), dtype=np.int64,
+        )
+
+        # Histogram columns use the users' course codes
+        stats = list(GroupStats.objects.values_list(
+            'group_id', 'member_count', 'course_counts', 'recent_activity', 'activity_at',
+        ))
+        for _, _, course_counts, _, _ in stats:
+            for course_name in course_counts:
+                course_vocabulary.setdefault(course_name, len(course_vocabulary))
+        columns = dict(zip(group_ids.tolist(), range(len(group_ids))))
+        sizes = np.zeros(len(group_ids), dtype=np.int64)
+        histogram = np.zeros((len(group_ids), len(course_vocabulary)), dtype=np.int32)
+        activity = np.zeros(len(group_ids))
+        now = timezone.now()
+        for group_id, member_count, course_counts, recent_activity, activity_at in stats:
+            column = columns.get(group_id)
+            if column is None:
+                continue
+            sizes[column] = member_count
+            for course_name, count in course_counts.items():
+                histogram[column, course_vocabulary[course_name]] = count
+            activity[column] = GroupStats(recent_activity=recent_activity, activity_at=activity_at).activity(now)
+
+        return cls(
+            user_ids,
+            course=course,
+            year=_codes([row[2] for row in users], vocabularies['year']),
+            program=_codes([_program(row[3]) for row in users], vocabularies['program']),
+            group_ids=group_ids,
+            memberships=_pairs(
+                Membership.objects.values_list('user_id', 'group_id'), user_ids, group_ids,
+            ),
+            friendships=_pairs(
+                Friendship.objects.filter(status='accepted').values_list('from_user_id', 'to_user_id'),
+                user_ids, user_ids,
+            ),
+            group_stats=(sizes, histogram, activity),
+            vocabularies=vocabularies,
+        )
+
+    def with_user(self, user_id):
+        """
+        A copy of the snapshot with ``user_id`` added from a per-user query,
+        or None when the user does not exist or the snapshot has no
+        vocabularies to code them with. Group statistics are left as loaded.
+        """
+        if self.vocabularies is None:
+            return None
+        row = User.objects.filter(pk=user_id).values_list('course', 'year', 'profile__program_of_study').first()
+        if row is None:
+            return None
+        vocabularies = {name: dict(vocabulary) for name, vocabulary in self.vocabularies.items()}
+        course, year, program = (
+            _codes([value], vocabularies[name])[0]
+            for name, value in zip(('course', 'year', 'program'), (row[0], row[1], _program(row[2])))
+        )
+
+        position = int(np.searchsorted(self.user_ids, user_id))
+
+        def shifted(rows):
+            # Existing rows at or after the new user's position move down one
+            return rows + (rows >= position)
+
+        def pairs(indptr, indices):
+            return np.repeat(np.arange(len(self)), np.diff(indptr)), indices.astype(np.int64)
+
+        member_rows, group_cols = pairs(*self.user_groups)
+        joined = self.columns_for(Membership.objects.filter(user_id=user_id).values_list('group_id', flat=True))
+        from_rows, to_rows = pairs(*self.friends)
+        once = from_rows < to_rows  # the adjacency holds each friendship both ways
+        friend_ids = [
+            to_id if from_id == user_id else from_id
+            for from_id, to_id in Friendship.objects.filter(
+                Q(from_user_id=user_id) | Q(to_user_id=user_id), status='accepted',
+            ).values_list('from_user_id', 'to_user_id')
+        ]
+        friend_rows = shifted(self.rows_for(friend_ids))
+
+        histogram = self.group_course_counts
+        if course >= histogram.shape[1]:
+            histogram = np.pad(histogram, ((0, 0), (0, course + 1 - histogram.shape[1])))
+
+        extended = type(self)(
+            np.insert(self.user_ids, position, user_id),
+            course=np.insert(self.course, position, course),
+            year=np.insert(self.year, position, year),
+            program=np.insert(self.program, position, program),
+            group_ids=self.group_ids,
+            memberships=(
+                np.concatenate([shifted(member_rows), np.full(len(joined), position)]),
+                np.concatenate([group_cols, joined]),
+            ),
+            friendships=(
+                np.concatenate([shifted(from_rows[once]), np.full(len(friend_rows), position)]),
+                np.concatenate([shifted(to_rows[once]), friend_rows]),
+            ),
+            group_stats=(self.group_sizes, histogram, self.group_activity),
+            vocabularies=vocabularies,
+        )
+        extended.built_at = self.built_at
+        return extended
+
+    @classmethod
+    def synthetic(cls, n_users, n_groups, groups_per_user=3, friends_per_user=10, seed=0):
+        """Random snapshot of the given size, for benchmarks."""
+        rng = np.random.default_rng(seed)
+        memberships = (
+            np.repeat(np.arange(n_users), groups_per_user),
+            rng.integers(0, n_groups, n_users * groups_per_user),
+        )
+        n_friendships = n_users * friends_per_user // 2
+        friendships = (
+            rng.integers(0, n_users, n_friendships),
+            rng.integers(0, n_users, n_friendships),
+        )
+        course = rng.integers(1, 7, n_users)
+        return cls(
+            np.arange(1, n_users + 1),
+            course=course,
+            year=rng.integers(1, 5, n_users),
+            program=rng.integers(0, 40, n_users),
+            group_ids=np.arange(1, n_groups + 1),
+            memberships=memberships,
+            friendships=friendships,
+            group_stats=_membership_stats(*memberships, course, n_groups) + (
+                rng.exponential(ACTIVITY_SATURATION, n_groups),
+            ),
+        )
+
+
+# ── Snapshot cache ─────────────────────────────────────────────
+
+_snapshot = None
+_snapshot_lock = threading.Lock()
+
+
+def _snapshot_ttl():
+    return getattr(settings, 'RANKING_SNAPSHOT_TTL', 300)
+
+
+def get_snapshot(refresh=False):
+    """The process-wide snapshot, reloaded when older than ``RANKING_SNAPSHOT_TTL``."""
+    global _snapshot
+    with _snapshot_lock:
+        if refresh or _snapshot is None or time.time() - _snapshot.built_at > _snapshot_ttl():
+            _snapshot = FeatureSnapshot.load()
+        return _snapshot
+
+
+def snapshot_for(user_id):
+    """
+    A snapshot that contains ``user_id``. A user missing from the shared
+    snapshot is added to a copy, which replaces it for later requests; the
+    full reload still waits for the TTL.
+    """
+    global _snapshot
+    snapshot = get_snapshot()
+    if user_id in snapshot:
+        return snapshot
+    extended = snapshot.with_user(user_id)
+    if extended is None:
+        return snapshot
+    with _snapshot_lock:
+        # Unless a reload replaced the snapshot meanwhile
+        if _snapshot is snapshot:
+            _snapshot = extended
+    return extended
+
+
+# ── Ranking ────────────────────────────────────────────────────
+
+def _top_k(keys, k):
+    """Indices of the ``k`` largest finite ``keys``, largest first."""
+    k = min(k, int(np.isfinite(keys).sum()))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    top = np.argpartition(-keys, k - 1)[:k]
+    return top[np.argsort(-keys[top], kind='stable')]
+
+
+def user_scores(snapshot, row):
+    """Match score (0-100) of every user in the snapshot against the user at ``row``."""
+    course, year, program = snapshot.course[row], snapshot.year[row], snapshot.program[row]
+    scores = (
+        COURSE_WEIGHT * (snapshot.course == course)
+        + YEAR_WEIGHT * (snapshot.year == year)
+    ).astype(np.int16)
+    if program:
+        scores += PROGRAM_WEIGHT * (snapshot.program == program)
+
+    n_users = len(snapshot)
+    groups = _gather(*snapshot.user_groups, np.array([row]))
+    shared_groups = np.bincount(_gather(*snapshot.group_users, groups), minlength=n_users)
+    friends = _gather(*snapshot.friends, np.array([row]))
+    mutual_friends = np.bincount(_gather(*snapshot.friends, friends), minlength=n_users)
+    scores += SHARED_GROUP_WEIGHT * np.minimum(shared_groups, SIGNAL_CAP).astype(np.int16)
+    scores += MUTUAL_FRIEND_WEIGHT * np.minimum(mutual_friends, SIGNAL_CAP).astype(np.int16)
+    return np.minimum(scores, MAX_SCORE)
+
+
+def rank_users(snapshot, user_id, k, exclude=(), candidates=None, seed=None):
+    """
+    The best ``k`` candidates for ``user_id`` as ``[(candidate_id, score), ...]``,
+    highest score first. Candidates with equal scores are shuffled by ``seed``.
+    ``candidates`` limits the ranking to those user ids (e.g. search results).
+    """
+    row = snapshot.row_of(user_id)
+    if row is None:
+        return []
+    scores = user_scores(snapshot, row)
+
+    # The random fraction only breaks ties: it never lifts a candidate a whole point
+    keys = scores + np.random.default_rng(seed).random(len(snapshot))
+    if candidates is not None:
+        allowed = np.full(len(snapshot), -np.inf)
+        allowed[snapshot.rows_for(candidates)] = 0
+        keys += allowed
+    keys[row] = -np.inf
+    keys[snapshot.rows_for(exclude)] = -np.inf
+
+    top = _top_k(keys, k)
+    return list(zip(snapshot.user_ids[top].tolist(), scores[top].tolist()))
+
+
+def rank_groups(snapshot, user_id, k, exclude=(), candidates=None, seed=None):
+    """
+    The best ``k`` groups for ``user_id`` as ``[(group_id, score, member_count), ...]``.
+
+    Groups score by the fraction of their members in the user's course, by
+    how many of the user's friends belong to them and by recent message
+    activity; ties go to the larger group, then to a random pick.
+    ``candidates`` limits the ranking to those group ids (e.g. search results).
+    """
+    n_groups = len(snapshot.group_ids)
+    row = snapshot.row_of(user_id)
+    if row is None or not n_groups:
+        return []
+
+    sizes = snapshot.group_sizes
+    same_course = snapshot.group_course_counts[:, snapshot.course[row]]
+    activity = snapshot.group_activity
+    friends = _gather(*snapshot.friends, np.array([row]))
+    friends_in_group = np.bincount(_gather(*snapshot.user_groups, friends), minlength=n_groups)
+
+    scores = np.rint(
+        SAME_COURSE_WEIGHT * same_course / np.maximum(sizes, 1)
+        + FRIEND_IN_GROUP_WEIGHT * np.minimum(friends_in_group, FRIEND_IN_GROUP_CAP)
+        + ACTIVITY_WEIGHT * activity / (activity + ACTIVITY_SATURATION)
+    ).astype(np.int16).clip(max=MAX_SCORE)
+
+    # Score first, then member count, then a random fraction
+    keys = (
+        scores.astype(np.float64) * (sizes.max() + 1) + sizes
+        + np.random.default_rng(seed).random(n_groups)
+    )
+    if candidates is not None:
+        allowed = np.full(n_groups, -np.inf)
+        allowed[snapshot.columns_for(candidates)] = 0
+        keys += allowed
+    keys[snapshot.columns_for(exclude)] = -np.inf
+
+    top = _top_k(keys, k)
+    return list(zip(
+        snapshot.group_ids[top].tolist(), scores[top].tolist(), sizes[top].tolist(),
+    ))
@@ -0,0 +1,112 @@
+"""
+Per-chat read cursors.
+
+Instead of an is_read flag on every message, each user keeps one
+``ReadCursor`` row per group or private chat holding the id of the last
+message they have seen. Marking a chat read moves the cursor forward (one row
+write) and unread counts are ``id > cursor`` range counts over the
+(chat, id) / (group, id) message indexes.
+"""
+from django.db import transaction
+from django.db.models import Count, IntegerField, Max, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from . import counters, dashboard
+from .models import Message, PrivateMessage, ReadCursor
+
+
+def cursor_for(user, **target):
+    """Current cursor position of a user in one chat, e.g. ``cursor_for(user, group=group)``."""
+    return ReadCursor.objects.filter(user=user, **target).values_list('last_read_id', flat=True).first() or 0
+
+
+def _advance(user, up_to_id, **target):
+    """
+    Move a cursor forward to ``up_to_id`` and return its previous position,
+    or None when the cursor was already there or past it.
+    """
+    with transaction.atomic():
+        cursor, created = ReadCursor.objects.select_for_update().get_or_create(
+            user=user, defaults={'last_read_id': up_to_id}, **target
+        )
+        if created:
+            return 0
+        # Conditional update so a concurrent, newer mark-read is never undone
+        # and of two identical ones only the first reports a move
+        moved = ReadCursor.objects.filter(
+            pk=cursor.pk, last_read_id=cursor.last_read_id, last_read_id__lt=up_to_id,
+        ).update(last_read_id=up_to_id)
+        return cursor.last_read_id if moved else None
+
+
+def mark_private_chat_read(user, chat):
+    """Mark everything in a private chat as read for ``user``."""
+    up_to_id = chat.last_message_id
+    if up_to_id is None:
+        return
+    with transaction.atomic():
+        previous = _advance(user, up_to_id, private_chat=chat)
+        if previous is None:
+            return
+        newly_read = PrivateMessage.objects.filter(
+            chat=chat, id__gt=previous, id__lte=up_to_id,
+        ).exclude(sender=user).count()
+        counters.adjust(user.id, messages=-newly_read)
+
+
+def mark_group_read(user, group, up_to_id=None):
+    """Mark a group chat as read for ``user`` up to ``up_to_id`` (default and at most: newest message)."""
+    latest = Message.objects.filter(group=group).aggregate(latest=Max('id'))['latest']
+    # A cursor past the newest message would hide messages not yet sent
+    if up_to_id is None or latest is None or up_to_id > latest:
+        up_to_id = latest
+    if up_to_id is None or cursor_for(user, group=group) >= up_to_id:
+        return
+    _advance(user, up_to_id, group=group)
+    # The per-group unread badges on the dashboard
+    dashboard.invalidate_users([user.id], ('groups',))
+
+
+def unread_private_count(user, chat):
+    return PrivateMessage.objects.filter(
+        chat=chat, id__gt=cursor_for(user, private_chat=chat),
+    ).exclude(sender=user).count()
+
+
+def unread_group_count(user, group):
+    return Message.objects.filter(
+        group=group, id__gt=cursor_for(user, group=group),
+    ).exclude(user=user).count()
+
+
+def _cursor_subquery(user, field):
+    return Coalesce(
+        Subquery(
+            ReadCursor.objects.filter(user=user, **{field: OuterRef('pk')}).values('last_read_id')[:1]
+        ),
+        Value(0),
+    )
+
+
+def annotate_private_unread(chats, user):
+    """Annotate a PrivateChat queryset with ``unread_count`` for ``user``."""
+    unread = PrivateMessage.objects.filter(
+        chat=OuterRef('pk'), id__gt=OuterRef('read_cursor'),
+    ).exclude(sender=user).order_by().values('chat').annotate(c=Count('id')).values('c')
+    return chats.annotate(
+        read_cursor=_cursor_subquery(user, 'private_chat'),
+    ).annotate(
+        unread_count=Coalesce(Subquery(unread, output_field=IntegerField()), Value(0)),
+    )
+
+
+def annotate_group_unread(groups, user):
+    """Annotate a StudyGroup queryset with ``unread_count`` for ``user``."""
+    unread = Message.objects.filter(
+        group=OuterRef('pk'), id__gt=OuterRef('read_cursor'),
+    ).exclude(user=user).order_by().values('group').annotate(c=Count('id')).values('c')
+    return groups.annotate(
+        read_cursor=_cursor_subquery(user, 'group'),
+    ).annotate(
+        unread_count=Coalesce(Subquery(unread, output_field=IntegerField()), Value(0)),
+    )
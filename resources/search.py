@@ -0,0 +1,215 @@
+"""
+Full-text search over group and private chat history.
+
+``Message`` and ``PrivateMessage`` each have an SQLite FTS5 index in
+external-content mode: the index stores only the tokenized terms and reads
+message text back from the message table itself, so it adds no second copy
+of the history. Triggers on the message tables keep the index in step with
+every insert, edit and delete, including ones that bypass the ORM.
+
+Besides ``content`` each index holds the message's ``group_id`` or
+``chat_id`` as a second column. A search is scoped to the conversations
+the user can read by matching that column against their ids inside the
+same FTS5 query, so SQLite intersects the term lists with the scope lists
+in the index instead of ranking every match in the database and then
+throwing most of them away.
+
+Results are ordered by BM25 relevance and paginated with a keyset cursor
+over ``(score, kind, id)``; snippets are computed only for the rows of the
+returned page. The interleaving of group and private results is
+approximate: each index scores against its own corpus statistics (term
+frequencies, average message length), so a group score and a private
+score are only roughly comparable. Within one kind the order is exact,
+and the cursor is exact either way: ``(score, kind, id)`` is a total
+order, so paging never skips or repeats a message.
+
+Django rebuilds a SQLite table (dropping its triggers) when a migration
+alters it in ways ``ALTER TABLE`` cannot. A migration that does that to
+either message table should run ``install`` afterwards;
+``python manage.py rebuild_search_index`` does the same and re-indexes.
+"""
+import html
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from . import membership
+from .models import GroupJoinRequest, Message, PrivateChat, PrivateMessage
+
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 50
+MAX_TERMS = 8
+SNIPPET_TOKENS = 24
+
+# kind -> (message table, FTS table, scope column)
+INDEXES = {
+    'group': ('resources_message', 'resources_message_fts', 'group_id'),
+    'private': ('resources_privatemessage', 'resources_privatemessage_fts', 'chat_id'),
+}
+
+# Control characters that never occur in typed text, swapped for <mark>
+# tags once the snippet has been HTML-escaped
+MARK_START, MARK_END = '\x02', '\x03'
+_TERM = re.compile(r'\w+')
+
+
+def install(using=None):
+    """Create the FTS tables and their sync triggers if missing (SQLite only)."""
+    using = using or connection
+    if using.vendor != 'sqlite':
+        return
+    with using.cursor() as cursor:
+        for table, fts, scope in INDEXES.values():
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+                f"content, {scope}, content='{table}', content_rowid='id', "
+                f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+            )
+            insert = f"INSERT INTO {fts}(rowid, content, {scope}) VALUES (new.id, new.content, new.{scope});"
+            delete = (
+                f"INSERT INTO {fts}({fts}, rowid, content, {scope}) "
+                f"VALUES ('delete', old.id, old.content, old.{scope});"
+            )
+            cursor.execute(f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN {insert} END")
+            cursor.execute(f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN {delete} END")
+            cursor.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF content, {scope} ON {table} "
+                f"BEGIN {delete} {insert} END"
+            )
+
+
+def rebuild(using=None):
+    """Re-index every message from the message tables."""
+    using = using or connection
+    if using.vendor != 'sqlite':
+        return
+    with using.cursor() as cursor:
+        for _, fts, _ in INDEXES.values():
+            cursor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+
+def match_expression(query):
+    """
+    Turn free text into an FTS5 query: every word must appear, the last one
+    as a prefix so results follow the user's typing. Returns None when the
+    text has no searchable words. Quoting each word keeps FTS5 operators
+    and column names in the input from being interpreted.
+    """
+    terms = [f'"{term}"' for term in _TERM.findall(query.lower())[:MAX_TERMS]]
+    if not terms:
+        return None
+    terms[-1] += '*'
+    return ' AND '.join(terms)
+
+
+def readable_scopes(user):
+    """``{kind: ids}`` of the groups and private chats whose messages ``user`` can read."""
+    # Same rule as the chat page: members and pending join requesters
+    group_ids = membership.group_ids_for(user) | set(GroupJoinRequest.objects.filter(
+        user=user, status='pending',
+    ).values_list('group_id', flat=True))
+    chat_ids = set(PrivateChat.objects.filter(
+        Q(participant1=user) | Q(participant2=user),
+    ).values_list('id', flat=True))
+    return {'group': group_ids, 'private': chat_ids}
+
+
+def encode_cursor(score, kind, pk):
+    return f'{score!r}_{kind}_{pk}'
+
+
+def decode_cursor(cursor):
+    """Decode a cursor produced by encode_cursor, or return None if malformed."""
+    try:
+        score, kind, pk = cursor.split('_', 2)
+        if kind not in INDEXES:
+            return None
+        return float(score), kind, int(pk)
+    except (AttributeError, ValueError):
+        return None
+
+
+def highlight(snippet):
+    """HTML-escape an FTS5 snippet and turn its match markers into ``<mark>`` tags."""
+    return html.escape(snippet).replace(MARK_START, '<mark>').replace(MARK_END, '</mark>')
+
+
+def search(user, query, scopes=None, after=None, limit=PAGE_SIZE):
+    """
+    Return ``(results, next_cursor)`` for ``query`` over the conversations
+    in ``scopes`` (default: everything ``user`` can read; pass a subset of
+    ``readable_scopes`` to narrow it). Each result is a dict with ``kind``
+    ('group' or 'private'), the ``message`` instance, its ``score`` (lower
+    is more relevant) and an HTML-escaped ``snippet`` with the matched
+    terms in ``<mark>`` tags. ``after`` is a decoded cursor.
+
+    Group and private results are merged by their raw scores, which come
+    from two separate indexes; see the module docstring.
+    """
+    expression = match_expression(query)
+    if expression is None:
+        return [], None
+    if scopes is None:
+        scopes = readable_scopes(user)
+
+    branches, params = [], []
+    for kind, (_, fts, scope) in INDEXES.items():
+        ids = sorted(scopes.get(kind, ()))
+        if not ids:
+            continue
+        branches.append(
+            f"SELECT '{kind}' AS kind, rowid AS id, bm25({fts}) AS score FROM {fts} WHERE {fts} MATCH %s"
+        )
+        scope_terms = ' OR '.join(f'"{pk}"' for pk in ids)
+        params.append(f'{scope} : ({scope_terms}) AND content : ({expression})')
+    if not branches:
+        return [], None
+
+    sql = f"SELECT kind, id, score FROM ({' UNION ALL '.join(branches)})"
+    if after is not None:
+        score, kind, pk = after
+        sql += " WHERE score > %s OR (score = %s AND (kind > %s OR (kind = %s AND id > %s)))"
+        params += [score, score, kind, kind, pk]
+    sql += " ORDER BY score, kind, id LIMIT %s"
+    params.append(limit + 1)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        kind, pk, score = rows[limit - 1]
+        next_cursor = encode_cursor(score, kind, pk)
+    rows = rows[:limit]
+
+    # Snippets and message rows for this page only
+    page_ids = {kind: [pk for row_kind, pk, _ in rows if row_kind == kind] for kind in INDEXES}
+    snippets = {}
+    with connection.cursor() as cursor:
+        for kind, ids in page_ids.items():
+            if not ids:
+                continue
+            fts = INDEXES[kind][1]
+            cursor.execute(
+                f"SELECT rowid, snippet({fts}, 0, %s, %s, '…', %s) FROM {fts} "
+                f"WHERE {fts} MATCH %s AND rowid IN ({', '.join(['%s'] * len(ids))})",
+                [MARK_START, MARK_END, SNIPPET_TOKENS, f'content : ({expression})', *ids],
+            )
+            snippets.update({(kind, pk): snippet for pk, snippet in cursor.fetchall()})
+    messages = {
+        'group': Message.objects.select_related('user__profile', 'group').in_bulk(page_ids['group']),
+        'private': PrivateMessage.objects.select_related(
+            'sender__profile', 'chat__participant1', 'chat__participant2',
+        ).in_bulk(page_ids['private']),
+    }
+
+    results = []
+    for kind, pk, score in rows:
+        message = messages[kind].get(pk)
+        if message is not None:
+            results.append({
+                'kind': kind, 'message': message, 'score': score,
+                'snippet': highlight(snippets.get((kind, pk), message.content)),
+            })
+    return results, next_cursor
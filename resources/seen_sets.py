@@ -0,0 +1,113 @@
+"""
+Compact per-user seen-sets for discovery exclusions.
+
+A heavy swiper can have thousands of ``UserDiscoveryAction`` or
+``GroupDiscoveryAction`` rows. Reading them all into Python for every
+discovery page and sending them back as a ``NOT IN (...)`` list runs into
+SQLite's parameter limit and slow plans. Each user instead has one
+``DiscoverySeenSet`` row per kind ('user' or 'group') holding the actioned
+ids as a sorted array. The array is stored as the gaps between consecutive
+ids (small numbers for dense id ranges), zlib-compressed, so 10,000 ids
+usually take a few kilobytes.
+
+``get`` returns the decoded set as a sorted NumPy array, served from the
+Django cache for ``DISCOVERY_SEEN_CACHE_TTL`` seconds. ``resources.ranking``
+masks it out of the feature snapshot with a vectorized lookup, so excluding
+it never involves SQL parameters. Recording actions merges the new ids into
+the row with ``add``. Deleting an action drops the row, which is rebuilt
+from the action table on next use.
+"""
+import zlib
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import DiscoverySeenSet, GroupDiscoveryAction, UserDiscoveryAction
+
+# Source table and id column of each kind of set
+_SOURCES = {
+    'user': (UserDiscoveryAction, 'discovered_user_id'),
+    'group': (GroupDiscoveryAction, 'group_id'),
+}
+
+
+def _cache_ttl():
+    return getattr(settings, 'DISCOVERY_SEEN_CACHE_TTL', 300)
+
+
+def _cache_key(user_id, kind):
+    return f'discovery-seen:{kind}:{user_id}'
+
+
+def encode(ids):
+    """Sorted, de-duplicated ids as compressed uint32 gaps."""
+    ids = np.unique(np.asarray(ids, dtype=np.uint32))
+    return zlib.compress(np.diff(ids, prepend=np.uint32(0)).astype('<u4').tobytes())
+
+
+def decode(data):
+    """Inverse of ``encode``: a sorted int64 array."""
+    if not data:
+        return np.empty(0, dtype=np.int64)
+    return np.cumsum(np.frombuffer(zlib.decompress(bytes(data)), dtype='<u4'), dtype=np.int64)
+
+
+def _store(user_id, kind, ids):
+    data = encode(ids)
+    DiscoverySeenSet.objects.update_or_create(
+        user_id=user_id, kind=kind, defaults={'data': data, 'size': len(np.unique(ids))},
+    )
+    return data
+
+
+def _rebuild(user_id, kind):
+    model, field = _SOURCES[kind]
+    return _store(user_id, kind, list(model.objects.filter(user_id=user_id).values_list(field, flat=True)))
+
+
+def get(user_id, kind):
+    """Sorted array of the ids of ``kind`` that ``user_id`` has actioned."""
+    key = _cache_key(user_id, kind)
+    data = cache.get(key)
+    if data is None:
+        data = DiscoverySeenSet.objects.filter(user_id=user_id, kind=kind).values_list('data', flat=True).first()
+        data = _rebuild(user_id, kind) if data is None else bytes(data)
+        cache.set(key, data, _cache_ttl())
+    return decode(data)
+
+
+def contains(user_id, kind, ids):
+    """The subset of ``ids`` already in the user's seen-set."""
+    ids = np.asarray(list(ids), dtype=np.int64)
+    return set(ids[np.isin(ids, get(user_id, kind))].tolist())
+
+
+def union(user_id, kind, ids):
+    """The seen-set plus ``ids`` (e.g. friends or joined groups), as one sorted array."""
+    return np.union1d(get(user_id, kind), np.asarray(list(ids), dtype=np.int64))
+
+
+def add(user_id, kind, ids):
+    """Merge ids into the seen-set. Call after the actions themselves are saved."""
+    ids = list(ids)
+    if not ids:
+        return
+    with transaction.atomic():
+        seen = DiscoverySeenSet.objects.select_for_update().filter(user_id=user_id, kind=kind).first()
+        if seen is None:
+            # Built from the action table, which already holds the new ids
+            data = _rebuild(user_id, kind)
+        else:
+            merged = np.union1d(decode(seen.data), np.asarray(ids, dtype=np.int64))
+            seen.data = data = encode(merged)
+            seen.size = len(merged)
+            seen.save(update_fields=['data', 'size', 'updated_at'])
+    cache.set(_cache_key(user_id, kind), data, _cache_ttl())
+
+
+def invalidate(user_id, kind):
+    """Forget a seen-set after actions were removed; it is rebuilt on next use."""
+    DiscoverySeenSet.objects.filter(user_id=user_id, kind=kind).delete()
+    cache.delete(_cache_key(user_id, kind))
@@ -0,0 +1,419 @@
+# resources/signals.py
+import os
+
+from django.conf import settings
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import activity, blobs, counters, dashboard, document_index, friends, group_stats, membership, seen_sets
+from .models import (
+    StudyGroup, Membership, Friendship, PrivateChat, PrivateMessage, GroupJoinRequest, Notification,
+    GroupNotification, Message, Document, Tag, UserDiscoveryAction, GroupDiscoveryAction, MessageAttachment,
+    ReadCursor, UnreadCounter,
+)
+
+
+# ── Private chat summary ───────────────────────────────────────
+
+@receiver(post_save, sender=PrivateMessage)
+def update_chat_last_message(sender, instance, created, **kwargs):
+    """Keep the chat's denormalized last message and activity time current"""
+    if created:
+        PrivateChat.objects.filter(pk=instance.chat_id).update(
+            last_message=instance,
+            last_message_at=instance.timestamp,
+            updated_at=timezone.now(),
+        )
+
+
+@receiver(post_delete, sender=PrivateMessage)
+def replace_deleted_last_message(sender, instance, **kwargs):
+    """Fall back to the previous message when the last one is deleted"""
+    previous = PrivateMessage.objects.filter(chat_id=instance.chat_id).order_by('-timestamp', '-id').first()
+    PrivateChat.objects.filter(pk=instance.chat_id, last_message__isnull=True).update(
+        last_message=previous,
+        last_message_at=previous.timestamp if previous else None,
+    )
+
+
+# ── Unread counters ────────────────────────────────────────────
+
+@receiver(post_save, sender=Notification)
+def count_new_notification(sender, instance, created, **kwargs):
+    """Bump the recipient's badge when an unread notification is created"""
+    if created and not instance.is_read:
+        counters.adjust(instance.recipient_id, notifications=1)
+
+
+@receiver(post_delete, sender=Notification)
+def uncount_deleted_notification(sender, instance, **kwargs):
+    if not instance.is_read:
+        counters.adjust(instance.recipient_id, notifications=-1)
+
+
+@receiver(post_save, sender=GroupNotification)
+def count_new_group_notification(sender, instance, created, **kwargs):
+    """Bump the badge of every member who will see the group notification"""
+    if created:
+        counters.adjust_many(instance.audience().values('user_id'), notifications=1)
+
+
+@receiver(post_delete, sender=GroupNotification)
+def recount_deleted_group_notification(sender, instance, **kwargs):
+    member_ids = Membership.objects.filter(group_id=instance.group_id).values_list('user_id', flat=True)
+    counters.recount_many(member_ids, ['notifications'])
+
+
+@receiver(pre_delete, sender=StudyGroup)
+def remember_deleted_group_members(sender, instance, **kwargs):
+    # Memberships are gone by post_delete; keep the ids to fix their badges then
+    instance._deleted_member_ids = list(instance.memberships.values_list('user_id', flat=True))
+
+
+@receiver(post_delete, sender=StudyGroup)
+def recount_deleted_group_members(sender, instance, **kwargs):
+    counters.recount_many(getattr(instance, '_deleted_member_ids', ()), ['notifications', 'join_requests'])
+
+
+@receiver(post_save, sender=PrivateMessage)
+def count_new_private_message(sender, instance, created, **kwargs):
+    """Bump the other participant's unread message count"""
+    if created:
+        chat = instance.chat
+        recipient_id = chat.participant2_id if chat.participant1_id == instance.sender_id else chat.participant1_id
+        counters.adjust(recipient_id, messages=1)
+
+
+@receiver(pre_delete, sender=PrivateMessage)
+def remember_unread_recipient(sender, instance, **kwargs):
+    # The chat and its cursors may go in the same cascade; look the recipient up first
+    participants = PrivateChat.objects.filter(pk=instance.chat_id).values_list(
+        'participant1_id', 'participant2_id'
+    ).first()
+    if participants is None:
+        return
+    recipient_id = participants[1] if participants[0] == instance.sender_id else participants[0]
+    cursor = ReadCursor.objects.filter(
+        user_id=recipient_id, private_chat_id=instance.chat_id,
+    ).values_list('last_read_id', flat=True).first() or 0
+    if instance.id > cursor:
+        instance._unread_recipient_id = recipient_id
+
+
+@receiver(post_delete, sender=PrivateMessage)
+def recount_deleted_private_message(sender, instance, **kwargs):
+    """Drop an unread message from the badge, whether deleted alone or with its chat or sender"""
+    recipient_id = getattr(instance, '_unread_recipient_id', None)
+    # A recipient deleted in the same cascade has no counter left to fix
+    if recipient_id and UnreadCounter.objects.filter(pk=recipient_id).exists():
+        counters.recount(recipient_id, ['messages'])
+
+
+@receiver(post_save, sender=Friendship)
+@receiver(post_delete, sender=Friendship)
+def recount_friend_requests(sender, instance, **kwargs):
+    """Any status change can open or close a pending request"""
+    counters.recount(instance.to_user_id, ['friend_requests'])
+
+
+@receiver(post_save, sender=GroupJoinRequest)
+@receiver(post_delete, sender=GroupJoinRequest)
+def recount_join_requests(sender, instance, **kwargs):
+    """Refresh the join request badge of every admin of the group"""
+    counters.recount_many(counters.group_admin_ids(instance.group_id), ['join_requests'])
+
+
+@receiver(m2m_changed, sender=StudyGroup.members.through)
+def recount_join_requests_for_roles(sender, instance, action, pk_set, **kwargs):
+    """Gaining or losing membership changes which join requests and group notifications a user sees"""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if isinstance(instance, StudyGroup):
+        if action == 'post_clear':
+            # pk_set is not provided for clear; refresh whoever still administers the group
+            user_ids = counters.group_admin_ids(instance.pk) + [instance.creator_id]
+        else:
+            user_ids = pk_set or ()
+    else:
+        user_ids = [instance.pk]
+    counters.recount_many(user_ids, ['join_requests', 'notifications'])
+
+
+# ── Membership cache ───────────────────────────────────────────
+
+@receiver(m2m_changed, sender=StudyGroup.members.through)
+def invalidate_member_cache(sender, instance, action, pk_set, **kwargs):
+    """Membership changes through group.members / user.study_groups"""
+    if isinstance(instance, StudyGroup):
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            membership.invalidate([instance.pk], instance)
+    elif action in ('post_add', 'post_remove'):
+        membership.invalidate(pk_set or ())
+    elif action == 'pre_clear':
+        # pk_set is not provided for clear, so look the groups up before they go
+        membership.invalidate(membership.group_ids_for(instance))
+
+
+@receiver(post_save, sender=Membership)
+@receiver(post_delete, sender=Membership)
+def invalidate_member_cache_for_row(sender, instance, **kwargs):
+    """Rows written directly, or removed by a user/group cascade"""
+    membership.invalidate([instance.group_id])
+
+
+# ── Group discovery stats ──────────────────────────────────────
+
+@receiver(m2m_changed, sender=StudyGroup.members.through)
+def count_added_members(sender, instance, action, pk_set, **kwargs):
+    """Joins through group.members / user.study_groups, which insert rows without post_save"""
+    if action != 'post_add' or not pk_set:
+        return
+    if isinstance(instance, StudyGroup):
+        group_stats.members_changed(instance.pk, pk_set, 1)
+    else:
+        for group_id in pk_set:
+            group_stats.members_changed(group_id, [instance.pk], 1)
+
+
+@receiver(post_save, sender=Membership)
+def count_created_membership(sender, instance, created, **kwargs):
+    if created:
+        group_stats.members_changed(instance.group_id, [instance.user_id], 1)
+
+
+@receiver(post_delete, sender=Membership)
+def uncount_deleted_membership(sender, instance, **kwargs):
+    """remove(), clear() and user or group deletion all delete the rows one by one"""
+    group_stats.members_changed(instance.group_id, [instance.user_id], -1)
+
+
+@receiver(pre_save, sender=settings.AUTH_USER_MODEL)
+def remember_previous_course(sender, instance, update_fields=None, **kwargs):
+    if instance.pk and (update_fields is None or 'course' in update_fields):
+        instance._previous_course = sender.objects.filter(pk=instance.pk).values_list('course', flat=True).first()
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def move_member_course(sender, instance, created, **kwargs):
+    """Keep the course histograms of the user's groups current"""
+    previous = instance.__dict__.pop('_previous_course', None)
+    if not created and previous is not None and previous != instance.course:
+        group_stats.course_changed(instance.pk, previous, instance.course)
+
+
+@receiver(post_save, sender=Message)
+def count_group_activity(sender, instance, created, **kwargs):
+    if created:
+        group_stats.message_posted(instance.group_id, instance.timestamp)
+
+
+@receiver(post_delete, sender=Message)
+def uncount_group_activity(sender, instance, **kwargs):
+    group_stats.message_deleted(instance.group_id, instance.timestamp)
+
+
+# ── Friend graph ───────────────────────────────────────────────
+
+@receiver(post_save, sender=Friendship)
+@receiver(post_delete, sender=Friendship)
+def invalidate_friend_sets(sender, instance, **kwargs):
+    """Any status change can add or remove an accepted friendship"""
+    friends.invalidate([instance.from_user_id, instance.to_user_id])
+
+
+# ── Discovery seen-sets ────────────────────────────────────────
+
+@receiver(post_delete, sender=UserDiscoveryAction)
+def forget_seen_user(sender, instance, **kwargs):
+    """Removed actions make the candidate discoverable again"""
+    seen_sets.invalidate(instance.user_id, 'user')
+
+
+@receiver(post_delete, sender=GroupDiscoveryAction)
+def forget_seen_group(sender, instance, **kwargs):
+    seen_sets.invalidate(instance.user_id, 'group')
+
+
+# ── Dashboard snapshot ─────────────────────────────────────────
+
+@receiver(post_save, sender=Message)
+@receiver(post_delete, sender=Message)
+def invalidate_dashboard_for_message(sender, instance, **kwargs):
+    dashboard.invalidate_groups([instance.group_id], ('groups', 'feed'))
+
+
+@receiver(post_save, sender=PrivateMessage)
+@receiver(post_delete, sender=PrivateMessage)
+def invalidate_dashboard_for_private_message(sender, instance, **kwargs):
+    chat = instance.chat
+    dashboard.invalidate_users([chat.participant1_id, chat.participant2_id], ('feed',))
+
+
+@receiver(post_save, sender=PrivateChat)
+@receiver(post_delete, sender=PrivateChat)
+def invalidate_dashboard_for_chat(sender, instance, **kwargs):
+    if kwargs.get('created', True):
+        dashboard.invalidate_users([instance.participant1_id, instance.participant2_id], ('stats', 'feed'))
+
+
+@receiver(post_save, sender=Document)
+@receiver(post_delete, sender=Document)
+def invalidate_dashboard_for_document(sender, instance, **kwargs):
+    dashboard.invalidate_users([instance.uploaded_by_id], ('stats', 'feed'))
+    if instance.group_id:
+        dashboard.invalidate_groups([instance.group_id], ('feed',))
+
+
+@receiver(post_save, sender=Friendship)
+@receiver(post_delete, sender=Friendship)
+def invalidate_dashboard_for_friendship(sender, instance, **kwargs):
+    dashboard.invalidate_users([instance.from_user_id, instance.to_user_id], ('stats', 'feed'))
+
+
+@receiver(post_save, sender=GroupJoinRequest)
+@receiver(post_delete, sender=GroupJoinRequest)
+def invalidate_dashboard_for_join_request(sender, instance, **kwargs):
+    dashboard.invalidate_groups([instance.group_id], ('stats', 'feed'))
+
+
+@receiver(post_save, sender=StudyGroup)
+def invalidate_dashboard_for_group(sender, instance, created, **kwargs):
+    if not created:
+        dashboard.invalidate_groups([instance.pk], ('groups', 'feed'))
+
+
+@receiver(m2m_changed, sender=StudyGroup.members.through)
+def invalidate_dashboard_for_members(sender, instance, action, pk_set, **kwargs):
+    """Joining or leaving changes the member's whole dashboard and the group's member count"""
+    if isinstance(instance, StudyGroup):
+        if action in ('post_add', 'post_remove'):
+            dashboard.invalidate_users(pk_set or ())
+        elif action == 'pre_clear':
+            dashboard.invalidate_users(instance.memberships.values_list('user_id', flat=True))
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            dashboard.invalidate_groups([instance.pk], ('groups',))
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        dashboard.invalidate_users([instance.pk])
+        if pk_set:
+            dashboard.invalidate_groups(pk_set, ('groups',))
+
+
+@receiver(post_save, sender=Membership)
+@receiver(post_delete, sender=Membership)
+def invalidate_dashboard_for_membership_row(sender, instance, **kwargs):
+    dashboard.invalidate_users([instance.user_id])
+    dashboard.invalidate_groups([instance.group_id], ('groups',))
+
+
+# ── Activity feed ──────────────────────────────────────────────
+
+@receiver(post_save, sender=Message)
+def record_group_message_activity(sender, instance, created, **kwargs):
+    if created:
+        activity.group_message_posted(instance)
+    else:
+        activity.group_message_edited(instance)
+
+
+@receiver(post_save, sender=PrivateMessage)
+def record_private_message_activity(sender, instance, created, **kwargs):
+    if created:
+        activity.private_message_sent(instance)
+
+
+@receiver(post_save, sender=Friendship)
+def record_friendship_activity(sender, instance, **kwargs):
+    activity.friendship_changed(instance)
+
+
+@receiver(post_save, sender=GroupJoinRequest)
+def record_join_request_activity(sender, instance, **kwargs):
+    activity.join_request_changed(instance)
+
+
+@receiver(post_delete, sender=Message)
+def withdraw_group_message_activity(sender, instance, **kwargs):
+    activity.withdraw(f'message:{instance.pk}')
+
+
+@receiver(post_delete, sender=PrivateMessage)
+def withdraw_private_message_activity(sender, instance, **kwargs):
+    activity.withdraw(f'private-message:{instance.pk}')
+
+
+@receiver(post_delete, sender=Friendship)
+def withdraw_friendship_activity(sender, instance, **kwargs):
+    activity.withdraw(f'friendship:{instance.pk}')
+
+
+@receiver(post_delete, sender=GroupJoinRequest)
+def withdraw_join_request_activity(sender, instance, **kwargs):
+    activity.withdraw(f'join-request:{instance.pk}')
+
+
+# ── Document search index ──────────────────────────────────────
+
+@receiver(post_save, sender=Document)
+def sync_document_text(sender, instance, raw=False, **kwargs):
+    """Refresh the indexed metadata, and queue text extraction when the file changed"""
+    if not raw:
+        document_index.sync(instance)
+
+
+@receiver(m2m_changed, sender=Document.tags.through)
+def sync_document_tags(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        document_index.sync_tags([instance.pk])
+    elif pk_set:
+        document_index.sync_tags(pk_set)
+
+
+@receiver(post_save, sender=Tag)
+def sync_renamed_tag(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        document_index.sync_tags(instance.document_set.values_list('pk', flat=True))
+
+
+# ── Content-addressed file storage ─────────────────────────────
+
+@receiver(pre_save, sender=Document)
+@receiver(pre_save, sender=MessageAttachment)
+def store_uploaded_file(sender, instance, raw=False, update_fields=None, **kwargs):
+    """A newly assigned upload is written as a blob (or linked to an identical one) before the row is saved"""
+    if raw:
+        return
+    if not instance.pk:
+        instance._previous_file = ''
+    elif update_fields is None or 'file' in update_fields:
+        instance._previous_file = sender.objects.filter(pk=instance.pk).values_list('file', flat=True).first()
+    if instance.file and not instance.file._committed:
+        filename = os.path.basename(instance.file.name)[:255]
+        instance.sha256 = blobs.store(instance.file)
+        # store() has counted this reference already
+        instance._stored_file = instance.file.name
+        if sender is Document or not instance.filename:
+            instance.filename = filename
+    elif blobs.is_blob(instance.file.name) and not instance.sha256:
+        instance.sha256 = blobs.sha256_of(instance.file.name)
+
+
+@receiver(post_save, sender=Document)
+@receiver(post_save, sender=MessageAttachment)
+def count_file_references(sender, instance, raw=False, **kwargs):
+    if '_previous_file' not in instance.__dict__:
+        return
+    previous = instance.__dict__.pop('_previous_file')
+    stored = instance.__dict__.pop('_stored_file', None)
+    if not raw and instance.file.name != previous:
+        if instance.file.name != stored:
+            blobs.retain(instance.file.name, instance.file.storage)
+        blobs.release(previous, instance.file.storage)
+
+
+@receiver(post_delete, sender=Document)
+@receiver(post_delete, sender=MessageAttachment)
+def release_deleted_file(sender, instance, **kwargs):
+    blobs.release(instance.file.name, instance.file.storage)
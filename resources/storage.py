@@ -0,0 +1,288 @@
+"""
+Media storage with a sharded directory layout and atomic writes.
+
+``ShardedFileSystemStorage`` is the default storage (``STORAGES``). It
+changes two things about Django's ``FileSystemStorage``:
+
+* New files are fanned out into two levels of subdirectories named after
+  a hash of the file name, below the field's ``upload_to`` directory::
+
+      profile_pictures/2026/10/me.jpg  ->  profile_pictures/2026/10/5c/0e/me.jpg
+
+  With 256 × 256 leaf directories a directory stays small however many
+  files a semester brings. Names that are already fanned out (including
+  the content-addressed ``blobs/`` names of ``resources.blobs``) are left
+  as they are.
+* A file is written to a hidden temporary file in its target directory
+  and linked into place only when complete, so readers and crashes never
+  see a partly written file. Linking fails rather than overwriting when
+  the name was taken in the meantime; the storage then picks another name,
+  as Django does.
+
+``relocate`` moves files saved under the old flat layout: documents and
+attachments into content-addressed blobs (duplicates collapse into one
+file), everything else into its sharded name. Run it through
+``python manage.py shard_media``.
+"""
+import errno
+import hashlib
+import logging
+import os
+import secrets
+from functools import partial
+
+from django.apps import apps
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.db import models, transaction
+from django.utils._os import safe_makedirs
+
+logger = logging.getLogger(__name__)
+
+# Two levels of two hex digits: 65,536 leaf directories
+SHARD_LEVELS = 2
+SHARD_WIDTH = 2
+RELOCATE_BATCH_SIZE = 500
+
+
+def shard_of(filename):
+    """The subdirectories a file called ``filename`` fans out into."""
+    digest = hashlib.sha1(filename.encode('utf-8')).hexdigest()
+    return [digest[level * SHARD_WIDTH:(level + 1) * SHARD_WIDTH] for level in range(SHARD_LEVELS)]
+
+
+def is_sharded(name):
+    """
+    Whether ``name`` already sits below its fan-out subdirectories: the
+    ones of its hashed file name, or of the file name itself when that is
+    a hash (content-addressed names).
+    """
+    parts = name.split('/')
+    if len(parts) <= SHARD_LEVELS:
+        return False
+    filename, directories = parts[-1], parts[-SHARD_LEVELS - 1:-1]
+    own = [filename[level * SHARD_WIDTH:(level + 1) * SHARD_WIDTH] for level in range(SHARD_LEVELS)]
+    return directories in (shard_of(filename), own)
+
+
+def sharded_name(name):
+    """``name`` moved below the fan-out subdirectories of its file name."""
+    if is_sharded(name):
+        return name
+    directory, filename = os.path.split(name)
+    return '/'.join([part for part in [directory] if part] + shard_of(filename) + [filename])
+
+
+class ShardedFileSystemStorage(FileSystemStorage):
+    """``FileSystemStorage`` that fans new files out into hashed subdirectories and writes them atomically."""
+
+    def generate_filename(self, filename):
+        return super().generate_filename(sharded_name(filename.replace('\\', '/')))
+
+    def _makedirs(self, directory):
+        try:
+            if self.directory_permissions_mode is not None:
+                safe_makedirs(directory, self.directory_permissions_mode, exist_ok=True)
+            else:
+                os.makedirs(directory, exist_ok=True)
+        except FileExistsError:
+            raise FileExistsError('%s exists and is not a directory.' % directory)
+
+    def _write_temporary(self, directory, content):
+        """Write ``content`` to a new hidden file in ``directory`` and return its path."""
+        temp_path = os.path.join(directory, f'.{secrets.token_hex(8)}.part')
+        if hasattr(content, 'temporary_file_path'):
+            # A rename when the upload's temporary file is on the same filesystem
+            file_move_safe(content.temporary_file_path(), temp_path)
+            return temp_path
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0), 0o666)
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                for chunk in content.chunks():
+                    file.write(chunk.encode() if isinstance(chunk, str) else chunk)
+                file.flush()
+                os.fsync(file.fileno())
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        return temp_path
+
+    def _publish(self, temp_path, full_path):
+        """Give the finished temporary file its final name; FileExistsError if that is taken."""
+        if self._allow_overwrite:
+            os.replace(temp_path, full_path)
+            return
+        try:
+            os.link(temp_path, full_path)
+        except OSError as exc:
+            if exc.errno not in (errno.EPERM, errno.ENOTSUP, errno.EXDEV):
+                raise
+            # No hard links here: rename, accepting a small race on the name
+            if os.path.exists(full_path):
+                raise FileExistsError(full_path) from exc
+            os.rename(temp_path, full_path)
+        else:
+            os.unlink(temp_path)
+
+    def _save(self, name, content):
+        full_path = self.path(name)
+        directory = os.path.dirname(full_path)
+        self._makedirs(directory)
+        temp_path = self._write_temporary(directory, content)
+        try:
+            while True:
+                try:
+                    self._publish(temp_path, full_path)
+                except FileExistsError:
+                    name = self.get_available_name(name)
+                    full_path = self.path(name)
+                    self._makedirs(os.path.dirname(full_path))
+                else:
+                    break
+        finally:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+
+        if self.file_permissions_mode is not None:
+            os.chmod(full_path, self.file_permissions_mode)
+        name = os.path.relpath(full_path, self.location)
+        self._ensure_location_group_id(full_path)
+        return str(name).replace('\\', '/')
+
+    def link(self, name, new_name):
+        """
+        Give the file ``name`` the additional name ``new_name`` (a hard link,
+        or a rename where links are unsupported). Returns False when
+        ``new_name`` already holds a different file.
+        """
+        path, new_path = self.path(name), self.path(new_name)
+        self._makedirs(os.path.dirname(new_path))
+        try:
+            os.link(path, new_path)
+        except FileExistsError:
+            return os.path.samefile(path, new_path)
+        except OSError as exc:
+            if exc.errno not in (errno.EPERM, errno.ENOTSUP, errno.EXDEV):
+                raise
+            if os.path.exists(new_path):
+                return False
+            os.rename(path, new_path)
+        return True
+
+
+# ── Moving existing files ──────────────────────────────────────
+
+def file_fields():
+    """``(model, field)`` for every concrete file field stored in a sharded storage."""
+    for model in apps.get_models():
+        for field in model._meta.concrete_fields:
+            if isinstance(field, models.FileField) and isinstance(field.storage, ShardedFileSystemStorage):
+                yield model, field
+
+
+# resources.blobs and the models are imported inside the functions below:
+# this module is loaded as the default storage, possibly before the app
+# registry is ready
+
+def _target(model, field, instance):
+    """The name ``instance``'s file should have, and the row fields to update alongside."""
+    from . import blobs, file_serving
+
+    name = getattr(instance, field.attname).name
+    if model not in blobs.MODELS:
+        return sharded_name(name), {}
+    if blobs.is_blob(name):
+        return name, {}
+    field_file = getattr(instance, field.attname)
+    try:
+        sha256 = file_serving.file_hash(field_file)
+    finally:
+        field_file.close()
+    updates = {'sha256': sha256}
+    if not instance.filename:
+        updates['filename'] = os.path.basename(name)[:255]
+    return blobs.blob_name(sha256, os.path.basename(name)), updates
+
+
+def relocate(model, field, batch_size=RELOCATE_BATCH_SIZE, dry_run=False, log=None):
+    """
+    Move the files of one model's file field to their sharded (or blob)
+    names, ``batch_size`` rows at a time: link each file under its new
+    name, rewrite the batch's paths with one bulk update, and delete the
+    old names once that has committed. An interrupted run can simply be
+    started again. Returns ``(moved, missing)``.
+    """
+    from . import blobs
+    from .models import Document, DocumentText
+
+    storage = field.storage
+    moved = missing = 0
+    queryset = model.objects.exclude(**{field.attname: ''}).exclude(**{f'{field.attname}__isnull': True})
+    last_pk = None
+    while True:
+        batch = queryset.order_by('pk')
+        if last_pk is not None:
+            batch = batch.filter(pk__gt=last_pk)
+        batch = list(batch[:batch_size])
+        if not batch:
+            break
+        last_pk = batch[-1].pk
+
+        changed, update_fields, renamed = [], {field.attname}, {}
+        for instance in batch:
+            name = getattr(instance, field.attname).name
+            if not storage.exists(name):
+                missing += 1
+                if log:
+                    log(f'Missing {model._meta.label}.{field.name} file {name} (row {instance.pk})')
+                continue
+            new_name, updates = _target(model, field, instance)
+            if new_name == name:
+                continue
+            # An existing blob holds the same bytes; any other taken name needs a free one
+            if not dry_run and not storage.link(name, new_name) and model not in blobs.MODELS:
+                new_name = storage.get_available_name(new_name)
+                storage.link(name, new_name)
+            setattr(instance, field.attname, new_name)
+            for attname, value in updates.items():
+                setattr(instance, attname, value)
+            update_fields.update(updates)
+            changed.append(instance)
+            renamed[instance.pk] = (name, new_name)
+        if not changed or dry_run:
+            moved += len(changed)
+            continue
+
+        with transaction.atomic():
+            model.objects.bulk_update(changed, sorted(update_fields), batch_size=batch_size)
+            if model is Document:
+                # Same content under a new name: keep the extracted text
+                texts = list(DocumentText.objects.filter(pk__in=renamed))
+                for text in texts:
+                    old, new = renamed[text.pk]
+                    if text.source_name == old:
+                        text.source_name = new
+                DocumentText.objects.bulk_update(texts, ['source_name'], batch_size=batch_size)
+            old_names = [old for old, _ in renamed.values()]
+            transaction.on_commit(partial(_delete_old_names, storage, old_names))
+        moved += len(changed)
+    if model in blobs.MODELS and moved and not dry_run:
+        blobs.collect(storage)
+    return moved, missing
+
+
+def _delete_old_names(storage, names):
+    for name in names:
+        try:
+            storage.delete(name)
+        except OSError:
+            logger.exception('Could not delete relocated file %s', name)
+
+
+def relocate_all(batch_size=RELOCATE_BATCH_SIZE, dry_run=False, log=None):
+    """Relocate every file field; returns ``{'app_label.Model.field': (moved, missing)}``."""
+    return {
+        f'{model._meta.label}.{field.name}': relocate(model, field, batch_size, dry_run, log)
+        for model, field in file_fields()
+    }
+
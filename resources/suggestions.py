@@ -0,0 +1,166 @@
+"""
+Offline "people you may know" suggestions.
+
+The friends page used to join the user's study groups back to their
+members on every request and show the first ten strangers it found, in no
+particular order. Suggestions are now computed in bulk by
+``python manage.py build_friend_suggestions`` and stored as ranked
+``FriendSuggestion`` rows, so the page reads them with one indexed query.
+
+With ``F`` the symmetric friendship adjacency and ``M`` the user x group
+membership matrix of a ``ranking.FeatureSnapshot``, a user's candidates are
+their row of two sparse products:
+
+* ``F @ F``: mutual friends with everyone two hops away
+* ``M @ M.T``: study groups shared with every fellow member
+
+Both products are computed for a block of users at a time: the CSR arrays
+are expanded into ``(block row, column)`` keys, which are sorted and
+counted. Candidates score ``MUTUAL_FRIEND_WEIGHT`` per mutual friend plus
+``SHARED_GROUP_WEIGHT`` per shared group. The user themselves, anyone they
+already have a friendship row with (in any state), people they rejected in
+discovery and inactive accounts are dropped, and the best
+``SUGGESTIONS_PER_USER`` of each user are kept.
+"""
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from . import ranking
+from .models import Friendship, FriendSuggestion, UserDiscoveryAction
+
+User = get_user_model()
+
+SUGGESTIONS_PER_USER = 20
+MUTUAL_FRIEND_WEIGHT = 2
+SHARED_GROUP_WEIGHT = 1
+# Sharing a course-wide group says little about who knows whom, and its
+# members would dominate everyone's candidate lists
+MAX_GROUP_SIZE = 500
+BLOCK_SIZE = 1000
+
+
+def _expand(indptr, indices, rows, owners):
+    """``_gather`` that also repeats each row's owner once per gathered index."""
+    lengths = indptr[rows + 1] - indptr[rows]
+    return ranking._gather(indptr, indices, rows), np.repeat(owners, lengths)
+
+
+def _count(keys):
+    """Distinct ``keys`` in sorted order and how often each occurs."""
+    keys = np.sort(keys)
+    starts = np.flatnonzero(np.concatenate([keys[:1] == keys[:1], keys[1:] != keys[:-1]]))
+    return keys[starts], np.diff(np.append(starts, len(keys)))
+
+
+def _product_row_block(first, second, rows, n_columns):
+    """
+    Rows ``rows`` of the sparse product ``first @ second`` (both CSR pairs)
+    as sorted ``(keys, counts)``, key = block offset * n_columns + column.
+    """
+    middle, owners = _expand(*first, rows, np.arange(len(rows), dtype=np.int64))
+    columns, owners = _expand(*second, middle, owners)
+    return _count(owners * n_columns + columns)
+
+
+def _small_groups(snapshot):
+    """The user -> groups CSR pair without groups larger than ``MAX_GROUP_SIZE``."""
+    indptr, indices = snapshot.user_groups
+    small = np.diff(snapshot.group_users[0]) <= MAX_GROUP_SIZE
+    rows = np.repeat(np.arange(len(snapshot)), np.diff(indptr))
+    keep = small[indices]
+    return ranking._compress(rows[keep], indices[keep], len(snapshot))
+
+
+def _excluded(snapshot):
+    """CSR pair of the users each user must not be suggested."""
+    low, high = ranking._pairs(
+        Friendship.objects.values_list('user_low', 'user_high'), snapshot.user_ids, snapshot.user_ids,
+    )
+    rejecters, rejected = ranking._pairs(
+        UserDiscoveryAction.objects.filter(action='reject').values_list('user_id', 'discovered_user_id'),
+        snapshot.user_ids, snapshot.user_ids,
+    )
+    return ranking._compress(
+        np.concatenate([low, high, rejecters]), np.concatenate([high, low, rejected]), len(snapshot),
+    )
+
+
+def rank_block(snapshot, rows, groups, excluded, active, top=SUGGESTIONS_PER_USER):
+    """
+    Suggestions for the users at snapshot ``rows``, as parallel arrays
+    ``(owners, columns, mutual_friends, shared_groups, scores, positions)``
+    where ``owners`` indexes ``rows`` and ``columns`` are snapshot rows,
+    best first per owner.
+    """
+    n_users = len(snapshot)
+    friend_keys, mutual = _product_row_block(snapshot.friends, snapshot.friends, rows, n_users)
+    group_keys, shared = _product_row_block(groups, snapshot.group_users, rows, n_users)
+    keys, _ = _count(np.concatenate([friend_keys, group_keys]))
+    mutual_friends = np.zeros(len(keys), dtype=np.int64)
+    mutual_friends[np.searchsorted(keys, friend_keys)] = mutual
+    shared_groups = np.zeros(len(keys), dtype=np.int64)
+    shared_groups[np.searchsorted(keys, group_keys)] = shared
+
+    block = np.arange(len(rows), dtype=np.int64)
+    columns, owners = _expand(*excluded, rows, block)
+    dropped = np.concatenate([owners * n_users + columns, block * n_users + rows])
+    owners, columns = np.divmod(keys, n_users)
+    keep = ~np.isin(keys, dropped) & active[columns]
+    owners, columns = owners[keep], columns[keep]
+    mutual_friends, shared_groups = mutual_friends[keep], shared_groups[keep]
+    scores = MUTUAL_FRIEND_WEIGHT * mutual_friends + SHARED_GROUP_WEIGHT * shared_groups
+
+    # Per owner: score, then mutual friends, then the older account. The
+    # arrays are already ordered by (owner, column), so a stable sort on one
+    # combined integer key does what a four-key lexsort would, faster.
+    mutual_span = int(mutual_friends.max(initial=0)) + 1
+    score_span = int(scores.max(initial=0)) + 1
+    order = np.argsort(
+        (owners * score_span + score_span - 1 - scores) * mutual_span + mutual_span - 1 - mutual_friends,
+        kind='stable',
+    )
+    owners = owners[order]
+    positions = np.arange(len(owners)) - np.searchsorted(owners, owners)
+    kept = positions < top
+    best = order[kept]
+    return (
+        owners[kept], columns[best], mutual_friends[best], shared_groups[best], scores[best], positions[kept],
+    )
+
+
+def build(user_ids=None, top=SUGGESTIONS_PER_USER, block_size=BLOCK_SIZE, snapshot=None):
+    """
+    Recompute and store the suggestions of ``user_ids`` (default: every
+    active user). Returns the number of suggestions written.
+    """
+    if snapshot is None:
+        snapshot = ranking.get_snapshot(refresh=True)
+    active = np.zeros(len(snapshot), dtype=bool)
+    active[snapshot.rows_for(User.objects.filter(is_active=True).values_list('id', flat=True))] = True
+    rows = np.flatnonzero(active) if user_ids is None else snapshot.rows_for(user_ids)
+    groups = _small_groups(snapshot)
+    excluded = _excluded(snapshot)
+
+    written = 0
+    for start in range(0, len(rows), block_size):
+        block_rows = rows[start:start + block_size]
+        owners, columns, mutual_friends, shared_groups, scores, positions = rank_block(
+            snapshot, block_rows, groups, excluded, active, top,
+        )
+        block_user_ids = snapshot.user_ids[block_rows]
+        suggestions = [
+            FriendSuggestion(
+                user_id=user_id, suggested_id=suggested_id, mutual_friends=mutual_count,
+                shared_groups=shared_count, score=score, position=position,
+            )
+            for user_id, suggested_id, mutual_count, shared_count, score, position in zip(
+                block_user_ids[owners].tolist(), snapshot.user_ids[columns].tolist(),
+                mutual_friends.tolist(), shared_groups.tolist(), scores.tolist(), positions.tolist(),
+            )
+        ]
+        with transaction.atomic():
+            FriendSuggestion.objects.filter(user_id__in=block_user_ids.tolist()).delete()
+            FriendSuggestion.objects.bulk_create(suggestions, batch_size=1000)
+        written += len(suggestions)
+    return written
@@ -0,0 +1,195 @@
+"""
+Discovery actions ("swipes") on people and groups.
+
+A student flicking through cards used to send one POST per card, each doing
+an ``update_or_create`` plus friend or join request writes: about three
+queries per card. ``apply`` takes an ordered list of actions and records
+them in one transaction:
+
+* the action rows are upserted with one ``INSERT ... ON CONFLICT`` per kind
+* the friend and join requests they trigger are looked up and created in bulk
+* the seen-sets and the people queue are updated once per batch
+
+The single-card views go through the same code with a one-item list.
+"""
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.signals import post_save
+
+from . import discovery, seen_sets
+from .models import (
+    Friendship, GroupDiscoveryAction, GroupJoinRequest, StudyGroup, UserDiscoveryAction,
+)
+
+User = get_user_model()
+
+USER_ACTIONS = ('accept', 'reject', 'skip')
+GROUP_ACTIONS = ('interested', 'not_interested', 'skip')
+MAX_BATCH_SIZE = 100
+
+
+def _create_with_signals(objects):
+    """
+    Bulk-insert new rows, then send the post_save signals ``bulk_create``
+    skips, so unread counters, activity feeds and dashboards stay current.
+    """
+    if not objects:
+        return
+    model = type(objects[0])
+    if not connection.features.can_return_rows_from_bulk_insert:
+        # Receivers need primary keys, which only a RETURNING insert provides
+        for obj in objects:
+            obj.save()
+        return
+    model.objects.bulk_create(objects)
+    for obj in objects:
+        post_save.send(sender=model, instance=obj, created=True, update_fields=None, raw=False, using=obj._state.db)
+
+
+def _field(item, name):
+    return item.get(name) if isinstance(item, dict) else None
+
+
+def _parse(user, actions):
+    """Split ``actions`` into validated ``(index, kind, target_id, action, message)`` tuples and errors."""
+    valid, errors = [], {}
+    for index, item in enumerate(actions):
+        if not isinstance(item, dict):
+            errors[index] = 'Invalid action'
+            continue
+        kind, action = item.get('type'), item.get('action')
+        if action not in {'user': USER_ACTIONS, 'group': GROUP_ACTIONS}.get(kind, ()):
+            errors[index] = 'Invalid action'
+            continue
+        try:
+            target_id = int(item.get('id'))
+        except (TypeError, ValueError):
+            errors[index] = 'Invalid id'
+            continue
+        if kind == 'user' and target_id == user.pk:
+            errors[index] = 'Cannot action yourself'
+            continue
+        valid.append((index, kind, target_id, action, str(item.get('message') or '')))
+    return valid, errors
+
+
+def apply(user, actions):
+    """
+    Apply ``actions`` in order and return one result dict per action.
+
+    Each action is a dict with ``type`` ('user' or 'group'), ``id`` and
+    ``action``; group interest may carry a join request ``message``. The
+    outcome matches sending the actions one by one: every accept or
+    interest takes effect, and the last action on a card is the one
+    recorded.
+    """
+    valid, errors = _parse(user, actions)
+    users = User.objects.in_bulk({target_id for _, kind, target_id, _, _ in valid if kind == 'user'})
+    groups = StudyGroup.objects.in_bulk({target_id for _, kind, target_id, _, _ in valid if kind == 'group'})
+    targets = {'user': users, 'group': groups}
+
+    results = {
+        index: {'success': False, 'error': error, 'type': _field(actions[index], 'type'),
+                'id': _field(actions[index], 'id')}
+        for index, error in errors.items()
+    }
+    applied = []
+    for index, kind, target_id, action, message in valid:
+        target = targets[kind].get(target_id)
+        if target is None:
+            results[index] = {'success': False, 'error': f'{kind.capitalize()} not found',
+                              'type': kind, 'id': target_id}
+        else:
+            applied.append((index, kind, target, action, message))
+
+    with transaction.atomic():
+        results.update(_apply_user_actions(user, [a for a in applied if a[1] == 'user']))
+        results.update(_apply_group_actions(user, [a for a in applied if a[1] == 'group']))
+    return [results[index] for index in range(len(actions))]
+
+
+def _apply_user_actions(user, applied):
+    if not applied:
+        return {}
+    latest = {target.pk: action for _, _, target, action, _ in applied}
+    UserDiscoveryAction.objects.bulk_create(
+        [UserDiscoveryAction(user=user, discovered_user_id=target_id, action=action)
+         for target_id, action in latest.items()],
+        update_conflicts=True, unique_fields=['user', 'discovered_user'], update_fields=['action'],
+    )
+
+    accepted_ids = {target.pk for _, _, target, action, _ in applied if action == 'accept'}
+    existing = {}
+    if accepted_ids:
+        # One row per pair, found through the canonical pair columns
+        for friendship in Friendship.objects.filter(
+            Q(user_low=user.pk, user_high__in=accepted_ids) | Q(user_high=user.pk, user_low__in=accepted_ids)
+        ):
+            other_id = friendship.user_high if friendship.user_low == user.pk else friendship.user_low
+            existing[other_id] = friendship
+
+    results, new_requests = {}, []
+    for index, _, target, action, _ in applied:
+        result = {'success': True, 'type': 'user', 'id': target.pk, 'action': action}
+        if action != 'accept':
+            result['message'] = 'User skipped' if action == 'skip' else 'User rejected'
+        else:
+            friendship = existing.get(target.pk)
+            if friendship is not None and friendship.from_user_id == target.pk and friendship.status == 'pending':
+                # They already asked: accepting makes you friends
+                friendship.status = 'accepted'
+                friendship.save()
+                result['message'] = f"You're now friends with {target.username}! 🎉"
+                result['friend_matched'] = True
+            elif friendship is not None and friendship.status == 'accepted':
+                # Already friends, e.g. matched earlier in the same batch
+                result['message'] = f"You're already friends with {target.username}"
+                result['friend_matched'] = False
+            else:
+                if friendship is None:
+                    existing[target.pk] = Friendship(from_user=user, to_user=target, status='pending')
+                    new_requests.append(existing[target.pk])
+                elif friendship.status == 'declined':
+                    # Reopen the pair as a request in this direction
+                    friendship.from_user, friendship.to_user, friendship.status = user, target, 'pending'
+                    friendship.save()
+                result['message'] = f"Friend request sent to {target.username}"
+                result['friend_matched'] = False
+        results[index] = result
+    _create_with_signals(new_requests)
+
+    seen_sets.add(user.pk, 'user', latest)
+    discovery.remove(user, latest)
+    return results
+
+
+def _apply_group_actions(user, applied):
+    if not applied:
+        return {}
+    latest = {target.pk: action for _, _, target, action, _ in applied}
+    GroupDiscoveryAction.objects.bulk_create(
+        [GroupDiscoveryAction(user=user, group_id=group_id, action=action)
+         for group_id, action in latest.items()],
+        update_conflicts=True, unique_fields=['user', 'group'], update_fields=['action'],
+    )
+
+    requested = set(GroupJoinRequest.objects.filter(
+        user=user, group_id__in=[target.pk for _, _, target, action, _ in applied if action == 'interested'],
+    ).values_list('group_id', flat=True))
+
+    results, new_requests = {}, []
+    for index, _, group, action, message in applied:
+        result = {'success': True, 'type': 'group', 'id': group.pk, 'action': action}
+        if action == 'interested':
+            if group.pk not in requested:
+                requested.add(group.pk)
+                new_requests.append(GroupJoinRequest(user=user, group=group, message=message, status='pending'))
+            result['message'] = f"Join request sent to {group.name}. Admins will review it."
+        else:
+            result['message'] = 'Group skipped' if action == 'skip' else 'Marked as not interested'
+        results[index] = result
+    _create_with_signals(new_requests)
+
+    seen_sets.add(user.pk, 'group', latest)
+    return results
@@ -1,3 +1,1574 @@
-from django.test import TestCase
+import hashlib
+import io
+import json
+import os
+import random
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Q
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+from pypdf import PdfWriter
+
+from . import (
+    activity, blobs, counters, dashboard, discovery, document_index, file_serving, friends, group_stats, membership,
+    notifications, previews, ranking, read_state, realtime, search, seen_sets, storage, suggestions, swipes, views,
+)
+from .models import (
+    ActivityEvent, Blob, DiscoveryCandidate, DiscoveryQueue, Document, DocumentText, FriendSuggestion, Friendship,
+    GroupDiscoveryAction, GroupJoinRequest, GroupNotification, GroupStats, Membership, Message, MessageAttachment,
+    Notification, OutboxEvent, PrivateChat, PrivateMessage, StudyGroup, UnreadCounter, UserDiscoveryAction,
+)
+
+User = get_user_model()
+
+MEDIA_ROOT = tempfile.mkdtemp(prefix='resources-tests-')
+
+
+def _payload(size):
+    """Deterministic, non-repeating bytes, so a misplaced range cannot match by accident."""
+    return b''.join(hashlib.sha256(str(i).encode()).digest() for i in range(size // 32 + 1))[:size]
+
+
+def _body(response):
+    if response.streaming:
+        return b''.join(response.streaming_content)
+    return response.content
+
+
+def _parse_multipart(response, body):
+    """``[(content_range, bytes)]`` of a multipart/byteranges response body."""
+    boundary = response['Content-Type'].split('boundary=')[1].encode()
+    parts = []
+    for chunk in body.split(b'\r\n--' + boundary)[1:]:
+        if chunk.startswith(b'--'):
+            break
+        head, data = chunk[2:].split(b'\r\n\r\n', 1)
+        headers = dict(line.split(b': ', 1) for line in head.split(b'\r\n'))
+        parts.append((headers[b'Content-Range'].decode(), data))
+    return parts
+
+
+@override_settings(
+    MEDIA_ROOT=MEDIA_ROOT, FILE_SERVING_BACKEND='django', DOCUMENT_INDEX_AUTORUN=False,
+    THUMBNAIL_AUTORUN=False, PUSHER_OUTBOX_AUTODISPATCH=False,
+)
+class MediaTestCase(TestCase):
+    """Uploads go to a temporary MEDIA_ROOT, emptied after each test."""
+
+    def setUp(self):
+        self.addCleanup(shutil.rmtree, MEDIA_ROOT, ignore_errors=True)
+
+
+class DocumentDownloadTests(MediaTestCase):
+    """Range and conditional requests against serve_document."""
+
+    SIZE = 300 * 1024 + 7
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='reader', password='pass')
+        self.client.force_login(self.user)
+        self.data = _payload(self.SIZE)
+        self.document = Document.objects.create(
+            title='Networks notes', course='CS', uploaded_by=self.user,
+            file=SimpleUploadedFile('notes.pdf', self.data, content_type='application/pdf'),
+        )
+        self.url = reverse('serve_document', args=[self.document.id])
+        self.etag = f'"{hashlib.sha256(self.data).hexdigest()}"'
+
+    def test_full_download_advertises_ranges_and_content_etag(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['ETag'], self.etag)
+        self.assertEqual(response['Content-Length'], str(self.SIZE))
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertEqual(_body(response), self.data)
+
+    def test_interrupted_download_resumes_from_last_byte(self):
+        first = self.client.get(self.url)
+        received = b''
+        for chunk in first.streaming_content:
+            received += chunk
+            if len(received) >= 100_000:
+                break
+        # The connection drops mid-transfer
+        first.close()
+
+        resumed = self.client.get(
+            self.url, HTTP_RANGE=f'bytes={len(received)}-', HTTP_IF_RANGE=first['ETag'],
+        )
+        self.assertEqual(resumed.status_code, 206)
+        self.assertEqual(resumed['Content-Range'], f'bytes {len(received)}-{self.SIZE - 1}/{self.SIZE}')
+        self.assertEqual(resumed['Content-Length'], str(self.SIZE - len(received)))
+        self.assertEqual(received + _body(resumed), self.data)
+
+    def test_resume_after_file_changed_restarts_from_zero(self):
+        stale_etag = self.client.get(self.url)['ETag']
+        new_data = _payload(self.SIZE)[::-1]
+        self.document.file = SimpleUploadedFile('notes.pdf', new_data)
+        self.document.save()
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=1000-', HTTP_IF_RANGE=stale_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(_body(response), new_data)
+        self.assertNotEqual(response['ETag'], stale_etag)
+
+    def test_resume_with_last_modified_validator(self):
+        last_modified = self.client.get(self.url)['Last-Modified']
+        response = self.client.get(self.url, HTTP_RANGE='bytes=10-19', HTTP_IF_RANGE=last_modified)
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(_body(response), self.data[10:20])
+
+    def test_suffix_and_open_ended_ranges(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-500')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(_body(response), self.data[-500:])
+
+        response = self.client.get(self.url, HTTP_RANGE=f'bytes={self.SIZE - 3}-{self.SIZE + 100}')
+        self.assertEqual(_body(response), self.data[-3:])
+
+    def test_multiple_ranges(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-99, 5000-5099, -10')
+        self.assertEqual(response.status_code, 206)
+        self.assertTrue(response['Content-Type'].startswith('multipart/byteranges; boundary='))
+        body = _body(response)
+        self.assertEqual(int(response['Content-Length']), len(body))
+        self.assertEqual(_parse_multipart(response, body), [
+            (f'bytes 0-99/{self.SIZE}', self.data[:100]),
+            (f'bytes 5000-5099/{self.SIZE}', self.data[5000:5100]),
+            (f'bytes {self.SIZE - 10}-{self.SIZE - 1}/{self.SIZE}', self.data[-10:]),
+        ])
+
+    def test_overlapping_ranges_are_merged(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=100-199,150-299,300-310')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 100-310/{self.SIZE}')
+        self.assertEqual(_body(response), self.data[100:311])
+
+    def test_unsatisfiable_range(self):
+        response = self.client.get(self.url, HTTP_RANGE=f'bytes={self.SIZE}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{self.SIZE}')
+
+    def test_malformed_range_serves_whole_file(self):
+        for header in ('bytes=abc', 'items=0-10', 'bytes=20-10'):
+            response = self.client.get(self.url, HTTP_RANGE=header)
+            self.assertEqual(response.status_code, 200, header)
+            self.assertEqual(_body(response), self.data)
+
+    def test_if_none_match_returns_not_modified(self):
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=self.etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], self.etag)
+        self.assertEqual(response.content, b'')
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH='"something-else"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_identical_reupload_keeps_etag(self):
+        self.document.file = SimpleUploadedFile('notes-again.pdf', self.data)
+        self.document.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=self.etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_if_modified_since_returns_not_modified(self):
+        last_modified = self.client.get(self.url)['Last-Modified']
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+    def test_hash_is_backfilled_on_first_download(self):
+        Document.objects.filter(pk=self.document.pk).update(sha256='')
+        response = self.client.get(self.url)
+        self.assertEqual(response['ETag'], self.etag)
+        self.document.refresh_from_db()
+        self.assertEqual(self.document.sha256, self.etag.strip('"'))
+
+    def test_missing_file_redirects(self):
+        os.remove(self.document.file.path)
+        response = self.client.get(self.url)
+        self.assertRedirects(response, reverse('view_documents'), fetch_redirect_response=False)
+
+    def test_active_content_is_downloaded_not_rendered(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(response['Content-Disposition'].startswith('inline'))
+
+        for name in ('evil.html', 'evil.svg', 'evil.xhtml'):
+            document = Document.objects.create(
+                title=name, course='CS', uploaded_by=self.user,
+                file=SimpleUploadedFile(name, b'<script>alert(document.cookie)</script>'),
+            )
+            response = self.client.get(reverse('serve_document', args=[document.id]))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['Content-Type'], 'application/octet-stream', name)
+            self.assertTrue(response['Content-Disposition'].startswith('attachment'), name)
+            self.assertEqual(response['Content-Security-Policy'], 'sandbox')
+
+
+class AttachmentDownloadTests(MediaTestCase):
+    """Access checks and range support of serve_attachment."""
+
+    def setUp(self):
+        super().setUp()
+        self.alice = User.objects.create_user(username='alice', password='pass')
+        self.bob = User.objects.create_user(username='bob', password='pass')
+        self.eve = User.objects.create_user(username='eve', password='pass')
+        self.data = _payload(50_000)
+
+    def _attachment(self, **links):
+        return MessageAttachment.objects.create(
+            file=SimpleUploadedFile('slides.png', self.data), filename='Lecture 3 slides.png',
+            file_size=len(self.data), file_type='image/png', uploaded_by=self.alice, **links,
+        )
+
+    def test_private_attachment_is_limited_to_participants(self):
+        chat = PrivateChat.objects.create(participant1=self.alice, participant2=self.bob)
+        message = PrivateMessage.objects.create(chat=chat, sender=self.alice, content='slides')
+        url = reverse('serve_attachment', args=[self._attachment(private_message=message).id])
+
+        self.client.force_login(self.bob)
+        response = self.client.get(url, HTTP_RANGE='bytes=40000-')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(_body(response), self.data[40000:])
+        self.assertIn('Lecture 3 slides.png', response['Content-Disposition'])
+
+        self.client.force_login(self.eve)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+    def test_group_attachment_is_limited_to_members(self):
+        group = StudyGroup.objects.create(name='Networks', creator=self.alice)
+        group.members.add(self.alice)
+        message = Message.objects.create(group=group, user=self.alice, content='slides')
+        attachment = self._attachment(group_message=message)
+        url = reverse('serve_attachment', args=[attachment.id])
+
+        self.client.force_login(self.alice)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=f'"{attachment.sha256}"')
+        self.assertEqual(response.status_code, 304)
+
+        self.client.force_login(self.eve)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+    def test_unsent_attachment_is_limited_to_uploader(self):
+        url = reverse('serve_attachment', args=[self._attachment().id])
+        self.client.force_login(self.alice)
+        self.assertEqual(_body(self.client.get(url)), self.data)
+        self.client.force_login(self.bob)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+
+@override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=64 * 1024)
+class BlobStorageTests(MediaTestCase):
+    """Content-addressed storage of uploads, deduplication and blob collection."""
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='uploader', password='pass')
+        self.client.force_login(self.user)
+
+    def _upload(self, name, data):
+        response = self.client.post(reverse('upload_document'), {
+            'title': name, 'course': 'CS', 'file': SimpleUploadedFile(name, data),
+        })
+        self.assertRedirects(response, reverse('view_documents'), fetch_redirect_response=False)
+        return Document.objects.latest('pk')
+
+    def _blob_files(self):
+        return list(blobs._stored_names(default_storage))
+
+    def test_duplicate_uploads_share_one_blob(self):
+        # Small (in memory) and large (temporary file) uploads are both hashed on receipt
+        for data in (_payload(1000), _payload(200_000)):
+            sha256 = hashlib.sha256(data).hexdigest()
+            with mock.patch.object(file_serving, 'file_hash', side_effect=AssertionError('upload read twice')):
+                documents = [
+                    self._upload('COMPUTER_NETWORKS_NOTES_L3.PDF', data),
+                    self._upload('notes (1).pdf', data),
+                ]
+            name = f'blobs/{sha256[:2]}/{sha256[2:4]}/{sha256}.pdf'
+            self.assertEqual({document.file.name for document in documents}, {name})
+            self.assertEqual([document.sha256 for document in documents], [sha256, sha256])
+            self.assertEqual(Blob.objects.get(name=name).refcount, 2)
+            with default_storage.open(name) as file:
+                self.assertEqual(file.read(), data)
+
+            response = self.client.get(reverse('serve_document', args=[documents[1].pk]))
+            self.assertIn('notes (1).pdf', response['Content-Disposition'])
+            self.assertEqual(_body(response), data)
+        self.assertEqual(len(self._blob_files()), 2)
+
+    def test_last_reference_deletes_blob(self):
+        first = self._upload('a.pdf', b'lecture notes')
+        second = self._upload('b.pdf', b'lecture notes')
+        name = first.file.name
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertEqual(Blob.objects.get(name=name).refcount, 1)
+        self.assertTrue(default_storage.exists(name))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(Blob.objects.filter(name=name).exists())
+        self.assertFalse(default_storage.exists(name))
+
+    def test_upload_racing_last_release_keeps_the_file(self):
+        document = self._upload('a.pdf', b'lecture notes')
+        name = document.file.name
+        with self.captureOnCommitCallbacks() as callbacks:
+            document.delete()
+        # Same content uploaded before the deleting transaction's cleanup runs
+        upload = Document(title='again', course='CS', uploaded_by=self.user,
+                          file=SimpleUploadedFile('b.pdf', b'lecture notes'))
+        blobs.store(upload.file)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(upload.file.name, name)
+        self.assertTrue(default_storage.exists(name))
+        self.assertEqual(Blob.objects.get(name=name).refcount, 1)
+
+    def test_replacing_file_releases_previous_blob(self):
+        document = self._upload('a.pdf', b'first draft')
+        old_name = document.file.name
+        with self.captureOnCommitCallbacks(execute=True):
+            document.file = SimpleUploadedFile('a-v2.pdf', b'second draft')
+            document.save()
+        self.assertEqual(document.filename, 'a-v2.pdf')
+        self.assertFalse(default_storage.exists(old_name))
+        self.assertEqual(Blob.objects.get(name=document.file.name).refcount, 1)
+
+    def test_collect_repairs_counts_and_removes_orphans(self):
+        document = self._upload('a.pdf', b'kept')
+        orphan = MessageAttachment.objects.create(
+            file=SimpleUploadedFile('b.pdf', b'orphaned'), filename='b.pdf', file_size=8, file_type='application/pdf',
+        )
+        # Deletes through raw queries bypass the signals
+        MessageAttachment.objects.filter(pk=orphan.pk)._raw_delete(MessageAttachment.objects.db)
+        Blob.objects.filter(name=document.file.name).update(refcount=7)
+
+        call_command('collect_blobs', stdout=open(os.devnull, 'w'))
+        self.assertEqual(Blob.objects.get(name=document.file.name).refcount, 1)
+        self.assertFalse(Blob.objects.filter(name=orphan.file.name).exists())
+        # Too recent to be sure no save is still in progress
+        self.assertTrue(default_storage.exists(orphan.file.name))
+
+        with mock.patch.object(blobs, 'ORPHAN_MIN_AGE', timedelta(seconds=-1)):
+            blobs.collect(default_storage)
+        self.assertEqual(self._blob_files(), [document.file.name])
+
+
+class ShardedStorageTests(MediaTestCase):
+    """Fan-out names, atomic writes and relocation of files saved under the flat layout."""
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='owner', password='pass')
+
+    def _legacy_file(self, name, data):
+        """A file saved before the sharded layout, at exactly ``name``."""
+        path = os.path.join(MEDIA_ROOT, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as file:
+            file.write(data)
+        return name
+
+    def test_new_files_fan_out(self):
+        profile = self.user.profile
+        profile.profile_picture.save('me.jpg', ContentFile(b'jpeg bytes'))
+        name = profile.profile_picture.name
+        shard = '/'.join(storage.shard_of('me.jpg'))
+        self.assertRegex(name, rf'^profile_pictures/\d{{4}}/\d{{2}}/{shard}/me\.jpg$')
+        self.assertTrue(storage.is_sharded(name))
+        self.assertEqual(storage.sharded_name(name), name)
+        # Content-addressed names are already fanned out by their hash
+        self.assertTrue(storage.is_sharded(blobs.blob_name('ab' * 32, 'x.pdf')))
+
+    def test_taken_name_gets_a_new_one(self):
+        first = default_storage.save('notes/a.txt', ContentFile(b'one'))
+        second = default_storage.save('notes/a.txt', ContentFile(b'two'))
+        self.assertNotEqual(first, second)
+        with default_storage.open(first) as file:
+            self.assertEqual(file.read(), b'one')
+
+    def test_failed_write_leaves_nothing_behind(self):
+        class Broken(ContentFile):
+            def chunks(self, chunk_size=None):
+                yield b'partial'
+                raise OSError('connection reset')
+
+        with self.assertRaises(OSError):
+            default_storage.save('notes/broken.txt', Broken(b''))
+        self.assertFalse(default_storage.exists('notes/broken.txt'))
+        self.assertEqual(os.listdir(os.path.join(MEDIA_ROOT, 'notes')), [])
+
+    def test_relocate_moves_flat_files_and_deduplicates_documents(self):
+        data = _payload(5000)
+        names = [
+            self._legacy_file('documents/COMPUTER_NETWORKS_NOTES_L3.PDF', data),
+            self._legacy_file('documents/COMPUTER_NETWORKS_NOTES_L3_858tXeC.PDF', data),
+            self._legacy_file('documents/Task_Distribution.pdf', b'tasks'),
+        ]
+        documents = [
+            Document.objects.create(title=name, course='CS', uploaded_by=self.user, file=name) for name in names
+        ]
+        DocumentText.objects.filter(pk=documents[0].pk).update(source_name=names[0], status='indexed')
+        profile = self.user.profile
+        profile.profile_picture = self._legacy_file('profile_pictures/2026/10/me.jpg', b'jpeg')
+        profile.save()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            results = storage.relocate_all(batch_size=2)
+        self.assertEqual(results['resources.Document.file'], (3, 0))
+        self.assertEqual(results['users.UserProfile.profile_picture'], (1, 0))
+
+        for document in documents:
+            document.refresh_from_db()
+        self.assertEqual(documents[0].file.name, documents[1].file.name)
+        self.assertEqual(documents[0].file.name, blobs.blob_name(hashlib.sha256(data).hexdigest(), 'x.pdf'))
+        self.assertEqual(documents[1].filename, 'COMPUTER_NETWORKS_NOTES_L3_858tXeC.PDF')
+        self.assertEqual(Blob.objects.get(name=documents[0].file.name).refcount, 2)
+        self.assertEqual(DocumentText.objects.get(pk=documents[0].pk).source_name, documents[0].file.name)
+        for name in names:
+            self.assertFalse(default_storage.exists(name))
+        with documents[1].file.open('rb') as file:
+            self.assertEqual(file.read(), data)
+
+        profile.refresh_from_db()
+        self.assertEqual(profile.profile_picture.name, storage.sharded_name('profile_pictures/2026/10/me.jpg'))
+        self.assertTrue(default_storage.exists(profile.profile_picture.name))
+
+        # A second run finds nothing left to move
+        self.assertEqual(set(storage.relocate_all().values()), {(0, 0)})
+
+    def test_relocate_reports_missing_files(self):
+        document = Document.objects.create(title='gone', course='CS', uploaded_by=self.user, file='documents/gone.pdf')
+        messages = []
+        self.assertEqual(storage.relocate(Document, Document._meta.get_field('file'), log=messages.append), (0, 1))
+        self.assertIn('documents/gone.pdf', messages[0])
+        document.refresh_from_db()
+        self.assertEqual(document.file.name, 'documents/gone.pdf')
+
+
+def _image(size, format='PNG'):
+    output = io.BytesIO()
+    Image.new('RGB', size, (30, 120, 200)).save(output, format)
+    return output.getvalue()
+
+
+class ThumbnailTests(MediaTestCase):
+    """Background rendering of blob thumbnails and the thumbnail endpoints."""
+
+    def setUp(self):
+        super().setUp()
+        self.alice = User.objects.create_user(username='alice', password='pass')
+        self.eve = User.objects.create_user(username='eve', password='pass')
+        self.group = StudyGroup.objects.create(name='Networks', creator=self.alice)
+        self.group.members.add(self.alice)
+        self.client.force_login(self.alice)
+
+    def _document(self, name, data, **fields):
+        return Document.objects.create(
+            title=name, course='CS', uploaded_by=self.alice, file=SimpleUploadedFile(name, data), **fields,
+        )
+
+    def _blob(self, instance):
+        return Blob.objects.get(name=instance.file.name)
+
+    def test_group_attachment_thumbnail(self):
+        message = Message.objects.create(group=self.group, user=self.alice, content='whiteboard')
+        attachment = MessageAttachment.objects.create(
+            file=SimpleUploadedFile('board.jpg', _image((1600, 900), 'JPEG')), filename='board.jpg',
+            file_size=0, file_type='image/jpeg', uploaded_by=self.alice, group_message=message,
+        )
+        self.assertEqual(self._blob(attachment).thumbnail_status, 'pending')
+        self.assertEqual(previews.render_pending(), 1)
+
+        blob = self._blob(attachment)
+        self.assertEqual(blob.thumbnail_status, 'ready')
+        with default_storage.open(blob.thumbnail.name) as file, Image.open(file) as thumbnail:
+            self.assertEqual((thumbnail.format, thumbnail.size), ('JPEG', (320, 180)))
+
+        history = self.client.get(reverse('group_chat_history', args=[self.group.id])).json()
+        url = history['messages'][0]['attachments'][0]['thumbnail_url']
+        self.assertIn(f'?v={previews.version_of(blob.thumbnail.name)}', url)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertIn('immutable', response['Cache-Control'])
+        # Without the current version the response must be revalidated
+        response = self.client.get(reverse('attachment_thumbnail', args=[attachment.id]))
+        self.assertNotIn('immutable', response['Cache-Control'])
+
+        self.client.force_login(self.eve)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+    def test_document_cards_show_thumbnails(self):
+        scan = io.BytesIO()
+        Image.new('L', (1240, 1754), 255).save(scan, 'PDF')
+        blank = io.BytesIO()
+        writer = PdfWriter()
+        writer.add_blank_page(width=612, height=792)
+        writer.write(blank)
+        scanned = self._document('scan.pdf', scan.getvalue())
+        typed = self._document('typed.pdf', blank.getvalue())
+        other = self._document('notes.docx', b'PK not really a docx')
+        previews.render_pending()
+
+        # The picture on a scanned page, and a page-shaped card otherwise
+        for document, size in ((scanned, (226, 320)), (typed, (247, 320))):
+            with default_storage.open(self._blob(document).thumbnail.name) as file, Image.open(file) as thumbnail:
+                self.assertEqual(thumbnail.size, size)
+        self.assertEqual(self._blob(other).thumbnail_status, 'none')
+
+        response = self.client.get(reverse('view_documents'))
+        self.assertContains(response, reverse('document_thumbnail', args=[scanned.id]))
+        self.assertNotContains(response, reverse('document_thumbnail', args=[other.id]))
+        self.assertEqual(self.client.get(reverse('document_thumbnail', args=[other.id])).status_code, 404)
+
+        private = self._document('group.png', _image((64, 64)), group=self.group)
+        previews.render_pending()
+        self.client.force_login(self.eve)
+        self.assertEqual(self.client.get(reverse('document_thumbnail', args=[private.id])).status_code, 403)
+
+    def test_broken_file_is_marked_failed(self):
+        document = self._document('broken.png', b'not a png')
+        with self.assertLogs('resources.previews', 'ERROR'):
+            self.assertEqual(previews.render_pending(), 1)
+        self.assertEqual(self._blob(document).thumbnail_status, 'failed')
+        self.assertEqual(previews.render_pending(), 0)
+
+    def test_thumbnail_is_deleted_with_its_blob(self):
+        document = self._document('photo.png', _image((400, 400)))
+        previews.render_pending()
+        thumbnail = self._blob(document).thumbnail.name
+        self.assertTrue(default_storage.exists(thumbnail))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            document.delete()
+        self.assertFalse(default_storage.exists(thumbnail))
+        self.assertEqual(list(blobs._stored_names(default_storage)), [])
+
+
+class ParseRangeTests(TestCase):
+
+    def test_ranges(self):
+        self.assertEqual(file_serving.parse_range('bytes=0-0', 10), [(0, 0)])
+        self.assertEqual(file_serving.parse_range('bytes=-20', 10), [(0, 9)])
+        self.assertEqual(file_serving.parse_range('bytes=8-, 0-1', 10), [(0, 1), (8, 9)])
+        self.assertEqual(file_serving.parse_range('bytes=0-4,5-9', 10), [(0, 9)])
+        self.assertEqual(file_serving.parse_range('bytes=10-', 10), [])
+        self.assertEqual(file_serving.parse_range('bytes=-0', 10), [])
+        self.assertIsNone(file_serving.parse_range('', 10))
+        self.assertIsNone(file_serving.parse_range('bytes=1-2-3', 10))
+        self.assertIsNone(file_serving.parse_range('bytes=', 10))
+
+    def test_empty_file_has_no_satisfiable_range(self):
+        self.assertEqual(file_serving.parse_range('bytes=-5', 0), [])
+        self.assertEqual(file_serving.parse_range('bytes=0-', 0), [])
+        self.assertEqual(file_serving.parse_range('bytes=0-0, -1', 0), [])
+
+    def test_too_many_ranges_serve_whole_file(self):
+        header = 'bytes=' + ','.join(f'{i * 10}-{i * 10 + 1}' for i in range(file_serving.MAX_RANGES + 1))
+        self.assertIsNone(file_serving.parse_range(header, 10_000))
+
+
+class MessageSearchTests(TestCase):
+    """Full-text search over group and private messages."""
+
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', password='pass')
+        self.bob = User.objects.create_user(username='bob', password='pass')
+        self.eve = User.objects.create_user(username='eve', password='pass')
+        self.group = StudyGroup.objects.create(name='Networks', creator=self.alice)
+        self.group.members.add(self.alice)
+        self.chat = PrivateChat.objects.create(participant1=self.alice, participant2=self.bob)
+        self.group_message = Message.objects.create(group=self.group, user=self.alice, content='Subnetting quiz on Friday')
+        self.private_message = PrivateMessage.objects.create(chat=self.chat, sender=self.bob, content='Did you study subnetting?')
+        self.client.force_login(self.alice)
+        self.url = reverse('search_messages')
+
+    def _ids(self, **params):
+        response = self.client.get(self.url, {'q': 'subnet', **params})
+        self.assertEqual(response.status_code, 200)
+        return {(result['type'], result['message_id']) for result in response.json()['results']}
+
+    def test_narrowing_to_a_group_and_a_chat(self):
+        both = {('group', self.group_message.id), ('private', self.private_message.id)}
+        self.assertEqual(self._ids(), both)
+        self.assertEqual(self._ids(group=self.group.id), {('group', self.group_message.id)})
+        self.assertEqual(self._ids(chat=self.chat.id), {('private', self.private_message.id)})
+        self.assertEqual(self._ids(group=self.group.id, chat=self.chat.id), both)
+
+        other = PrivateChat.objects.create(participant1=self.bob, participant2=self.eve)
+        response = self.client.get(self.url, {'q': 'subnet', 'group': self.group.id, 'chat': other.id})
+        self.assertEqual(response.status_code, 403)
+        response = self.client.get(self.url, {'q': 'subnet', 'chat': 'x'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_index_follows_edits_and_deletes(self):
+        self.group_message.content = 'Routing quiz moved to Monday'
+        self.group_message.save()
+        self.assertEqual(self._ids(), {('private', self.private_message.id)})
+        self.assertEqual(self._ids(q='routing'), {('group', self.group_message.id)})
+
+        # Triggers also cover writes that bypass the ORM's save()
+        PrivateMessage.objects.filter(pk=self.private_message.pk).update(content='Routing tables')
+        self.assertEqual(self._ids(q='routing'), {('group', self.group_message.id), ('private', self.private_message.id)})
+        Message.objects.filter(pk=self.group_message.pk).delete()
+        self.assertEqual(self._ids(q='routing'), {('private', self.private_message.id)})
+
+    def test_pages_cover_every_result_once(self):
+        for i in range(7):
+            Message.objects.create(group=self.group, user=self.alice, content=f'subnet mask exercise {i}')
+            PrivateMessage.objects.create(chat=self.chat, sender=self.alice, content=f'subnet {i}')
+        seen, cursor = [], None
+        while True:
+            params = {'q': 'subnet', 'limit': 3, **({'cursor': cursor} if cursor else {})}
+            data = self.client.get(self.url, params).json()
+            seen += [(result['type'], result['message_id']) for result in data['results']]
+            cursor = data['next_cursor']
+            if not cursor:
+                break
+        self.assertEqual(len(seen), 16)
+        self.assertEqual(len(set(seen)), 16)
+
+    def test_query_syntax_is_not_interpreted(self):
+        self.assertEqual(search.match_expression('quiz OR NEAR(x'), '"quiz" AND "or" AND "near" AND "x"*')
+        self.assertEqual(search.match_expression('group_id: 1 "'), '"group_id" AND "1"*')
+        self.assertIsNone(search.match_expression('"*" - ^'))
+        # Another group's id typed as a column filter finds nothing extra
+        other = StudyGroup.objects.create(name='Secret', creator=self.eve)
+        Message.objects.create(group=other, user=self.eve, content='subnet answers')
+        self.assertEqual(self._ids(q=f'group_id:{other.id} subnet'), set())
+        self.assertEqual(self._ids(q='subnet"'), self._ids())
+
+
+class DiscoveryQueueTests(TestCase):
+    """People discovery from the precomputed queue, and filtered searches past it."""
+
+    def setUp(self):
+        self.viewer = User.objects.create_user(username='viewer', password='pass', course='CS', year='100')
+        self.classmates = [
+            User.objects.create_user(username=f'classmate{i}', password='pass', course='CS', year='100')
+            for i in range(3)
+        ]
+        self.stranger = User.objects.create_user(
+            username='zed', first_name='Zed', password='pass', course='ENG', year='400',
+        )
+        ranking.get_snapshot(refresh=True)
+
+    def test_filters_search_every_user_not_just_the_queue(self):
+        discovery.build_queue(self.viewer, size=2)
+        queued = set(DiscoveryCandidate.objects.filter(user=self.viewer).values_list('candidate_id', flat=True))
+        self.assertNotIn(self.stranger.id, queued)
+
+        users, next_cursor = discovery.next_candidates(self.viewer, search='zed')
+        self.assertEqual(users, [self.stranger])
+        self.assertIsNone(next_cursor)
+        users, _ = discovery.next_candidates(self.viewer, course='ENG')
+        self.assertEqual(users, [self.stranger])
+
+        # Filtered pages are offsets into the ranking
+        first, cursor = discovery.next_candidates(self.viewer, limit=2, course='CS')
+        rest, last_cursor = discovery.next_candidates(self.viewer, after=cursor, limit=2, course='CS')
+        self.assertEqual(set(first + rest), set(self.classmates))
+        self.assertIsNone(last_cursor)
+        self.assertTrue(all(user.match_score >= 70 for user in first + rest))
+
+    def test_exhausted_queue_is_rebuilt(self):
+        discovery.build_queue(self.viewer, size=2)
+        DiscoveryCandidate.objects.filter(user=self.viewer).delete()
+
+        # Just built: an empty queue stays empty for a while
+        self.assertEqual(discovery.next_candidates(self.viewer), ([], None))
+        DiscoveryQueue.objects.filter(user=self.viewer).update(
+            built_at=DiscoveryQueue.objects.get(user=self.viewer).built_at - discovery.EMPTY_QUEUE_REBUILD_AFTER,
+        )
+        users, _ = discovery.next_candidates(self.viewer)
+        self.assertEqual(len(users), 4)
+
+
+class ActivityFanOutTests(TestCase):
+    """Group messages reach members' feeds after commit, large groups in the background."""
+
+    def setUp(self):
+        self.sender, *self.members = [
+            User.objects.create_user(username=f'member{i}', password='pass') for i in range(4)
+        ]
+        self.group = StudyGroup.objects.create(name='Networks', creator=self.sender)
+        self.group.members.add(self.sender, *self.members)
+
+    def _recipients(self, message):
+        return set(ActivityEvent.objects.filter(source=f'message:{message.pk}').values_list('recipient_id', flat=True))
+
+    def test_small_group_fans_out_after_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            message = Message.objects.create(group=self.group, user=self.sender, content='hello')
+            self.assertEqual(self._recipients(message), set())
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self._recipients(message), {member.id for member in self.members})
+
+    def test_large_group_fans_out_in_batches_in_the_background(self):
+        jobs = []
+        with mock.patch.object(activity, 'INLINE_FAN_OUT_LIMIT', 2), \
+                mock.patch.object(activity, 'FAN_OUT_BATCH_SIZE', 2), \
+                mock.patch.object(activity._fan_out, 'submit', jobs.append), \
+                self.captureOnCommitCallbacks(execute=True):
+            message = Message.objects.create(group=self.group, user=self.sender, content='hello')
+        self.assertEqual(len(jobs), 1)
+        self.assertEqual(self._recipients(message), set())
+
+        with mock.patch.object(activity, 'FAN_OUT_BATCH_SIZE', 2):
+            jobs[0]()
+        self.assertEqual(self._recipients(message), {member.id for member in self.members})
+
+
+class DashboardInvalidationTests(TestCase):
+
+    def test_tokens_change_only_after_commit(self):
+        user = User.objects.create_user(username='reader', password='pass')
+        group = StudyGroup.objects.create(name='Networks', creator=user)
+        keys = [dashboard._token_key('group', group.id, 'feed'), dashboard._token_key('user', user.id, 'feed')]
+        before = cache.get_many(keys)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            Message.objects.create(group=group, user=user, content='hello')
+            PrivateChat.objects.create(participant1=user, participant2=User.objects.create_user(username='b'))
+            self.assertEqual(cache.get_many(keys), before)
+        for callback in callbacks:
+            callback()
+        after = cache.get_many(keys)
+        self.assertEqual(set(after), set(keys))
+        self.assertNotEqual(after, before)
+
+
+class MarkChatReadTests(TestCase):
+
+    def setUp(self):
+        self.reader = User.objects.create_user(username='reader', password='pass')
+        self.writer = User.objects.create_user(username='writer', password='pass')
+        self.group = StudyGroup.objects.create(name='Networks', creator=self.writer)
+        self.group.members.add(self.reader, self.writer)
+        self.message = Message.objects.create(group=self.group, user=self.writer, content='first')
+        self.client.force_login(self.reader)
+
+    def test_cursor_is_clamped_to_the_newest_message(self):
+        response = self.client.post(reverse('mark_chat_read'), {
+            'chat_type': 'group', 'chat_id': self.group.id, 'message_id': self.message.id + 1000,
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(read_state.cursor_for(self.reader, group=self.group), self.message.id)
+        Message.objects.create(group=self.group, user=self.writer, content='second')
+        self.assertEqual(read_state.unread_group_count(self.reader, self.group), 1)
+
+    def test_marking_a_private_chat_read_twice_subtracts_once(self):
+        chat = PrivateChat.objects.create(participant1=self.reader, participant2=self.writer)
+        for content in ('one', 'two'):
+            PrivateMessage.objects.create(chat=chat, sender=self.writer, content=content)
+        self.assertEqual(counters.get_counts(self.reader)['messages'], 2)
+        # Someone else's unread message keeps the badge from bottoming out at zero
+        other = PrivateChat.objects.create(
+            participant1=self.reader, participant2=User.objects.create_user(username='other', password='pass'),
+        )
+        PrivateMessage.objects.create(chat=other, sender=other.participant2, content='hi')
+
+        for _ in range(2):
+            chat.refresh_from_db()
+            read_state.mark_private_chat_read(self.reader, chat)
+        self.assertEqual(counters.get_counts(self.reader)['messages'], 1)
+        self.assertEqual(counters.count_messages(self.reader.id), 1)
+
+    def test_non_numeric_chat_id_is_rejected(self):
+        response = self.client.post(reverse('mark_chat_read'), {'chat_type': 'group', 'chat_id': 'abc'})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(PUSHER_OUTBOX_AUTODISPATCH=False)
+class OutboxDispatchTests(TestCase):
+    """Delivery of outbox events when Pusher rejects some of them."""
+
+    def _events(self, *channels):
+        OutboxEvent.objects.all().delete()
+        return [OutboxEvent.objects.create(channel=channel, event='message', payload={'n': i})
+                for i, channel in enumerate(channels)]
+
+    def test_rejected_event_is_charged_alone(self):
+        bad, held, *others = self._events('a', 'a', 'b', 'b', 'c')
+
+        def trigger(channel, event, data):
+            if data == bad.payload:
+                raise ValueError('Payload too large')
+
+        with mock.patch.object(realtime.pusher_client, 'trigger_batch', side_effect=ValueError('batch failed')), \
+                mock.patch.object(realtime.pusher_client, 'trigger', side_effect=trigger):
+            self.assertEqual(realtime.dispatch_pending(), 3)
+
+        events = {event.id: event for event in OutboxEvent.objects.all()}
+        self.assertTrue(all(events[event.id].dispatched_at for event in others))
+        self.assertEqual((events[bad.id].attempts, events[held.id].attempts), (1, 0))
+        # The later event on the failed channel waits, unlocked, to keep the channel in order
+        self.assertIsNone(events[held.id].dispatched_at)
+        self.assertEqual(events[held.id].claim_token, '')
+
+    def test_unavailable_pusher_stops_the_drain(self):
+        self._events(*[f'channel-{i:02}' for i in range(realtime.PUSHER_BATCH_SIZE + 2)])
+        with mock.patch.object(realtime.pusher_client, 'trigger_batch', side_effect=ConnectionError), \
+                mock.patch.object(realtime.pusher_client, 'trigger', side_effect=ConnectionError):
+            self.assertEqual(realtime.dispatch_pending(), 0)
+        attempts = list(OutboxEvent.objects.values_list('attempts', flat=True))
+        self.assertEqual(attempts, [1] * realtime.PUSHER_BATCH_SIZE + [0, 0])
+
+
+class MembershipCheckTests(TestCase):
+
+    def test_membership_and_roles_share_one_memo(self):
+        creator = User.objects.create_user(username='creator', password='pass')
+        user = User.objects.create_user(username='user', password='pass')
+        group = StudyGroup.objects.create(name='Networks', creator=creator)
+        with self.assertNumQueries(1):
+            self.assertFalse(membership.is_member(user, group))
+            self.assertFalse(group.is_editor(user))
+
+        group.members.add(user)
+        self.assertTrue(membership.is_member(user, group))
+        group.set_roles(editors=[user])
+        self.assertTrue(group.is_editor(user))
+
+
+class FriendSuggestionTests(TestCase):
+    """Mutual friends, shared groups and exclusions in the offline suggestions."""
+
+    def setUp(self):
+        names = ['me', 'f1', 'f2', 'a', 'b', 'c', 'pending', 'rejected', 'inactive']
+        self.users = {name: User.objects.create_user(username=name, password='pass') for name in names}
+        User.objects.filter(pk=self.users['inactive'].pk).update(is_active=False)
+        for first, second in [('me', 'f1'), ('me', 'f2'), ('f1', 'a'), ('f2', 'a'), ('f1', 'b'),
+                              ('f1', 'pending'), ('f1', 'rejected'), ('f1', 'inactive')]:
+            Friendship.objects.create(from_user=self.users[first], to_user=self.users[second], status='accepted')
+        Friendship.objects.create(from_user=self.users['pending'], to_user=self.users['me'], status='pending')
+        UserDiscoveryAction.objects.create(
+            user=self.users['me'], discovered_user=self.users['rejected'], action='reject',
+        )
+        for name, members in [('G', ['me', 'a', 'c']), ('H', ['me', 'c'])]:
+            group = StudyGroup.objects.create(name=name, creator=self.users['me'])
+            group.members.add(*[self.users[member] for member in members])
+
+    def _suggestions(self):
+        suggestions.build(user_ids=[self.users['me'].id])
+        return [
+            (row.suggested.username, row.mutual_friends, row.shared_groups, row.score, row.position)
+            for row in FriendSuggestion.objects.filter(user=self.users['me']).select_related('suggested')
+            .order_by('position')
+        ]
+
+    def test_counts_ranking_and_exclusions(self):
+        # Ties on score go to the candidate with more mutual friends
+        self.assertEqual(self._suggestions(), [
+            ('a', 2, 1, 5, 0),
+            ('b', 1, 0, 2, 1),
+            ('c', 0, 2, 2, 2),
+        ])
+
+    def test_large_groups_are_ignored(self):
+        with mock.patch.object(suggestions, 'MAX_GROUP_SIZE', 2):
+            self.assertEqual(self._suggestions(), [
+                ('a', 2, 0, 4, 0),
+                ('b', 1, 0, 2, 1),
+                ('c', 0, 1, 1, 2),
+            ])
+
+
+class DocumentIndexTests(MediaTestCase):
+    """Visibility of indexed documents and incremental re-extraction."""
+
+    def setUp(self):
+        super().setUp()
+        self.member = User.objects.create_user(username='member', password='pass')
+        self.outsider = User.objects.create_user(username='outsider', password='pass')
+        self.group = StudyGroup.objects.create(name='Algorithms', creator=self.member)
+        self.group.members.add(self.member)
+        self.public = self._document('Graph notes', 'notes.txt', b'Dijkstra finds shortest paths')
+        self.private = self._document('Exam answers', 'answers.txt', b'Dijkstra question solved', group=self.group)
+        document_index.extract_pending()
+
+    def _document(self, title, name, data, **fields):
+        return Document.objects.create(
+            title=title, course='CS', uploaded_by=self.member, file=SimpleUploadedFile(name, data), **fields,
+        )
+
+    def _found(self, user, query='dijkstra'):
+        return {document.id for document in document_index.search(user, query)[0]}
+
+    def test_group_documents_are_visible_to_members_only(self):
+        self.assertEqual(self._found(self.member), {self.public.id, self.private.id})
+        self.assertEqual(self._found(self.outsider), {self.public.id})
+        self.assertEqual(self._found(AnonymousUser()), {self.public.id})
+        # Scope tokens typed into the query only search the text columns
+        self.assertEqual(self._found(self.outsider, f'group{self.group.id} dijkstra'), set())
+
+        # Moving a document into the group hides it at once
+        self.public.group = self.group
+        self.public.save()
+        self.assertEqual(self._found(self.outsider), set())
+
+    def test_only_changed_files_are_extracted_again(self):
+        self.public.title = 'Shortest path notes'
+        self.public.save()
+        text = DocumentText.objects.get(document=self.public)
+        self.assertEqual((text.status, text.title), ('indexed', 'Shortest path notes'))
+        self.assertEqual(self._found(self.outsider, 'shortest path notes'), {self.public.id})
+
+        # An identical re-upload is the same blob: nothing to re-read
+        self.public.file = SimpleUploadedFile('notes-copy.txt', b'Dijkstra finds shortest paths')
+        self.public.save()
+        self.assertEqual(DocumentText.objects.get(document=self.public).status, 'indexed')
+        self.assertEqual(document_index.reconcile(), 0)
+
+        self.public.file = SimpleUploadedFile('notes.txt', b'Bellman-Ford handles negative edges')
+        self.public.save()
+        self.assertEqual(DocumentText.objects.get(document=self.public).status, 'pending')
+        self.assertEqual(document_index.extract_pending(), 1)
+        self.assertEqual(self._found(self.outsider, 'bellman'), {self.public.id})
+        self.assertEqual(self._found(self.outsider), set())
+
+
+class GroupNotificationTests(TestCase):
+    """Who sees a group notification, and how reading it moves the badge."""
+
+    def setUp(self):
+        self.admin, self.reader, self.late = [
+            User.objects.create_user(username=name, password='pass') for name in ('admin', 'reader', 'late')
+        ]
+        self.networks = StudyGroup.objects.create(name='Networks', creator=self.admin)
+        self.compilers = StudyGroup.objects.create(name='Compilers', creator=self.admin)
+        for group in (self.networks, self.compilers):
+            group.members.add(self.admin, self.reader)
+        Membership.objects.update(joined_at=timezone.now() - timedelta(days=1))
+
+    def _announce(self, group, **kwargs):
+        return notifications.broadcast_to_group(group, 'member_joined', 'Hello', **kwargs)
+
+    def _badge(self, user):
+        counts = counters.get_counts(user)['notifications']
+        self.assertEqual(counts, counters.count_notifications(user.id))
+        return counts
+
+    def _unread(self, user):
+        return {n.feed_id for n in notifications.feed(user) if not n.is_read}
+
+    def test_audience_excludes_late_joiners_and_the_users_involved(self):
+        joined = self._announce(self.networks, from_user=self.late, actor=self.admin)
+        GroupNotification.objects.filter(pk=joined.pk).update(created_at=timezone.now() - timedelta(hours=1))
+        self.networks.members.add(self.late)
+        later = self._announce(self.networks)
+
+        self.assertEqual(self._unread(self.reader), {joined.feed_id, later.feed_id})
+        self.assertEqual(self._unread(self.admin), {later.feed_id})
+        self.assertEqual(self._unread(self.late), {later.feed_id})
+        self.assertEqual(
+            set(joined.audience().values_list('user_id', flat=True)), {self.reader.id},
+        )
+
+    def test_marking_read_stays_within_the_group(self):
+        self._badge(self.reader)
+        older = self._announce(self.compilers)
+        first, second = self._announce(self.networks), self._announce(self.networks)
+        self.assertEqual(self._badge(self.reader), 3)
+
+        notifications.mark_read(self.reader, [second.feed_id])
+        self.assertEqual(self._unread(self.reader), {older.feed_id})
+        self.assertEqual(self._badge(self.reader), 1)
+
+        # Reading the same items again does not subtract twice
+        notifications.mark_read(self.reader, [first.feed_id, second.feed_id])
+        self.assertEqual(self._badge(self.reader), 1)
+
+        self._announce(self.networks)
+        notifications.mark_all_read(self.reader)
+        self.assertEqual(self._unread(self.reader), set())
+        self.assertEqual(self._badge(self.reader), 0)
+
+    def test_cursor_cannot_pass_the_newest_visible_notification(self):
+        self._badge(self.reader)
+        hidden = self._announce(self.networks, from_user=self.reader)
+        notifications.mark_read(self.reader, [f'group-{hidden.id}', f'group-{hidden.id + 1000}'])
+        self.assertFalse(self.reader.group_notification_cursors.exists())
+
+        later = self._announce(self.networks)
+        self.assertEqual(self._unread(self.reader), {later.feed_id})
+        self.assertEqual(self._badge(self.reader), 1)
+
+
+class UnreadCounterTests(TestCase):
+    """The denormalized badges against the counts they cache."""
+
+    def setUp(self):
+        self.alice, self.bob, self.carol = [
+            User.objects.create_user(username=name, password='pass') for name in ('alice', 'bob', 'carol')
+        ]
+        self.chat = PrivateChat.objects.create(participant1=self.alice, participant2=self.bob)
+        for content in ('one', 'two', 'three'):
+            PrivateMessage.objects.create(chat=self.chat, sender=self.bob, content=content)
+        other = PrivateChat.objects.create(participant1=self.carol, participant2=self.alice)
+        PrivateMessage.objects.create(chat=other, sender=self.carol, content='hi')
+
+        group = StudyGroup.objects.create(name='Networks', creator=self.alice)
+        group.members.add(self.alice, self.bob)
+        Membership.objects.update(joined_at=timezone.now() - timedelta(days=1))
+        notifications.broadcast_to_group(group, 'member_joined', 'Welcome', from_user=self.bob)
+        Notification.objects.create(recipient=self.alice, notification_type='friend_request', title='Hi')
+        Friendship.objects.create(from_user=self.carol, to_user=self.alice, status='pending')
+        GroupJoinRequest.objects.create(user=self.carol, group=group)
+
+    def _source(self, user):
+        return UnreadCounter(**{field: count(user.id) for field, count in counters._COUNTERS.items()}).as_dict()
+
+    def test_source_counts(self):
+        self.assertEqual(self._source(self.alice), {
+            'notifications': 2, 'messages': 4, 'friend_requests': 1, 'join_requests': 1, 'total': 7,
+        })
+
+    def test_adjust_clamps_at_zero_and_recounts_missing_rows(self):
+        UnreadCounter.objects.all().delete()
+        counters.adjust(self.alice.id, messages=-1)
+        self.assertEqual(counters.get_counts(self.alice), self._source(self.alice))
+
+        counters.adjust(self.alice.id, friend_requests=-5)
+        self.assertEqual(counters.get_counts(self.alice)['friend_requests'], 0)
+        self.assertEqual(counters.recount(self.alice.id).as_dict(), self._source(self.alice))
+
+    def test_rebuild_all_matches_source_counts(self):
+        UnreadCounter.objects.update(notifications=9, messages=9, friend_requests=9, join_requests=9)
+        read_state.mark_private_chat_read(self.alice, PrivateChat.objects.get(pk=self.chat.pk))
+        self.assertEqual(counters.rebuild_all(), 3)
+        for user in (self.alice, self.bob, self.carol):
+            self.assertEqual(UnreadCounter.objects.get(pk=user.pk).as_dict(), self._source(user))
+
+    def test_deleting_unread_messages_lowers_the_badge(self):
+        counters.get_counts(self.alice)
+        self.chat.messages.order_by('id').first().delete()
+        self.assertEqual(counters.get_counts(self.alice)['messages'], 3)
+
+        self.chat.delete()
+        self.assertEqual(counters.get_counts(self.alice)['messages'], 1)
+
+        self.carol.delete()
+        self.assertEqual(counters.get_counts(self.alice)['messages'], 0)
+        self.assertEqual(counters.get_counts(self.alice), self._source(self.alice))
+
+    def test_deleting_read_messages_leaves_the_badge(self):
+        read_state.mark_private_chat_read(self.alice, PrivateChat.objects.get(pk=self.chat.pk))
+        self.assertEqual(counters.get_counts(self.alice)['messages'], 1)
+        with mock.patch.object(counters, 'recount', wraps=counters.recount) as recount:
+            self.chat.messages.order_by('id').first().delete()
+        recount.assert_not_called()
+        self.assertEqual(counters.get_counts(self.alice)['messages'], 1)
+
+
+class MigrationTestCase(TransactionTestCase):
+    """Runs the data migration ``migrate_to`` over rows written at ``migrate_from``."""
+    migrate_from = migrate_to = None
+
+    def setUp(self):
+        self.old_apps = self._migrate([('resources', self.migrate_from)])
+
+    def tearDown(self):
+        self.migrate_to_latest()
+
+    def _migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.migrate(targets)
+        executor.loader.build_graph()
+        return executor.loader.project_state(targets).apps
+
+    def migrate(self):
+        return self._migrate([('resources', self.migrate_to)])
+
+    def migrate_to_latest(self):
+        """Finish migrating, so the current models can read what the migration left"""
+        self._migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+
+class MembershipMigrationTests(MigrationTestCase):
+    """0016 folds the members/admins/editors tables into Membership rows."""
+    migrate_from = '0015_readcursor'
+    migrate_to = '0016_membership'
+
+    def test_one_membership_per_member_with_the_strongest_role(self):
+        OldUser = self.old_apps.get_model('users', 'CustomUser')
+        OldGroup = self.old_apps.get_model('resources', 'StudyGroup')
+        users = {name: OldUser.objects.create(username=name) for name in
+                 ('creator', 'admin', 'editor', 'member', 'both', 'outsider')}
+        group = OldGroup.objects.create(name='Networks', creator=users['creator'])
+        group.members.add(*[users[name] for name in ('creator', 'admin', 'editor', 'member', 'both')])
+        group.admins.add(users['admin'], users['both'])
+        group.editors.add(users['editor'], users['both'])
+        # An editor who is not a member had no access before and gets none now
+        group.editors.add(users['outsider'])
+
+        new_apps = self.migrate()
+        NewMembership = new_apps.get_model('resources', 'Membership')
+        rows = list(NewMembership.objects.filter(group_id=group.id).values_list('user__username', 'role'))
+        self.assertCountEqual(rows, [
+            ('creator', 'member'), ('admin', 'admin'), ('editor', 'editor'), ('member', 'member'), ('both', 'admin'),
+        ])
+
+        self.migrate_to_latest()
+        current = StudyGroup.objects.get(pk=group.id)
+        expected = {
+            'creator': ('member', True, True), 'admin': ('admin', True, True), 'editor': ('editor', True, False),
+            'member': ('member', True, False), 'both': ('admin', True, True), 'outsider': (None, False, False),
+        }
+        for name, (role, is_member, is_admin) in expected.items():
+            user = User.objects.get(username=name)
+            self.assertEqual(
+                (current.get_role(user), membership.is_member(user, current), current.is_admin(user)),
+                (role, is_member, is_admin), name,
+            )
+
+
+class FriendshipPairMigrationTests(MigrationTestCase):
+    """0023 keeps one row per pair of users before enforcing it."""
+    migrate_from = '0022_discoveryseenset'
+    migrate_to = '0023_friendship_canonical_pair'
+
+    def test_reverse_duplicates_collapse_to_the_strongest_row(self):
+        OldUser = self.old_apps.get_model('users', 'CustomUser')
+        OldFriendship = self.old_apps.get_model('resources', 'Friendship')
+        a, b, c, d = [OldUser.objects.create(username=name) for name in 'abcd']
+        for from_user, to_user, status in [(a, b, 'pending'), (b, a, 'accepted'), (a, c, 'declined'),
+                                           (c, a, 'pending'), (b, d, 'pending')]:
+            OldFriendship.objects.create(from_user=from_user, to_user=to_user, status=status)
+
+        new_apps = self.migrate()
+        rows = new_apps.get_model('resources', 'Friendship').objects.values_list(
+            'user_low', 'user_high', 'from_user_id', 'status',
+        )
+        self.assertCountEqual(rows, [
+            (a.id, b.id, b.id, 'accepted'), (a.id, c.id, c.id, 'pending'), (b.id, d.id, b.id, 'pending'),
+        ])
+
+
+class FriendRequestTests(TestCase):
+    """Sending, answering and ending friendships keeps one row per pair."""
+
+    def setUp(self):
+        self.alice, self.bob = [User.objects.create_user(username=name, password='pass') for name in ('alice', 'bob')]
+
+    def test_send_request_once_per_pair(self):
+        friendship, sent = friends.send_request(self.alice, self.bob)
+        self.assertTrue(sent)
+        self.assertEqual(friends.send_request(self.alice, self.bob), (friendship, False))
+        self.assertEqual(Friendship.objects.count(), 1)
+        self.assertEqual(counters.get_counts(self.bob)['friend_requests'], 1)
+
+    def test_reverse_request_accepts_the_pending_one(self):
+        friendship, _ = friends.send_request(self.alice, self.bob)
+        self.assertFalse(friends.are_friends(self.alice, self.bob))
+        self.assertEqual(friends.send_request(self.bob, self.alice), (friendship, False))
+        friendship.refresh_from_db()
+        self.assertEqual((friendship.from_user, friendship.status), (self.alice, 'accepted'))
+        self.assertEqual(Friendship.objects.count(), 1)
+        self.assertTrue(friends.are_friends(self.alice, self.bob))
+        self.assertEqual(counters.get_counts(self.bob)['friend_requests'], 0)
+
+    def test_reverse_request_through_the_form(self):
+        friends.send_request(self.alice, self.bob)
+        self.client.force_login(self.bob)
+        response = self.client.post(reverse('add_friend'), {'username': 'alice'})
+        self.assertRedirects(response, reverse('friends_list'), fetch_redirect_response=False)
+        self.assertEqual(list(Friendship.objects.values_list('status', flat=True)), ['accepted'])
+
+    def test_accept_decline_and_unfriend(self):
+        friendship, _ = friends.send_request(self.alice, self.bob)
+        self.client.force_login(self.bob)
+        self.client.post(reverse('decline_friend_request', args=[friendship.id]))
+        friendship.refresh_from_db()
+        self.assertEqual(friendship.status, 'declined')
+
+        # A declined pair can be asked again, from either side
+        self.assertEqual(friends.send_request(self.bob, self.alice), (friendship, True))
+        friendship.refresh_from_db()
+        self.assertEqual((friendship.from_user, friendship.status), (self.bob, 'pending'))
+
+        self.client.force_login(self.alice)
+        self.client.post(reverse('accept_friend_request', args=[friendship.id]))
+        self.assertTrue(friends.are_friends(self.bob, self.alice))
+        self.assertEqual(friends.friends_of(self.alice), {self.bob.id})
+
+        self.client.post(reverse('remove_friend', args=[self.bob.id]))
+        self.assertFalse(Friendship.objects.exists())
+        self.assertEqual(friends.friends_of(self.alice), frozenset())
+
+
+class DiscoverySwipeTests(TestCase):
+    """The batch swipe endpoint against the single-card one."""
+
+    def setUp(self):
+        self.batcher, self.single, *self.targets = [
+            User.objects.create_user(username=name, password='pass', course='CS', year='100')
+            for name in ('batcher', 'single', 't0', 't1', 't2')
+        ]
+        ranking.get_snapshot(refresh=True)
+        for viewer in (self.batcher, self.single):
+            discovery.build_queue(viewer)
+
+    def _batch(self, *actions):
+        self.client.force_login(self.batcher)
+        response = self.client.post(
+            reverse('discovery_actions_batch'),
+            json.dumps({'actions': [{'type': 'user', 'id': target.id, 'action': action} for target, action in actions]}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()['results']
+
+    def _swipe(self, target, action):
+        self.client.force_login(self.single)
+        return self.client.post(reverse('user_discovery_action', args=[target.id]), {'action': action}).json()
+
+    def _state(self, viewer):
+        """Everything a swipe leaves behind, with the viewers themselves left out"""
+        others = {self.batcher.id, self.single.id}
+        return {
+            'actions': dict(UserDiscoveryAction.objects.filter(user=viewer).values_list('discovered_user_id', 'action')),
+            'requests': set(Friendship.objects.filter(from_user=viewer).values_list('to_user_id', 'status')),
+            'seen': set(seen_sets.get(viewer.id, 'user').tolist()),
+            'queued': set(DiscoveryCandidate.objects.filter(user=viewer).values_list('candidate_id', flat=True))
+            - others,
+        }
+
+    def test_mixed_batch_matches_single_swipes(self):
+        cards = list(zip(self.targets, ('accept', 'reject', 'skip')))
+        results = self._batch(*cards)
+        self.assertEqual(results, [self._swipe(target, action) for target, action in cards])
+        self.assertEqual(self._state(self.batcher), self._state(self.single))
+        self.assertEqual(self._state(self.batcher)['queued'], set())
+        self.assertEqual(counters.get_counts(self.targets[0])['friend_requests'], 2)
+
+    def test_last_action_on_a_card_wins(self):
+        t0, t1, _ = self.targets
+        results = self._batch((t0, 'accept'), (t0, 'reject'), (t1, 'reject'), (t1, 'accept'))
+        self.assertTrue(all(result['success'] for result in results))
+        state = self._state(self.batcher)
+        self.assertEqual(state['actions'], {t0.id: 'reject', t1.id: 'accept'})
+        # Every accept in the batch still sends its request, once
+        self.assertEqual(state['requests'], {(t0.id, 'pending'), (t1.id, 'pending')})
+        self.assertEqual(counters.get_counts(t0)['friend_requests'], 1)
+
+    def test_swiping_an_already_swiped_user_updates_the_action(self):
+        t0 = self.targets[0]
+        self._batch((t0, 'reject'))
+        self._batch((t0, 'accept'))
+        self.assertEqual(UserDiscoveryAction.objects.filter(user=self.batcher).count(), 1)
+        self.assertEqual(self._state(self.batcher)['actions'], {t0.id: 'accept'})
+        self.assertEqual(Friendship.objects.filter(from_user=self.batcher, to_user=t0).count(), 1)
+
+    def test_mutual_like_matches_once(self):
+        t0 = self.targets[0]
+        friends.send_request(t0, self.batcher)
+        with self.captureOnCommitCallbacks(execute=True):
+            first, second = self._batch((t0, 'accept'), (t0, 'accept'))
+        self.assertEqual((first['friend_matched'], second['friend_matched']), (True, False))
+        self.assertTrue(friends.are_friends(self.batcher, t0))
+        self.assertEqual(Friendship.objects.count(), 1)
+        self.assertEqual(ActivityEvent.objects.filter(activity_type='friend_accepted').count(), 1)
+        self.assertEqual(counters.get_counts(self.batcher)['friend_requests'], 0)
+
+
+class SeenSetTests(TestCase):
+    """Compressed seen-sets and the discovery exclusions built on them."""
+
+    def setUp(self):
+        # User ids are reused after each test's rollback; drop sets cached under them
+        cache.clear()
+
+    def _round_trip(self, ids):
+        return seen_sets.decode(seen_sets.encode(ids)).tolist()
+
+    def test_encoding_round_trips(self):
+        self.assertEqual(self._round_trip([]), [])
+        self.assertEqual(seen_sets.decode(b'').tolist(), [])
+        self.assertEqual(self._round_trip([7]), [7])
+        # Unsorted input with duplicates comes back sorted and unique
+        self.assertEqual(self._round_trip([9, 3, 9, 1, 3]), [1, 3, 9])
+
+        ids = random.Random(7).choices(range(1, 2_000_000), k=20_000)
+        self.assertEqual(self._round_trip(ids), sorted(set(ids)))
+        # Dense ranges compress to a few bytes per thousand ids
+        self.assertLess(len(seen_sets.encode(range(1, 10_001))), 200)
+
+    def test_exclusions_match_the_action_and_friendship_tables(self):
+        viewer, *others = [User.objects.create_user(username=f'user{i}', password='pass') for i in range(7)]
+        for other, action in zip(others, ('accept', 'reject', 'skip')):
+            UserDiscoveryAction.objects.create(user=viewer, discovered_user=other, action=action)
+        for (from_user, to_user), status in zip(
+            [(viewer, others[3]), (others[4], viewer), (viewer, others[5]), (others[0], viewer)],
+            ('pending', 'accepted', 'declined', 'pending'),
+        ):
+            Friendship.objects.create(from_user=from_user, to_user=to_user, status=status)
+
+        def by_query():
+            # The exclusions as discovery computed them before seen-sets
+            excluded = set(UserDiscoveryAction.objects.filter(user=viewer).values_list('discovered_user_id', flat=True))
+            for from_id, to_id in Friendship.objects.filter(
+                Q(from_user=viewer) | Q(to_user=viewer), status__in=('pending', 'accepted'),
+            ).values_list('from_user_id', 'to_user_id'):
+                excluded.add(to_id if from_id == viewer.id else from_id)
+            return excluded
+
+        self.assertEqual(set(discovery._excluded_ids(viewer).tolist()), by_query())
+        self.assertNotIn(others[5].id, by_query())
+
+        swipes.apply(viewer, [{'type': 'user', 'id': others[5].id, 'action': 'skip'}])
+        UserDiscoveryAction.objects.filter(user=viewer, discovered_user=others[1]).delete()
+        self.assertEqual(set(discovery._excluded_ids(viewer).tolist()), by_query())
+
+    def test_group_set_follows_the_action_table(self):
+        viewer = User.objects.create_user(username='viewer', password='pass')
+        groups = [StudyGroup.objects.create(name=f'G{i}', creator=viewer) for i in range(3)]
+        swipes.apply(viewer, [{'type': 'group', 'id': group.id, 'action': 'skip'} for group in groups])
+        GroupDiscoveryAction.objects.filter(user=viewer, group=groups[0]).delete()
+        self.assertEqual(seen_sets.get(viewer.id, 'group').tolist(), [groups[1].id, groups[2].id])
+        self.assertEqual(seen_sets.contains(viewer.id, 'group', [g.id for g in groups]), {groups[1].id, groups[2].id})
+
+
+class GroupStatsTests(MediaTestCase):
+    """The incrementally maintained row against a rebuild from the source tables."""
+
+    def assertMatchesRebuild(self, group):
+        stats = GroupStats.objects.get(pk=group.pk)
+        expected = group_stats._compute([group.pk])[group.pk]
+        self.assertEqual(
+            (stats.member_count, stats.course_counts), (expected['member_count'], expected['course_counts']),
+        )
+        now = timezone.now()
+        rebuilt = GroupStats(recent_activity=expected['recent_activity'], activity_at=expected['activity_at'])
+        self.assertAlmostEqual(stats.activity(now), rebuilt.activity(now), places=6)
+
+    def test_events_keep_the_row_equal_to_a_rebuild(self):
+        creator, cs, eng, bus = [
+            User.objects.create_user(username=name, password='pass', course=course)
+            for name, course in [('creator', 'CS'), ('cs', 'CS'), ('eng', 'ENG'), ('bus', 'BUS')]
+        ]
+        group = StudyGroup.objects.create(name='Networks', creator=creator)
+        group.members.add(creator, cs)
+        Membership.objects.create(group=group, user=eng)
+        self.assertMatchesRebuild(group)
+
+        messages = [Message.objects.create(group=group, user=cs, content=f'm{i}') for i in range(3)]
+        document = Document.objects.create(
+            title='notes', course='CS', uploaded_by=cs, group=group,
+            file=SimpleUploadedFile('notes.pdf', b'%PDF-1.4', content_type='application/pdf'),
+        )
+        self.assertMatchesRebuild(group)
+
+        group.members.add(bus)
+        group.members.remove(cs)
+        messages[0].delete()
+        document.delete()
+        self.assertMatchesRebuild(group)
+
+        eng.course = 'CS'
+        eng.save()
+        Membership.objects.get(group=group, user=bus).delete()
+        for message in messages[1:]:
+            message.delete()
+        self.assertMatchesRebuild(group)
+        self.assertEqual(GroupStats.objects.get(pk=group.pk).course_counts, {'CS': 2})
+
+
+class RankingTests(TestCase):
+    """Top-k selection, and users who joined after the snapshot was loaded."""
+
+    def setUp(self):
+        courses = ['CS', 'CS', 'ENG', 'CS', 'BUS', 'ENG']
+        self.users = [
+            User.objects.create_user(username=f'user{i}', password='pass', course=course, year=str(100 * (i % 4 + 1)))
+            for i, course in enumerate(courses)
+        ]
+        group = StudyGroup.objects.create(name='Networks', creator=self.users[0])
+        group.members.add(*self.users[:3])
+        Friendship.objects.create(from_user=self.users[0], to_user=self.users[3], status='accepted')
+        Friendship.objects.create(from_user=self.users[4], to_user=self.users[3], status='accepted')
+        self.group = group
+
+    def test_top_k_matches_a_plain_sort(self):
+        keys = np.random.default_rng(5).random(40) * 100
+        keys[[3, 17, 29]] = -np.inf
+        expected = [i for i in sorted(range(len(keys)), key=lambda i: -keys[i]) if np.isfinite(keys[i])]
+        for k in (0, 1, 7, 37, 50):
+            self.assertEqual(ranking._top_k(keys, k).tolist(), expected[:k])
+
+    def test_ranked_order_matches_a_plain_sort(self):
+        snapshot = ranking.FeatureSnapshot.load()
+        viewer = self.users[0]
+        row = snapshot.row_of(viewer.id)
+        scores = ranking.user_scores(snapshot, row)
+        keys = scores + np.random.default_rng(3).random(len(snapshot))
+        expected = sorted(
+            ((user_id, int(score)) for user_id, score, key in zip(snapshot.user_ids.tolist(), scores, keys)
+             if user_id != viewer.id),
+            key=lambda item: -keys[snapshot.row_of(item[0])],
+        )
+        self.assertEqual(ranking.rank_users(snapshot, viewer.id, 10, seed=3), expected)
+
+    def test_new_user_is_added_without_a_reload(self):
+        ranking.get_snapshot(refresh=True)
+        newcomer = User.objects.create_user(username='newcomer', password='pass', course='LAW', year='200')
+        newcomer.profile.program_of_study = 'Law'
+        newcomer.profile.save()
+        self.group.members.add(newcomer)
+        Friendship.objects.create(from_user=self.users[4], to_user=newcomer, status='accepted')
+
+        with mock.patch.object(ranking.FeatureSnapshot, 'load', side_effect=AssertionError('reloaded')):
+            snapshot = ranking.snapshot_for(newcomer.id)
+            self.assertIn(newcomer.id, snapshot)
+            self.assertIs(ranking.get_snapshot(), snapshot)
+
+        fresh = ranking.FeatureSnapshot.load()
+        for user in (newcomer, self.users[0], self.users[3]):
+            self.assertEqual(
+                ranking.rank_users(snapshot, user.id, 10, seed=1), ranking.rank_users(fresh, user.id, 10, seed=1),
+            )
+        # A course the snapshot had never seen still indexes the group histogram
+        self.assertEqual([group_id for group_id, _, _ in ranking.rank_groups(snapshot, newcomer.id, 5)], [self.group.id])
+
+
+@override_settings(PUSHER_OUTBOX_AUTODISPATCH=False)
+class NotifyTests(TestCase):
+    """Bulk personal notifications, their badges and realtime deltas."""
+
+    def setUp(self):
+        User.objects.bulk_create([User(username=f'student{i:03}') for i in range(notifications.NOTIFY_BATCH_SIZE + 1)])
+        self.recipients = User.objects.filter(username__startswith='student').order_by('id')
+        # Half the recipients already have a badge row; the rest get one built on first read
+        self.counted = list(self.recipients.values_list('id', flat=True)[::2])
+        for user_id in self.counted:
+            counters.recount(user_id)
+
+    def test_batches_counters_and_outbox_deltas(self):
+        OutboxEvent.objects.all().delete()
+        with mock.patch.object(counters, 'adjust_many', wraps=counters.adjust_many) as adjust_many:
+            created = notifications.notify(
+                self.recipients.values_list('id', flat=True).iterator(), 'announcement', 'Exams moved',
+            )
+
+        total = notifications.NOTIFY_BATCH_SIZE + 1
+        self.assertEqual(created, total)
+        self.assertEqual(Notification.objects.filter(title='Exams moved').count(), total)
+        self.assertEqual([len(call.args[0]) for call in adjust_many.call_args_list], [total - 1, 1])
+        self.assertTrue(all(call.kwargs == {'notifications': 1} for call in adjust_many.call_args_list))
+
+        badges = dict(UnreadCounter.objects.values_list('user_id', 'notifications'))
+        self.assertEqual({badges[user_id] for user_id in self.counted}, {1})
+        self.assertEqual(len(badges), len(self.counted))
+        self.assertEqual(counters.get_counts(self.recipients.last())['notifications'], 1)
+
+        deltas = list(OutboxEvent.objects.values_list('channel', 'event', 'payload'))
+        self.assertCountEqual(deltas, [
+            (f'user-{user_id}', 'unread-counts', {'notifications': 1})
+            for user_id in self.recipients.values_list('id', flat=True)
+        ])
+
+
+class PrivateChatsListTests(TestCase):
+    """Keyset pages of the chat list, including chats with equal activity times."""
+
+    def setUp(self):
+        self.reader = User.objects.create_user(username='reader', password='pass')
+        self.unread = {}
+        for i in range(7):
+            other = User.objects.create_user(username=f'friend{i}', password='pass')
+            chat = PrivateChat.objects.create(participant1=other, participant2=self.reader)
+            for n in range(i):
+                PrivateMessage.objects.create(chat=chat, sender=other, content=f'm{n}')
+            PrivateMessage.objects.create(chat=chat, sender=self.reader, content='reply')
+            self.unread[chat.id] = i
+        # Activity times written last: two runs of ties, one straddling a page boundary
+        base = timezone.now() - timedelta(hours=1)
+        for chat_id, minutes in zip(sorted(self.unread), [0, 5, 5, 5, 5, 9, 9]):
+            PrivateChat.objects.filter(pk=chat_id).update(updated_at=base + timedelta(minutes=minutes))
+        self.client.force_login(self.reader)
+
+    def test_every_chat_once_with_its_unread_count(self):
+        seen, before = [], ''
+        with mock.patch.object(views, 'PRIVATE_CHATS_PAGE_SIZE', 3):
+            while True:
+                response = self.client.get(reverse('private_chats_list'), {'before': before} if before else {})
+                seen += [(row['chat'].id, row['unread_count']) for row in response.context['chat_data']]
+                before = response.context['next_cursor']
+                if before is None:
+                    break
+                self.assertRegex(before, r'^\d+_\d+$')
+
+        expected = PrivateChat.objects.order_by('-updated_at', '-id').values_list('id', flat=True)
+        self.assertEqual(seen, [(chat_id, self.unread[chat_id]) for chat_id in expected])
+        self.assertEqual(len(seen), 7)
+
+
+class GroupChatHistoryTests(TestCase):
+    """Cursor pages of a group's chat history."""
+
+    def setUp(self):
+        self.member, self.requester, self.outsider = [
+            User.objects.create_user(username=name, password='pass') for name in ('member', 'requester', 'outsider')
+        ]
+        self.group = StudyGroup.objects.create(name='Networks', creator=self.member)
+        self.group.members.add(self.member)
+        GroupJoinRequest.objects.create(user=self.requester, group=self.group)
+        messages = [Message.objects.create(group=self.group, user=self.member, content=f'm{i}') for i in range(7)]
+        # Ties on timestamp, one run straddling the boundary between pages of three
+        base = timezone.now() - timedelta(hours=1)
+        for message, minutes in zip(messages, [0, 1, 1, 1, 1, 2, 2]):
+            Message.objects.filter(pk=message.pk).update(timestamp=base + timedelta(minutes=minutes))
+        self.chronological = list(
+            Message.objects.filter(group=self.group).order_by('timestamp', 'id').values_list('id', flat=True)
+        )
+
+    def _history(self, user, **params):
+        self.client.force_login(user)
+        return self.client.get(reverse('group_chat_history', args=[self.group.id]), params)
+
+    def test_pages_cover_every_message_once(self):
+        pages, before = [], None
+        while True:
+            data = self._history(self.member, limit=3, **({'before': before} if before else {})).json()
+            pages.insert(0, [message['message_id'] for message in data['messages']])
+            before = data['next_cursor']
+            self.assertEqual(data['has_more'], before is not None)
+            if before is None:
+                break
+        self.assertEqual([len(page) for page in pages], [1, 3, 3])
+        self.assertEqual(sum(pages, []), self.chronological)
+
+    def test_cursor_excludes_its_own_message_and_newer_ties(self):
+        boundary = Message.objects.get(pk=self.chronological[3])
+        page, next_cursor = views.get_message_history_page(
+            self.group, before=(boundary.timestamp, boundary.id), limit=10,
+        )
+        self.assertEqual([message.id for message in page], self.chronological[:3])
+        self.assertIsNone(next_cursor)
+
+    def test_access(self):
+        self.assertEqual(self._history(self.outsider).status_code, 403)
+        self.assertEqual(self._history(self.requester).status_code, 200)
+        self.assertEqual(self._history(self.member, before='not-a-cursor').status_code, 400)
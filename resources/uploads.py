@@ -0,0 +1,37 @@
+"""
+Upload handlers that hash files while they are received.
+
+Drop-in replacements for Django's default handlers (see
+``FILE_UPLOAD_HANDLERS``): each chunk updates a SHA-256 digest on its way
+to memory or the temporary file, and the finished upload carries the hex
+digest as ``sha256``. ``resources.blobs`` uses it to name the stored file
+without reading the upload a second time.
+"""
+import hashlib
+
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+
+
+class HashingMixin:
+
+    def new_file(self, *args, **kwargs):
+        self.digest = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        self.digest.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        if file is not None:
+            file.sha256 = self.digest.hexdigest()
+        return file
+
+
+class HashingMemoryFileUploadHandler(HashingMixin, MemoryFileUploadHandler):
+    """Small uploads, kept in memory."""
+
+
+class HashingTemporaryFileUploadHandler(HashingMixin, TemporaryFileUploadHandler):
+    """Large uploads, streamed to a temporary file."""
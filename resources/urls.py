@@ -5,7 +5,9 @@ from .views import group_list, group_chat_view
 urlpatterns = [
     path('upload/', views.upload_document, name='upload_document'),
     path('view/', views.view_documents, name='view_documents'),
+    path('documents/search/', views.document_search, name='document_search'),
     path('document/<int:document_id>/', views.serve_document, name='serve_document'),
+    path('document/<int:document_id>/thumbnail/', views.document_thumbnail, name='document_thumbnail'),
     path('groups/create/', views.create_study_group, name='create_group'),
     path('groups/', views.group_list, name='group_list'),
     
@@ -14,6 +16,7 @@ urlpatterns = [
 
     # Chat page
     path('groups/<int:group_id>/chat/', views.group_chat_view, name='group_chat'),
+    path('groups/<int:group_id>/chat/history/', views.group_chat_history, name='group_chat_history'),
     
     # AJAX endpoint for sending messages
     path('groups/<int:group_id>/send/', views.send_message, name='send_message'),
@@ -58,9 +61,17 @@ urlpatterns = [
     # ============ TYPING INDICATOR ============
     path('typing/', views.typing_indicator, name='typing_indicator'),
     
+    # ============ READ CURSORS ============
+    path('read/', views.mark_chat_read, name='mark_chat_read'),
+    
     # ============ REACTIONS & ATTACHMENTS ============
     path('reactions/add/', views.add_reaction, name='add_reaction'),
     path('attachments/upload/', views.upload_message_attachment, name='upload_message_attachment'),
+    path('attachments/<int:attachment_id>/', views.serve_attachment, name='serve_attachment'),
+    path('attachments/<int:attachment_id>/thumbnail/', views.attachment_thumbnail, name='attachment_thumbnail'),
+    
+    # ============ MESSAGE SEARCH ============
+    path('search/messages/', views.search_messages, name='search_messages'),
     
     # ============ DISCOVERY SYSTEM URLS ============
     path('discover/', views.discovery_home, name='discovery_home'),
@@ -68,6 +79,7 @@ urlpatterns = [
     path('discover/users/<int:user_id>/action/', views.user_discovery_action, name='user_discovery_action'),
     path('discover/groups/', views.discover_groups, name='discover_groups'),
     path('discover/groups/<int:group_id>/action/', views.group_discovery_action, name='group_discovery_action'),
+    path('discover/actions/', views.discovery_actions_batch, name='discovery_actions_batch'),
     path('discover/join-requests/', views.group_join_requests_manage, name='group_join_requests_manage'),
     path('discover/join-requests/<int:request_id>/action/', views.group_join_request_action, name='group_join_request_action'),
     path('discover/my-requests/', views.my_join_requests, name='my_join_requests'),
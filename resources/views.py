@@ -1,17 +1,26 @@
+import json
 from django.shortcuts import render, redirect, get_object_or_404
 from .models import (Document, Course, StudyGroup, Message, GroupInvite, Friendship, PrivateChat, PrivateMessage, 
-                     MessageReaction, MessageAttachment, UserDiscoveryAction, GroupDiscoveryAction, GroupJoinRequest, Notification)
+                     MessageReaction, MessageAttachment, GroupJoinRequest, Notification, Membership, FriendSuggestion)
 from django.contrib.auth.decorators import login_required
 from .forms import StudyGroupForm, MessageForm, DocumentUploadForm, EditGroupForm, ManagePermissionsForm, CreateInviteForm, JoinGroupCodeForm, AddFriendForm, PrivateMessageForm, MessageAttachmentForm
+from .realtime import publish
+from . import (
+    counters, dashboard, discovery, document_index, file_serving, friends, read_state, membership, notifications,
+    previews, search, swipes,
+)
+from .pagination import keyset_page, decode_cursor, parse_limit
 from django.contrib import messages
 from django.conf import settings
 from django.views.decorators.http import require_POST
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse
+from django.urls import reverse
 from django.views.decorators.csrf import csrf_exempt
 from django.core.exceptions import PermissionDenied
 from django.utils import timezone
-from django.db.models import Q, Count, Case, When, IntegerField
+from django.db.models import Q, Count
 from django.contrib.auth import get_user_model
+from django.db import transaction
 
 User = get_user_model()
 
@@ -40,40 +49,130 @@ def serve_document(request, document_id):
     
     # If document belongs to a group, verify membership
     if document.group:
-        if request.user not in document.group.members.all():
+        if not membership.is_member(request.user, document.group):
             messages.error(request, "You don't have access to this document. Join the group first.")
             return redirect('group_detail', group_id=document.group.id)
     
-    # Use X-Accel-Redirect for production or redirect to file URL for development
-    from django.http import FileResponse
-    import os
-    
-    if os.path.exists(document.file.path):
-        response = FileResponse(document.file.open('rb'))
-        response['Content-Type'] = 'application/octet-stream'
-        response['Content-Disposition'] = f'inline; filename="{os.path.basename(document.file.name)}"'
-        return response
-    else:
+    # The configured backend sends the bytes (the front proxy in production);
+    # the content hash makes the ETag, for 304s and resumable range requests
+    try:
+        return file_serving.serve(
+            request, document.file, filename=document.filename or None,
+            content_hash=file_serving.ensure_hash(document),
+        )
+    except FileNotFoundError:
         messages.error(request, "Document file not found.")
         return redirect('view_documents')
 
+
+def serve_thumbnail(request, instance):
+    """Serve the thumbnail of a document or attachment (access already checked)"""
+    thumbnail = previews.thumbnail_for(instance)
+    if thumbnail is None:
+        raise Http404("No thumbnail yet.")
+    # Versioned URLs change with the thumbnail, so browsers may keep them
+    versioned = request.GET.get('v') == previews.version_of(thumbnail.name)
+    try:
+        return file_serving.serve(request, thumbnail, max_age=previews.THUMBNAIL_MAX_AGE if versioned else None)
+    except FileNotFoundError:
+        raise Http404("Thumbnail file not found.")
+
+
+@login_required
+def document_thumbnail(request, document_id):
+    """Serve a document's thumbnail with the same membership check as the document"""
+    document = get_object_or_404(Document, id=document_id)
+    if document.group and not membership.is_member(request.user, document.group):
+        raise PermissionDenied
+    return serve_thumbnail(request, document)
+
 def view_documents(request):
-    course_id = request.GET.get('course')
+    course_id = request.GET.get('course', '')
+    search_query = request.GET.get('q', '').strip()
     courses = Course.objects.all()
+    course_name = document_course_name(course_id)
     
-    # Filter documents: public documents (no group) OR user is member of the group
-    if request.user.is_authenticated:
-        user_groups = request.user.study_groups.all()
-        documents = Document.objects.filter(
-            Q(group__isnull=True) | Q(group__in=user_groups)
+    if search_query:
+        # Ranked full-text results, under the same visibility rule as below
+        documents, _ = document_index.search(
+            request.user, search_query, course=course_name, limit=document_index.MAX_PAGE_SIZE,
         )
     else:
-        # Only show documents without a group for anonymous users
-        documents = Document.objects.filter(group__isnull=True)
-    
-    if course_id:
-        documents = documents.filter(course__id=course_id)
-    return render(request, 'resources/view.html', {'documents': documents, 'courses': courses})
+        # Filter documents: public documents (no group) OR user is member of the group
+        if request.user.is_authenticated:
+            user_groups = request.user.study_groups.all()
+            documents = Document.objects.filter(
+                Q(group__isnull=True) | Q(group__in=user_groups)
+            )
+        else:
+            # Only show documents without a group for anonymous users
+            documents = Document.objects.filter(group__isnull=True)
+        
+        if course_name:
+            documents = documents.filter(course__iexact=course_name)
+        documents = list(documents.select_related('uploaded_by', 'group'))
+    # Thumbnails stand in for the files on the cards, in one query
+    previews.annotate(documents)
+    return render(request, 'resources/view.html', {
+        'documents': documents,
+        'courses': courses,
+        'search_query': search_query,
+        'course_filter': course_id,
+    })
+
+
+def document_course_name(course_id):
+    """
+    ``Document.course`` is a free-text course name, so a course filter given
+    as a ``Course`` id is matched by that course's name; anything else is
+    taken as a name.
+    """
+    if course_id.isdigit():
+        course = Course.objects.filter(id=course_id).first()
+        if course is not None:
+            return course.name
+    return course_id
+
+
+def document_search(request):
+    """
+    Ranked full-text search over document titles, tags, courses and
+    extracted text (AJAX, cursor-paginated). Anonymous users see public
+    documents only, like ``view_documents``.
+    """
+    query = request.GET.get('q', '').strip()
+    if not query:
+        return JsonResponse({'success': False, 'error': 'Missing search text'}, status=400)
+
+    after = None
+    cursor = request.GET.get('cursor')
+    if cursor:
+        after = document_index.decode_cursor(cursor)
+        if after is None:
+            return JsonResponse({'success': False, 'error': 'Invalid cursor'}, status=400)
+
+    limit = parse_limit(request.GET.get('limit'), document_index.PAGE_SIZE, document_index.MAX_PAGE_SIZE)
+    documents, next_cursor = document_index.search(
+        request.user, query, course=document_course_name(request.GET.get('course', '')),
+        after=after, limit=limit,
+    )
+    return JsonResponse({
+        'success': True,
+        'results': [{
+            'document_id': document.id,
+            'title': document.title,
+            'course': document.course,
+            'tags': [tag.name for tag in document.tags.all()],
+            'group_id': document.group_id,
+            'group_name': document.group.name if document.group else None,
+            'uploaded_by': document.uploaded_by.username,
+            'uploaded_at': document.uploaded_at.isoformat(),
+            'snippet': document.search_snippet,
+            'url': reverse('serve_document', args=[document.id]),
+        } for document in documents],
+        'next_cursor': next_cursor,
+        'has_more': next_cursor is not None,
+    })
 
 
 
@@ -85,7 +184,7 @@ def create_study_group(request):
             group = form.save(commit=False)
             group.creator = request.user
             group.save()
-            group.members.add(request.user)
+            group.members.add(request.user, through_defaults={'role': Membership.ADMIN})
             messages.success(request, "Study group created successfully!")
             return redirect('group_list')
     else:
@@ -94,7 +193,8 @@ def create_study_group(request):
 
 @login_required
 def group_list(request):
-    all_groups = StudyGroup.objects.select_related('creator').prefetch_related('members').all()
+    all_groups = StudyGroup.objects.select_related('creator').annotate(member_count=Count('memberships'))
+    my_group_ids = membership.group_ids_for(request.user)
     
     # Categorize groups for the current user
     my_groups = []
@@ -109,7 +209,7 @@ def group_list(request):
     )
     
     for group in all_groups:
-        if request.user in group.members.all():
+        if group.id in my_group_ids:
             my_groups.append(group)
         elif group.id in pending_group_ids:
             pending_groups.append(group)
@@ -127,7 +227,7 @@ def group_detail(request, group_id):
     group = get_object_or_404(StudyGroup, id=group_id)
     
     # Check if user is a member to view group documents
-    is_member = request.user in group.members.all()
+    is_member = membership.is_member(request.user, group)
 
     if request.method == 'POST':
         if not is_member:
@@ -145,17 +245,21 @@ def group_detail(request, group_id):
         form = MessageForm()
 
     messages_list = group.messages.all()
+    memberships = group.memberships.select_related('user__profile').order_by('joined_at', 'id')
 
     return render(request, 'resources/group_detail.html', {
         'group': group,
         'messages': messages_list,
         'form': form,
-        'is_member': is_member
+        'is_member': is_member,
+        'memberships': memberships,
+        'can_manage': group.can_manage_members(request.user),
+        'can_edit': group.can_edit_group(request.user),
     })
 @login_required
 def join_group(request, group_id):
     group = get_object_or_404(StudyGroup, id=group_id)
-    if request.user not in group.members.all():
+    if not membership.is_member(request.user, group):
         group.members.add(request.user)
         messages.success(request, "You joined the group!")
     else:
@@ -163,27 +267,61 @@ def join_group(request, group_id):
     return redirect('group_detail', group_id=group.id)
 
 
-import pusher
-import requests
+CHAT_HISTORY_PAGE_SIZE = 50
+CHAT_HISTORY_MAX_PAGE_SIZE = 200
+
+
+def get_message_history_page(group, before=None, limit=CHAT_HISTORY_PAGE_SIZE):
+    """
+    Return one page of a group's chat history in display (oldest-first) order.
+
+    Pages are keyed on (timestamp, id) and walk the Message(group, timestamp, id)
+    index backwards from the newest message, so every page is a bounded range
+    scan regardless of how deep into the history it is. Returns the messages
+    and the cursor for the next (older) page, or None when there is no more.
+    """
+    qs = group.messages.select_related(
+        'user', 'user__profile', 'parent_message', 'parent_message__user'
+    ).prefetch_related('attachments')
+    page, next_cursor = keyset_page(qs, 'timestamp', before=before, limit=limit)
+    page.reverse()
+    previews.annotate([attachment for msg in page for attachment in msg.attachments.all()])
+    return page, next_cursor
+
+
+def serialize_attachment(attachment):
+    """Serialize a message attachment; ``thumbnail_url`` is None until its thumbnail exists."""
+    thumbnail_url = None
+    if getattr(attachment, 'thumbnail_version', ''):
+        thumbnail_url = f"{reverse('attachment_thumbnail', args=[attachment.id])}?v={attachment.thumbnail_version}"
+    return {
+        'id': attachment.id,
+        'filename': attachment.filename,
+        'file_size': attachment.get_file_size_display(),
+        'url': reverse('serve_attachment', args=[attachment.id]),
+        'thumbnail_url': thumbnail_url,
+    }
 
-# Disable SSL verification for development (Pusher SSL cert mismatch)
-_original_request = requests.Session.request
-def _patched_request(self, *args, **kwargs):
-    kwargs['verify'] = False
-    return _original_request(self, *args, **kwargs)
-requests.Session.request = _patched_request
 
-# Suppress urllib3 InsecureRequestWarning
-import urllib3
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+def serialize_group_message(msg, reactions=()):
+    """Serialize a group message for the chat history API."""
+    profile = getattr(msg.user, 'profile', None)
+    return {
+        'message_id': msg.id,
+        'user_id': msg.user_id,
+        'username': msg.user.username,
+        'display_name': msg.user.get_full_name() or msg.user.username,
+        'message': msg.content,
+        'timestamp': msg.timestamp.isoformat(),
+        'profile_picture_url': profile.get_profile_picture_url() if profile else None,
+        'initials': profile.get_initials() if profile else msg.user.username[0].upper(),
+        'parent_id': msg.parent_message_id,
+        'parent_username': msg.parent_message.user.username if msg.parent_message else None,
+        'parent_content': msg.parent_message.content if msg.parent_message else None,
+        'reactions': list(reactions),
+        'attachments': [serialize_attachment(attachment) for attachment in msg.attachments.all()],
+    }
 
-pusher_client = pusher.Pusher(
-    app_id=settings.PUSHER_APP_ID,
-    key=settings.PUSHER_KEY,
-    secret=settings.PUSHER_SECRET,
-    cluster=settings.PUSHER_CLUSTER,
-    ssl=True,
-)
 
 @login_required
 def group_chat_view(request, group_id):
@@ -191,7 +329,7 @@ def group_chat_view(request, group_id):
     group = get_object_or_404(StudyGroup, id=group_id)
     
     # Check if user is a member
-    is_member = request.user in group.members.all()
+    is_member = membership.is_member(request.user, group)
     
     # Check if user has pending join request
     has_pending_request = GroupJoinRequest.objects.filter(
@@ -205,14 +343,18 @@ def group_chat_view(request, group_id):
         messages.error(request, "You must be a member of this group to access the chat.")
         return redirect('group_detail', group_id=group.id)
     
-    messages_qs = group.messages.select_related('user', 'parent_message', 'parent_message__user').order_by('timestamp')
+    # Only the newest window is rendered; older pages are fetched on scroll
+    page, next_cursor = get_message_history_page(group)
+    if page:
+        read_state.mark_group_read(request.user, group, up_to_id=max(msg.id for msg in page))
     documents = group.documents.all()
 
     reaction_emojis = MessageReaction.EMOJI_CHOICES
 
     return render(request, 'resources/group_chat.html', {
         'group': group,
-        'messages': messages_qs,
+        'messages': page,
+        'history_cursor': next_cursor,
         'documents': documents,
         'is_member': is_member,
         'has_pending_request': has_pending_request,
@@ -222,6 +364,46 @@ def group_chat_view(request, group_id):
     })
 
 
+@login_required
+def group_chat_history(request, group_id):
+    """Return older chat messages for infinite scroll (AJAX, cursor-paginated)."""
+    group = get_object_or_404(StudyGroup, id=group_id)
+
+    # Same visibility rule as the chat page: members and pending requesters
+    is_member = membership.is_member(request.user, group)
+    if not is_member and not GroupJoinRequest.objects.filter(
+        user=request.user, group=group, status='pending'
+    ).exists():
+        return JsonResponse({'success': False, 'error': 'Access denied'}, status=403)
+
+    before = None
+    cursor = request.GET.get('before')
+    if cursor:
+        before = decode_cursor(cursor)
+        if before is None:
+            return JsonResponse({'success': False, 'error': 'Invalid cursor'}, status=400)
+
+    limit = parse_limit(request.GET.get('limit'), CHAT_HISTORY_PAGE_SIZE, CHAT_HISTORY_MAX_PAGE_SIZE)
+
+    page, next_cursor = get_message_history_page(group, before=before, limit=limit)
+
+    # One aggregate query for the reactions of the whole page
+    reactions = {}
+    for row in MessageReaction.objects.filter(
+        group_message_id__in=[msg.id for msg in page]
+    ).values('group_message_id', 'emoji').annotate(count=Count('id')).order_by():
+        reactions.setdefault(row['group_message_id'], []).append(
+            {'emoji': row['emoji'], 'count': row['count']}
+        )
+
+    return JsonResponse({
+        'success': True,
+        'messages': [serialize_group_message(msg, reactions.get(msg.id, ())) for msg in page],
+        'next_cursor': next_cursor,
+        'has_more': next_cursor is not None,
+    })
+
+
 @login_required
 @require_POST
 def send_message(request, group_id):
@@ -229,7 +411,7 @@ def send_message(request, group_id):
     group = get_object_or_404(StudyGroup, id=group_id)
     
     # STRICT: Verify user is an APPROVED member (not just pending)
-    if request.user not in group.members.all():
+    if not membership.is_member(request.user, group):
         # Check if they have a pending request
         pending_request = GroupJoinRequest.objects.filter(
             user=request.user,
@@ -258,15 +440,6 @@ def send_message(request, group_id):
     if len(content) > 5000:
         return JsonResponse({'success': False, 'error': 'Message too long (max 5000 characters)'}, status=400)
     
-    # Create and save message
-    from .models import Message
-    message = Message.objects.create(
-        group=group,
-        user=request.user,
-        content=content,
-        parent_message_id=parent_id if parent_id else None
-    )
-    
     # Get user's full name or username for display
     display_name = request.user.get_full_name() or request.user.username
     
@@ -276,14 +449,21 @@ def send_message(request, group_id):
         profile_picture_url = request.user.profile.profile_picture.url
     initials = request.user.profile.get_initials()
     
-    # Trigger Pusher event for real-time updates to ALL users in the group
-    try:
+    with transaction.atomic():
+        message = Message.objects.create(
+            group=group,
+            user=request.user,
+            content=content,
+            parent_message_id=parent_id if parent_id else None
+        )
+        
         # Include parent message content for reply display
         parent_content = None
         if message.parent_message_id:
             parent_content = message.parent_message.content if message.parent_message else None
         
-        pusher_client.trigger(f'group-{group.id}', 'new-message', {
+        # Queue the real-time update for ALL users in the group
+        publish(f'group-{group.id}', 'new-message', {
             'username': request.user.username,
             'display_name': display_name,
             'message': message.content,
@@ -295,10 +475,6 @@ def send_message(request, group_id):
             'parent_id': message.parent_message_id,
             'parent_content': parent_content,
         })
-    except Exception as e:
-        # Pusher broadcast failed (e.g. SSL error) but message was saved successfully
-        import logging
-        logging.getLogger(__name__).warning(f'Pusher trigger failed for group {group.id}: {e}')
     
     return JsonResponse({
         'success': True,
@@ -364,15 +540,13 @@ def leave_group(request, group_id):
         messages.error(request, "Group creators cannot leave. Please delete the group or transfer ownership.")
         return redirect('group_detail', group_id=group.id)
     
-    if request.user not in group.members.all():
+    if not membership.is_member(request.user, group):
         messages.info(request, "You are not a member of this group.")
         return redirect('group_list')
     
     if request.method == 'POST':
-        # Remove from members, admins, and editors
+        # Removing the membership also drops any admin/editor role
         group.members.remove(request.user)
-        group.admins.remove(request.user)
-        group.editors.remove(request.user)
         messages.success(request, f"You have left '{group.name}'.")
         return redirect('group_list')
     
@@ -392,9 +566,16 @@ def manage_permissions(request, group_id):
     if request.method == 'POST':
         form = ManagePermissionsForm(request.POST, group=group)
         if form.is_valid():
-            # Clear and set new permissions
-            group.admins.set(form.cleaned_data['admins'])
-            group.editors.set(form.cleaned_data['editors'])
+            with transaction.atomic():
+                group.set_roles(
+                    admins=form.cleaned_data['admins'],
+                    editors=form.cleaned_data['editors'],
+                )
+                # Admin rights decide whose badge counts the group's join requests
+                counters.recount_many(
+                    group.memberships.values_list('user_id', flat=True), ['join_requests']
+                )
+                dashboard.invalidate_groups([group.id], ('stats', 'feed'))
             messages.success(request, "Permissions updated successfully!")
             return redirect('group_detail', group_id=group.id)
     else:
@@ -402,8 +583,8 @@ def manage_permissions(request, group_id):
         form = ManagePermissionsForm(
             group=group,
             initial={
-                'admins': group.admins.all(),
-                'editors': group.editors.all()
+                'admins': group.users_with_role(Membership.ADMIN),
+                'editors': group.users_with_role(Membership.EDITOR)
             }
         )
     
@@ -432,14 +613,12 @@ def remove_member(request, group_id, user_id):
         messages.error(request, "Cannot remove the group creator.")
         return redirect('group_detail', group_id=group.id)
     
-    if member not in group.members.all():
+    if not membership.is_member(member, group):
         messages.info(request, "User is not a member of this group.")
         return redirect('group_detail', group_id=group.id)
     
     if request.method == 'POST':
         group.members.remove(member)
-        group.admins.remove(member)
-        group.editors.remove(member)
         messages.success(request, f"{member.username} has been removed from the group.")
         return redirect('group_detail', group_id=group.id)
     
@@ -519,7 +698,7 @@ def join_via_invite_link(request, invite_token):
         messages.error(request, "This invite link is no longer valid.")
         return redirect('group_list')
     
-    if request.user in group.members.all():
+    if membership.is_member(request.user, group):
         messages.info(request, "You are already a member of this group.")
         return redirect('group_detail', group_id=group.id)
     
@@ -544,7 +723,7 @@ def join_via_code(request):
                     messages.error(request, "This group is not accepting new members via invite code.")
                     return redirect('group_list')
                 
-                if request.user in group.members.all():
+                if membership.is_member(request.user, group):
                     messages.info(request, "You are already a member of this group.")
                     return redirect('group_detail', group_id=group.id)
                 
@@ -560,7 +739,7 @@ def join_via_code(request):
     return render(request, 'resources/join_via_code.html', {'form': form})
 
 
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse
 from django.views.decorators.http import require_POST
 from django.views.decorators.csrf import csrf_exempt
 
@@ -570,18 +749,19 @@ from django.views.decorators.csrf import csrf_exempt
 def delete_message(request, message_id):
     message = get_object_or_404(Message, id=message_id, user=request.user)
 
-    group_id = message.group.id
-    message.delete()
+    group_id = message.group_id
+    with transaction.atomic():
+        message.delete()
 
-    # Notify via Pusher
-    pusher_client.trigger(f'group-{group_id}', 'delete-message', {
-        'message_id': message_id
-    })
+        # Notify via Pusher
+        publish(f'group-{group_id}', 'delete-message', {
+            'message_id': message_id
+        })
 
     return JsonResponse({'status': 'success'})
 
 
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse
 from stream_chat import StreamChat
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
@@ -600,7 +780,8 @@ def get_chat_token(request):
 @login_required
 def friends_list(request):
     """View all friends and friend requests"""
-    friends = Friendship.get_friends(request.user).select_related('profile')
+    friend_ids = friends.friends_of(request.user)
+    friend_users = User.objects.filter(id__in=friend_ids).select_related('profile')
     
     # Pending requests sent by user
     sent_requests = Friendship.objects.filter(
@@ -612,21 +793,21 @@ def friends_list(request):
         to_user=request.user, status='pending'
     ).select_related('from_user__profile')
     
-    # Get study group members who aren't friends yet
-    group_members = User.objects.filter(
-        study_groups__in=request.user.study_groups.all()
-    ).exclude(id=request.user.id).select_related('profile').distinct()
-    
-    # Filter out existing friends and pending requests
-    friend_ids = [f.id for f in friends]
+    # Ranked offline by build_friend_suggestions; skip anyone befriended or
+    # requested since the last run
     sent_ids = [r.to_user_id for r in sent_requests]
     received_ids = [r.from_user_id for r in received_requests]
-    exclude_ids = friend_ids + sent_ids + received_ids
-    potential_friends = group_members.exclude(id__in=exclude_ids)
+    exclude_ids = set(friend_ids).union(sent_ids, received_ids)
+    potential_friends = [
+        suggestion for suggestion in FriendSuggestion.objects.filter(
+            user=request.user
+        ).select_related('suggested__profile').order_by('position')
+        if suggestion.suggested_id not in exclude_ids
+    ]
     
     return render(request, 'resources/friends_list.html', {
-        'friends': friends,
-        'friends_count': friends.count(),
+        'friends': friend_users,
+        'friends_count': len(friend_ids),
         'sent_requests': sent_requests,
         'received_requests': received_requests,
         'potential_friends': potential_friends[:10],
@@ -642,15 +823,16 @@ def add_friend(request):
             username = form.cleaned_data['username']
             to_user = User.objects.get(username=username)
             
-            Friendship.objects.create(
-                from_user=request.user,
-                to_user=to_user,
-                status='pending'
-            )
+            friendship, sent = friends.send_request(request.user, to_user)
+            
+            if not sent:
+                if friendship.status == 'accepted':
+                    messages.success(request, f"You are now friends with {username}!")
+                return redirect('friends_list')
             
             # Notify the target user
-            Notification.objects.create(
-                recipient=to_user,
+            notifications.notify(
+                [to_user],
                 notification_type='friend_request',
                 title=f'{request.user.get_full_name() or request.user.username} sent you a friend request',
                 message='Accept or decline from your friends page',
@@ -675,26 +857,18 @@ def add_friend_from_group(request, user_id):
         messages.error(request, "You cannot add yourself as a friend.")
         return redirect('friends_list')
     
-    # Check if already friends or request pending
-    existing = Friendship.objects.filter(
-        Q(from_user=request.user, to_user=to_user) |
-        Q(from_user=to_user, to_user=request.user)
-    ).first()
+    # Send unless already friends, pending or blocked
+    existing, sent = friends.send_request(request.user, to_user)
     
-    if existing:
+    if not sent:
         if existing.status == 'accepted':
             messages.info(request, "You are already friends with this user.")
         elif existing.status == 'pending':
             messages.info(request, "Friend request is already pending.")
     else:
-        Friendship.objects.create(
-            from_user=request.user,
-            to_user=to_user,
-            status='pending'
-        )
         # Notify the target user
-        Notification.objects.create(
-            recipient=to_user,
+        notifications.notify(
+            [to_user],
             notification_type='friend_request',
             title=f'{request.user.get_full_name() or request.user.username} sent you a friend request',
             message='Accept or decline from your friends page',
@@ -714,8 +888,8 @@ def accept_friend_request(request, request_id):
     friendship.save()
     
     # Notify the sender that their request was accepted
-    Notification.objects.create(
-        recipient=friendship.from_user,
+    notifications.notify(
+        [friendship.from_user],
         notification_type='friend_accepted',
         title=f'{request.user.get_full_name() or request.user.username} accepted your friend request',
         message='You are now friends!',
@@ -743,12 +917,9 @@ def remove_friend(request, user_id):
     """Remove a friend"""
     other_user = get_object_or_404(User, id=user_id)
     
-    friendship = Friendship.objects.filter(
-        Q(from_user=request.user, to_user=other_user, status='accepted') |
-        Q(from_user=other_user, to_user=request.user, status='accepted')
-    ).first()
+    friendship = friends.between(request.user, other_user)
     
-    if friendship:
+    if friendship and friendship.status == 'accepted':
         friendship.delete()
         messages.success(request, f"You are no longer friends with {other_user.username}.")
     
@@ -757,37 +928,39 @@ def remove_friend(request, user_id):
 
 # ============ PRIVATE MESSAGING VIEWS ============
 
+PRIVATE_CHATS_PAGE_SIZE = 30
+
+
 @login_required
 def private_chats_list(request):
-    """View all private chats"""
+    """View all private chats, newest activity first, one page at a time"""
+    before = decode_cursor(request.GET.get('before', ''))
+
     chats = PrivateChat.objects.filter(
         Q(participant1=request.user) | Q(participant2=request.user)
     ).select_related(
         'participant1', 'participant1__profile',
         'participant2', 'participant2__profile',
-    ).order_by('-updated_at')
+        'last_message',
+    )
+    # Unread count for the current page only, as a correlated subquery
+    chats = read_state.annotate_private_unread(chats, request.user)
     
     # Add last message and unread count to each chat
-    chat_data = []
-    total_unread = 0
-    for chat in chats:
-        last_message = chat.messages.order_by('-timestamp').first()
-        unread_count = chat.messages.filter(
-            is_read=False
-        ).exclude(sender=request.user).count()
-        total_unread += unread_count
-        
-        chat_data.append({
-            'chat': chat,
-            'other_user': chat.get_other_participant(request.user),
-            'last_message': last_message,
-            'unread_count': unread_count
-        })
+    page, next_cursor = keyset_page(chats, 'updated_at', before=before, limit=PRIVATE_CHATS_PAGE_SIZE)
+    chat_data = [{
+        'chat': chat,
+        'other_user': chat.get_other_participant(request.user),
+        'last_message': chat.last_message,
+        'unread_count': chat.unread_count,
+    } for chat in page]
     
     return render(request, 'resources/private_chats_list.html', {
         'chat_data': chat_data,
-        'total_chats': len(chat_data),
-        'total_unread': total_unread,
+        'total_chats': chats.count(),
+        'total_unread': counters.get_counts(request.user)['messages'],
+        'next_cursor': next_cursor,
+        'is_first_page': before is None,
     })
 
 
@@ -803,8 +976,8 @@ def private_chat_view(request, chat_id):
     
     other_user = chat.get_other_participant(request.user)
     
-    # Mark messages as read
-    chat.messages.filter(is_read=False).exclude(sender=request.user).update(is_read=True)
+    # Mark messages as read by moving this user's read cursor
+    read_state.mark_private_chat_read(request.user, chat)
     
     # Get all messages (including replies) with parent_message data
     messages_qs = chat.messages.select_related('parent_message', 'parent_message__sender', 'sender').order_by('timestamp')
@@ -833,7 +1006,7 @@ def start_private_chat(request, user_id):
         return redirect('private_chats_list')
     
     # Check if users are friends
-    if not Friendship.are_friends(request.user, other_user):
+    if not friends.are_friends(request.user, other_user):
         messages.error(request, "You must be friends to start a private chat.")
         return redirect('friends_list')
     
@@ -857,30 +1030,24 @@ def send_private_message(request, chat_id):
     if not content:
         return JsonResponse({'success': False, 'error': 'Message cannot be empty'}, status=400)
     
-    # Create message
-    message = PrivateMessage.objects.create(
-        chat=chat,
-        sender=request.user,
-        content=content,
-        parent_message_id=parent_id if parent_id else None
-    )
-    
-    # Update chat timestamp
-    chat.save()  # This triggers auto_now on updated_at
-    
-    # Trigger Pusher event
-    try:
-        pusher_client.trigger(f'dm-chat-{chat.id}', 'new-message', {
+    with transaction.atomic():
+        # Create message
+        message = PrivateMessage.objects.create(
+            chat=chat,
+            sender=request.user,
+            content=content,
+            parent_message_id=parent_id if parent_id else None
+        )
+        # The chat's last_message and updated_at are bumped by resources.signals
+        
+        # Queue Pusher event
+        publish(f'dm-chat-{chat.id}', 'new-message', {
             'message_id': message.id,
             'sender': request.user.username,
             'content': message.content,
             'timestamp': message.timestamp.isoformat(),
             'parent_id': parent_id
         })
-    except Exception as e:
-        # Pusher broadcast failed (e.g. SSL error) but message was saved successfully
-        import logging
-        logging.getLogger(__name__).warning(f'Pusher trigger failed for chat {chat.id}: {e}')
     
     return JsonResponse({
         'success': True,
@@ -904,21 +1071,48 @@ def typing_indicator(request):
 
     display_name = request.user.get_full_name() or request.user.username
 
-    try:
-        if chat_type == 'group':
-            channel = f'group-{chat_id}'
-        else:
-            channel = f'dm-chat-{chat_id}'
+    if chat_type == 'group':
+        channel = f'group-{chat_id}'
+    else:
+        channel = f'dm-chat-{chat_id}'
 
-        pusher_client.trigger(channel, 'typing', {
-            'user_id': request.user.id,
-            'username': request.user.username,
-            'display_name': display_name,
-            'is_typing': is_typing,
-        })
-    except Exception as e:
-        import logging
-        logging.getLogger(__name__).warning(f'Pusher typing trigger failed: {e}')
+    # Only the latest typing state per user is worth delivering
+    publish(channel, 'typing', {
+        'user_id': request.user.id,
+        'username': request.user.username,
+        'display_name': display_name,
+        'is_typing': is_typing,
+    }, coalesce_key=f'user-{request.user.id}')
+
+    return JsonResponse({'success': True})
+
+
+# ============ READ CURSORS ============
+
+@login_required
+@require_POST
+def mark_chat_read(request):
+    """AJAX endpoint to advance the user's read cursor while a chat is open."""
+    chat_type = request.POST.get('chat_type')  # 'group' or 'private'
+    chat_id = request.POST.get('chat_id')
+    message_id = request.POST.get('message_id')
+
+    if not chat_type or not chat_id:
+        return JsonResponse({'success': False, 'error': 'Missing params'}, status=400)
+    if not chat_id.isdigit():
+        return JsonResponse({'success': False, 'error': 'Invalid chat_id'}, status=400)
+
+    if chat_type == 'group':
+        group = get_object_or_404(StudyGroup, id=chat_id)
+        if not membership.is_member(request.user, group):
+            return JsonResponse({'success': False, 'error': 'Access denied'}, status=403)
+        up_to_id = int(message_id) if message_id and message_id.isdigit() else None
+        read_state.mark_group_read(request.user, group, up_to_id=up_to_id)
+    else:
+        chat = get_object_or_404(PrivateChat, id=chat_id)
+        if request.user.id not in (chat.participant1_id, chat.participant2_id):
+            return JsonResponse({'success': False, 'error': 'Access denied'}, status=403)
+        read_state.mark_private_chat_read(request.user, chat)
 
     return JsonResponse({'success': True})
 
@@ -940,29 +1134,30 @@ def add_reaction(request):
         if message_type == 'group':
             message = get_object_or_404(Message, id=message_id)
             # Check if user is group member
-            if request.user not in message.group.members.all():
+            if not membership.is_member(request.user, message.group):
                 return JsonResponse({'success': False, 'error': 'Access denied'}, status=403)
             
-            # Toggle reaction
-            reaction, created = MessageReaction.objects.get_or_create(
-                user=request.user,
-                group_message=message,
-                emoji=emoji
-            )
-            
-            if not created:
-                reaction.delete()
-                action = 'removed'
-            else:
-                action = 'added'
-            
-            # Trigger Pusher
-            pusher_client.trigger(f'group-{message.group.id}', 'reaction-update', {
-                'message_id': message_id,
-                'emoji': emoji,
-                'user': request.user.username,
-                'action': action
-            })
+            with transaction.atomic():
+                # Toggle reaction
+                reaction, created = MessageReaction.objects.get_or_create(
+                    user=request.user,
+                    group_message=message,
+                    emoji=emoji
+                )
+                
+                if not created:
+                    reaction.delete()
+                    action = 'removed'
+                else:
+                    action = 'added'
+                
+                # Queue Pusher event
+                publish(f'group-{message.group.id}', 'reaction-update', {
+                    'message_id': message_id,
+                    'emoji': emoji,
+                    'user': request.user.username,
+                    'action': action
+                })
             
         else:  # private
             message = get_object_or_404(PrivateMessage, id=message_id)
@@ -970,26 +1165,27 @@ def add_reaction(request):
             if request.user not in [message.chat.participant1, message.chat.participant2]:
                 return JsonResponse({'success': False, 'error': 'Access denied'}, status=403)
             
-            # Toggle reaction
-            reaction, created = MessageReaction.objects.get_or_create(
-                user=request.user,
-                private_message=message,
-                emoji=emoji
-            )
-            
-            if not created:
-                reaction.delete()
-                action = 'removed'
-            else:
-                action = 'added'
-            
-            # Trigger Pusher
-            pusher_client.trigger(f'dm-chat-{message.chat.id}', 'reaction-update', {
-                'message_id': message_id,
-                'emoji': emoji,
-                'user': request.user.username,
-                'action': action
-            })
+            with transaction.atomic():
+                # Toggle reaction
+                reaction, created = MessageReaction.objects.get_or_create(
+                    user=request.user,
+                    private_message=message,
+                    emoji=emoji
+                )
+                
+                if not created:
+                    reaction.delete()
+                    action = 'removed'
+                else:
+                    action = 'added'
+                
+                # Queue Pusher event
+                publish(f'dm-chat-{message.chat.id}', 'reaction-update', {
+                    'message_id': message_id,
+                    'emoji': emoji,
+                    'user': request.user.username,
+                    'action': action
+                })
         
         return JsonResponse({'success': True, 'action': action})
         
@@ -1011,6 +1207,7 @@ def upload_message_attachment(request):
         attachment.filename = form.cleaned_data['filename']
         attachment.file_size = form.cleaned_data['file_size']
         attachment.file_type = form.cleaned_data['file_type']
+        attachment.uploaded_by = request.user
         
         # For now, save without linking to message
         # In actual implementation, this would be called with message creation
@@ -1021,23 +1218,135 @@ def upload_message_attachment(request):
             'attachment_id': attachment.id,
             'filename': attachment.filename,
             'file_size': attachment.get_file_size_display(),
-            'file_url': attachment.file.url
+            'file_url': reverse('serve_attachment', args=[attachment.id])
         })
     
     return JsonResponse({'success': False, 'errors': form.errors}, status=400)
 
 
+def get_readable_attachment(user, attachment_id):
+    """The attachment, if ``user`` can read the message it belongs to; PermissionDenied otherwise"""
+    attachment = get_object_or_404(MessageAttachment.objects.select_related(
+        'group_message__group', 'private_message__chat',
+    ), id=attachment_id)
+
+    if attachment.group_message:
+        # Same visibility rule as the chat page: members and pending requesters
+        group = attachment.group_message.group
+        allowed = membership.is_member(user, group) or GroupJoinRequest.objects.filter(
+            user=user, group=group, status='pending'
+        ).exists()
+    elif attachment.private_message:
+        chat = attachment.private_message.chat
+        allowed = user.id in (chat.participant1_id, chat.participant2_id)
+    else:
+        # Not sent yet: only the uploader
+        allowed = attachment.uploaded_by_id == user.id
+    if not allowed:
+        raise PermissionDenied
+    return attachment
+
+
+@login_required
+def serve_attachment(request, attachment_id):
+    """Serve a message attachment to those who can read the message"""
+    attachment = get_readable_attachment(request.user, attachment_id)
+    try:
+        return file_serving.serve(
+            request, attachment.file, filename=attachment.filename,
+            content_hash=file_serving.ensure_hash(attachment),
+        )
+    except FileNotFoundError:
+        raise Http404("Attachment file not found.")
+
+
+@login_required
+def attachment_thumbnail(request, attachment_id):
+    """Serve an attachment's thumbnail to those who can read the message"""
+    return serve_thumbnail(request, get_readable_attachment(request.user, attachment_id))
+
+
+# ==================== MESSAGE SEARCH ====================
+
+def serialize_search_result(result):
+    """Serialize a message search hit for the search API."""
+    msg = result['message']
+    if result['kind'] == 'group':
+        sender = msg.user
+        conversation = {'group_id': msg.group_id, 'group_name': msg.group.name,
+                        'url': reverse('group_chat', args=[msg.group_id])}
+    else:
+        sender = msg.sender
+        conversation = {'chat_id': msg.chat_id,
+                        'chat_with': msg.chat.get_other_participant(sender).username,
+                        'url': reverse('private_chat', args=[msg.chat_id])}
+    return {
+        'type': result['kind'],
+        'message_id': msg.id,
+        'user_id': sender.id,
+        'username': sender.username,
+        'display_name': sender.get_full_name() or sender.username,
+        'snippet': result['snippet'],
+        'timestamp': msg.timestamp.isoformat(),
+        **conversation,
+    }
+
+
+@login_required
+def search_messages(request):
+    """
+    Full-text search over the group and private chats the user can read
+    (AJAX, cursor-paginated). ``q`` is the search text; ``group`` or
+    ``chat`` narrows it to one conversation.
+    """
+    query = request.GET.get('q', '').strip()
+    if not query:
+        return JsonResponse({'success': False, 'error': 'Missing search text'}, status=400)
+
+    readable = search.readable_scopes(request.user)
+    # Both ``group`` and ``chat`` given: search those two conversations
+    narrowed = {}
+    for kind, param in (('group', 'group'), ('private', 'chat')):
+        value = request.GET.get(param)
+        if value is None:
+            continue
+        try:
+            conversation_id = int(value)
+        except ValueError:
+            return JsonResponse({'success': False, 'error': f'Invalid {param}'}, status=400)
+        if conversation_id not in readable[kind]:
+            return JsonResponse({'success': False, 'error': 'Access denied'}, status=403)
+        narrowed[kind] = {conversation_id}
+    scopes = narrowed or readable
+
+    after = None
+    cursor = request.GET.get('cursor')
+    if cursor:
+        after = search.decode_cursor(cursor)
+        if after is None:
+            return JsonResponse({'success': False, 'error': 'Invalid cursor'}, status=400)
+
+    limit = parse_limit(request.GET.get('limit'), search.PAGE_SIZE, search.MAX_PAGE_SIZE)
+    results, next_cursor = search.search(request.user, query, scopes=scopes, after=after, limit=limit)
+    return JsonResponse({
+        'success': True,
+        'results': [serialize_search_result(result) for result in results],
+        'next_cursor': next_cursor,
+        'has_more': next_cursor is not None,
+    })
+
+
 # ==================== DISCOVERY SYSTEM ====================
 
 @login_required
 def discovery_home(request):
     """Main discovery page"""
     # Get user stats
-    friends_count = Friendship.get_friends(request.user).count()
+    friends_count = len(friends.friends_of(request.user))
     groups_count = request.user.study_groups.count()
     pending_requests = Friendship.objects.filter(to_user=request.user, status='pending').count()
     pending_join_requests = GroupJoinRequest.objects.filter(
-        group__in=request.user.admin_groups.all(), 
+        group__in=StudyGroup.administered_by(request.user), 
         status='pending'
     ).count()
     
@@ -1057,58 +1366,17 @@ def discover_users(request):
     course_filter = request.GET.get('course', '')
     program_filter = request.GET.get('program', '')
     
-    # Get users already actioned or are friends
-    actioned_user_ids = UserDiscoveryAction.objects.filter(user=request.user).values_list('discovered_user_id', flat=True)
-    friend_ids = [f.id for f in Friendship.get_friends(request.user)]
-    pending_friend_ids = Friendship.objects.filter(
-        Q(from_user=request.user) | Q(to_user=request.user),
-        status='pending'
-    ).values_list('from_user_id', 'to_user_id')
-    pending_ids = set()
-    for from_id, to_id in pending_friend_ids:
-        pending_ids.add(from_id if from_id != request.user.id else to_id)
-    
-    exclude_ids = set(list(actioned_user_ids) + friend_ids + list(pending_ids) + [request.user.id])
+    after = request.GET.get('after', '')
+    after = int(after) if after.isdigit() else 0
     
-    # Base query - users not already actioned
-    users = User.objects.exclude(id__in=exclude_ids)
-    
-    # Apply filters
-    if search_query:
-        users = users.filter(
-            Q(username__icontains=search_query) |
-            Q(first_name__icontains=search_query) |
-            Q(last_name__icontains=search_query)
-        )
-    
-    if course_filter:
-        users = users.filter(course=course_filter)
-    
-    if program_filter:
-        users = users.filter(profile__program_of_study__icontains=program_filter)
-    
-    # Ranking algorithm
-    users = users.annotate(
-        match_score=Case(
-            # Same course = 40 points
-            When(course=request.user.course, then=40),
-            default=0,
-            output_field=IntegerField()
-        ) + Case(
-            # Same year = 30 points
-            When(year=request.user.year, then=30),
-            default=0,
-            output_field=IntegerField()
-        ) + Case(
-            # Same program = 20 points
-            When(profile__program_of_study=request.user.profile.program_of_study, then=20),
-            default=0,
-            output_field=IntegerField()
-        )
-    ).order_by('-match_score', '?')[:50]  # Random order for same scores, limit 50
+    # Served from the precomputed candidate queue; see resources.discovery
+    users, next_cursor = discovery.next_candidates(
+        request.user, after=after,
+        search=search_query, course=course_filter, program=program_filter,
+    )
     
     # Get available courses for filter
-    courses = User.objects.exclude(course='').values_list('course', flat=True).distinct()
+    courses = [code for code, _ in User.COURSE_CHOICES]
     
     context = {
         'users': users,
@@ -1116,6 +1384,7 @@ def discover_users(request):
         'course_filter': course_filter,
         'program_filter': program_filter,
         'courses': courses,
+        'next_cursor': next_cursor,
     }
     return render(request, 'resources/discover_users.html', context)
 
@@ -1133,50 +1402,8 @@ def user_discovery_action(request, user_id):
     if action not in ['accept', 'reject', 'skip']:
         return JsonResponse({'success': False, 'error': 'Invalid action'}, status=400)
     
-    # Record the action
-    UserDiscoveryAction.objects.update_or_create(
-        user=request.user,
-        discovered_user=discovered_user,
-        defaults={'action': action}
-    )
-    
-    # If accept, create friend request
-    if action == 'accept':
-        # Check if other user already sent request
-        existing_request = Friendship.objects.filter(
-            from_user=discovered_user,
-            to_user=request.user,
-            status='pending'
-        ).first()
-        
-        if existing_request:
-            # Auto-accept to create friendship
-            existing_request.status = 'accepted'
-            existing_request.save()
-            message = f"You're now friends with {discovered_user.username}! 🎉"
-            friend_matched = True
-        else:
-            # Create new friend request
-            Friendship.objects.get_or_create(
-                from_user=request.user,
-                to_user=discovered_user,
-                defaults={'status': 'pending'}
-            )
-            message = f"Friend request sent to {discovered_user.username}"
-            friend_matched = False
-        
-        return JsonResponse({
-            'success': True,
-            'action': action,
-            'message': message,
-            'friend_matched': friend_matched
-        })
-    
-    return JsonResponse({
-        'success': True,
-        'action': action,
-        'message': 'User skipped' if action == 'skip' else 'User rejected'
-    })
+    result = swipes.apply(request.user, [{'type': 'user', 'id': discovered_user.id, 'action': action}])[0]
+    return JsonResponse(result)
 
 
 @login_required
@@ -1184,33 +1411,7 @@ def discover_groups(request):
     """Discover study groups with ranking algorithm"""
     search_query = request.GET.get('q', '')
     
-    # Get groups already actioned or member of
-    actioned_group_ids = GroupDiscoveryAction.objects.filter(user=request.user).values_list('group_id', flat=True)
-    member_group_ids = request.user.study_groups.values_list('id', flat=True)
-    pending_request_group_ids = GroupJoinRequest.objects.filter(user=request.user, status='pending').values_list('group_id', flat=True)
-    
-    exclude_ids = set(list(actioned_group_ids) + list(member_group_ids) + list(pending_request_group_ids))
-    
-    # Base query
-    groups = StudyGroup.objects.exclude(id__in=exclude_ids)
-    
-    # Apply search
-    if search_query:
-        groups = groups.filter(
-            Q(name__icontains=search_query) |
-            Q(description__icontains=search_query)
-        )
-    
-    # Ranking algorithm based on group members' attributes
-    groups = groups.annotate(
-        member_count=Count('members'),
-        match_score=Case(
-            # Has members from same course
-            When(members__course=request.user.course, then=30),
-            default=0,
-            output_field=IntegerField()
-        )
-    ).order_by('-match_score', '-member_count', '?')[:50]
+    groups = discovery.next_groups(request.user, search=search_query)
     
     context = {
         'groups': groups,
@@ -1230,37 +1431,87 @@ def group_discovery_action(request, group_id):
     if action not in ['interested', 'not_interested', 'skip']:
         return JsonResponse({'success': False, 'error': 'Invalid action'}, status=400)
     
-    # Record the action
-    GroupDiscoveryAction.objects.update_or_create(
-        user=request.user,
-        group=group,
-        defaults={'action': action}
-    )
-    
-    # If interested, create join request
-    if action == 'interested':
-        GroupJoinRequest.objects.get_or_create(
-            user=request.user,
-            group=group,
-            defaults={'message': message_text, 'status': 'pending'}
-        )
+    result = swipes.apply(request.user, [{
+        'type': 'group', 'id': group.id, 'action': action, 'message': message_text,
+    }])[0]
+    return JsonResponse(result)
+
+
+def serialize_discovered_user(user):
+    """Serialize a people-discovery card."""
+    profile = getattr(user, 'profile', None)
+    return {
+        'id': user.id,
+        'username': user.username,
+        'display_name': user.get_full_name() or user.username,
+        'course': user.get_course_display(),
+        'year': user.get_year_display(),
+        'program_of_study': profile.program_of_study if profile else '',
+        'profile_picture_url': profile.get_profile_picture_url() if profile else None,
+        'match_score': user.match_score,
+    }
+
+
+def serialize_discovered_group(group):
+    """Serialize a group-discovery card."""
+    return {
+        'id': group.id,
+        'name': group.name,
+        'description': group.description,
+        'member_count': group.member_count,
+        'match_score': group.match_score,
+        'created_at': group.created_at.isoformat(),
+    }
+
+
+@login_required
+@require_POST
+def discovery_actions_batch(request):
+    """
+    Apply queued discovery swipes in one transaction.
+
+    Body: ``{"actions": [{"type": "user", "id": 7, "action": "accept"},
+    {"type": "group", "id": 3, "action": "interested", "message": "..."}],
+    "after": <people queue cursor>, "limit": 20}``. Returns a result per
+    action, in order, plus the next people and/or group cards for the kinds
+    that were swiped.
+    """
+    try:
+        payload = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Invalid JSON'}, status=400)
+    actions = payload.get('actions') if isinstance(payload, dict) else None
+    if not isinstance(actions, list):
+        return JsonResponse({'success': False, 'error': 'actions must be a list'}, status=400)
+    if len(actions) > swipes.MAX_BATCH_SIZE:
         return JsonResponse({
-            'success': True,
-            'action': action,
-            'message': f"Join request sent to {group.name}. Admins will review it."
-        })
-    
-    return JsonResponse({
-        'success': True,
-        'action': action,
-        'message': 'Group skipped' if action == 'skip' else 'Marked as not interested'
-    })
+            'success': False, 'error': f'At most {swipes.MAX_BATCH_SIZE} actions per batch',
+        }, status=400)
+
+    results = swipes.apply(request.user, actions)
+    response = {'success': True, 'results': results}
+
+    limit = parse_limit(payload.get('limit'), default=discovery.PAGE_SIZE, maximum=discovery.PAGE_SIZE)
+    kinds = {result['type'] for result in results}
+    if 'user' in kinds:
+        try:
+            after = max(int(payload.get('after') or 0), 0)
+        except (TypeError, ValueError):
+            after = 0
+        users, next_cursor = discovery.next_candidates(request.user, after=after, limit=limit)
+        response['users'] = [serialize_discovered_user(user) for user in users]
+        response['next_cursor'] = next_cursor
+    if 'group' in kinds:
+        response['groups'] = [
+            serialize_discovered_group(group) for group in discovery.next_groups(request.user, limit=limit)
+        ]
+    return JsonResponse(response)
 
 
 @login_required
 def group_join_requests_manage(request):
     """View and manage join requests for groups user admins"""
-    admin_groups = request.user.admin_groups.all() | StudyGroup.objects.filter(creator=request.user)
+    admin_groups = StudyGroup.administered_by(request.user)
     
     pending_requests = GroupJoinRequest.objects.filter(
         group__in=admin_groups,
@@ -1287,76 +1538,76 @@ def group_join_request_action(request, request_id):
     if action not in ['approve', 'reject']:
         return JsonResponse({'success': False, 'error': 'Invalid action'}, status=400)
     
-    if action == 'approve':
-        join_request.status = 'approved'
-        join_request.reviewed_by = request.user
-        join_request.save()
+    with transaction.atomic():
+        if action == 'approve':
+            join_request.status = 'approved'
+            join_request.reviewed_by = request.user
+            join_request.save()
         
-        # Add user to group
-        join_request.group.members.add(join_request.user)
+            # Add user to group
+            join_request.group.members.add(join_request.user)
         
-        # Create notification for the approved user
-        Notification.objects.create(
-            recipient=join_request.user,
-            notification_type='group_join_approved',
-            title=f'Your request to join {join_request.group.name} was approved!',
-            message=f'Approved by {request.user.get_full_name() or request.user.username}',
-            from_user=request.user,
-            group=join_request.group,
-            action_url=f'/resources/groups/{join_request.group.id}/chat/',
-        )
+            # Create notification for the approved user
+            notifications.notify(
+                [join_request.user],
+                notification_type='group_join_approved',
+                title=f'Your request to join {join_request.group.name} was approved!',
+                message=f'Approved by {request.user.get_full_name() or request.user.username}',
+                from_user=request.user,
+                group=join_request.group,
+                action_url=f'/resources/groups/{join_request.group.id}/chat/',
+            )
         
-        # Notify existing group members about the new member
-        for member in join_request.group.members.exclude(id__in=[join_request.user.id, request.user.id]):
-            Notification.objects.create(
-                recipient=member,
+            # Notify existing group members about the new member (one row, fanned out on read)
+            notifications.broadcast_to_group(
+                join_request.group,
                 notification_type='member_joined',
                 title=f'{join_request.user.get_full_name() or join_request.user.username} joined {join_request.group.name}',
                 message='A new member has joined the group',
                 from_user=join_request.user,
-                group=join_request.group,
+                actor=request.user,
                 action_url=f'/resources/groups/{join_request.group.id}/detail/',
             )
         
-        # Trigger Pusher event to notify approved user in real-time
-        pusher_client.trigger(f'user-{join_request.user.id}', 'join-request-approved', {
-            'group_id': join_request.group.id,
-            'group_name': join_request.group.name,
-            'message': f'Your request to join {join_request.group.name} has been approved!'
-        })
+            # Queue Pusher event to notify approved user in real-time
+            publish(f'user-{join_request.user.id}', 'join-request-approved', {
+                'group_id': join_request.group.id,
+                'group_name': join_request.group.name,
+                'message': f'Your request to join {join_request.group.name} has been approved!'
+            })
         
-        # Also trigger event on group channel to notify existing members
-        pusher_client.trigger(f'group-{join_request.group.id}', 'member-joined', {
-            'user_id': join_request.user.id,
-            'username': join_request.user.username,
-            'display_name': join_request.user.get_full_name() or join_request.user.username,
-        })
+            # Also queue event on group channel to notify existing members
+            publish(f'group-{join_request.group.id}', 'member-joined', {
+                'user_id': join_request.user.id,
+                'username': join_request.user.username,
+                'display_name': join_request.user.get_full_name() or join_request.user.username,
+            })
         
-        message_text = f"{join_request.user.username} has been added to {join_request.group.name}"
-    else:
-        join_request.status = 'rejected'
-        join_request.reviewed_by = request.user
-        join_request.save()
+            message_text = f"{join_request.user.username} has been added to {join_request.group.name}"
+        else:
+            join_request.status = 'rejected'
+            join_request.reviewed_by = request.user
+            join_request.save()
         
-        # Create notification for the rejected user
-        Notification.objects.create(
-            recipient=join_request.user,
-            notification_type='group_join_rejected',
-            title=f'Your request to join {join_request.group.name} was not approved',
-            message=f'Reviewed by {request.user.get_full_name() or request.user.username}',
-            from_user=request.user,
-            group=join_request.group,
-            action_url='/resources/discover/my-requests/',
-        )
+            # Create notification for the rejected user
+            notifications.notify(
+                [join_request.user],
+                notification_type='group_join_rejected',
+                title=f'Your request to join {join_request.group.name} was not approved',
+                message=f'Reviewed by {request.user.get_full_name() or request.user.username}',
+                from_user=request.user,
+                group=join_request.group,
+                action_url='/resources/discover/my-requests/',
+            )
         
-        # Trigger Pusher event to notify rejected user
-        pusher_client.trigger(f'user-{join_request.user.id}', 'join-request-rejected', {
-            'group_id': join_request.group.id,
-            'group_name': join_request.group.name,
-            'message': f'Your request to join {join_request.group.name} was not approved.'
-        })
+            # Queue Pusher event to notify rejected user
+            publish(f'user-{join_request.user.id}', 'join-request-rejected', {
+                'group_id': join_request.group.id,
+                'group_name': join_request.group.name,
+                'message': f'Your request to join {join_request.group.name} was not approved.'
+            })
         
-        message_text = f"Join request from {join_request.user.username} has been rejected"
+            message_text = f"Join request from {join_request.user.username} has been rejected"
     
     return JsonResponse({
         'success': True,
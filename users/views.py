@@ -7,6 +7,7 @@ from django.contrib.auth import update_session_auth_hash
 from django.contrib.auth import get_user_model
 from .forms import CustomUserCreationForm, ProfileEditForm, UserInfoEditForm, CustomPasswordChangeForm
 from .models import UserProfile
+from resources import friends
 
 User = get_user_model()
 
@@ -47,8 +48,7 @@ def public_profile_view(request, username):
     profile, created = UserProfile.objects.get_or_create(user=user)
     
     # Check if users are friends
-    from resources.models import Friendship
-    are_friends = Friendship.are_friends(request.user, user) if request.user != user else False
+    are_friends = friends.are_friends(request.user, user) if request.user != user else False
     
     context = {
         'profile': profile,